@@ -7,18 +7,57 @@ import CompareArrowsIcon from 'material-ui-icons/CompareArrows';
 import PropTypes from 'prop-types';
 import { scaleLinear, color } from 'd3';
 import { XYPlot, XAxis, YAxis, HorizontalGridLines, VerticalGridLines, AreaSeries, LineSeries } from 'react-vis';
+import { REF } from '../../services/mockdata.js';
 
 
 // Configurable units
 const SIZE = 20;    // Maximum size (in px) of pixel square
 const SPACING = 0;  // Space (in px) between adjacent pixel squares
 const PADDING = 5;  // Space (in px) around the entire pixel display
+const TILES_WIDTH = 512;  // Maximum size (in px) of the tile display at its initial zoom level
 
 // Derived units
 const COLOR = scaleLinear().domain([-1, 0, 1]).range(['#0571b0', '#f7f7f7', '#ca0020']).clamp(true);
 const JUMP = SIZE + SPACING;  // Distance between adjacent pixel centers
 const OFFSET = SIZE / 2;      // Distance from pixel edge to center
 
+/**
+ * Converts the bits of an IEEE 754 half-precision float to a number.
+ */
+function halfToFloat(bits) {
+    const sign = bits & 0x8000 ? -1 : 1;
+    const exponent = (bits >> 10) & 0x1f;
+    const fraction = bits & 0x3ff;
+    if(exponent === 0) return sign * Math.pow(2, -14) * (fraction / 1024);
+    if(exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+    return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+}
+
+/**
+ * Returns the contents of a tensor `payload` as nested arrays, decoding its quantized `preview` if it has one instead
+ * of full-precision `contents`.
+ */
+function decodeContents(payload) {
+    const { contents, preview } = payload;
+    if(!preview) return contents;
+    const bytes = Uint8Array.from(atob(preview.data), (c) => c.charCodeAt(0));
+    const view = new DataView(bytes.buffer);
+    const count = preview.encoding === 'float16' ? bytes.length / 2 : bytes.length;
+    const values = [];
+    for(let i = 0; i < count; i++) {
+        const quantized = preview.encoding === 'float16' ? halfToFloat(view.getUint16(2 * i, true)) : bytes[i];
+        values.push(quantized * preview.scale + preview.offset);
+    }
+    // Values are in row-major order, so each dimension from the innermost out groups the previous level into arrays.
+    let nested = values;
+    for(let d = preview.shape.length - 1; d > 0; d--) {
+        const grouped = [];
+        for(let i = 0; i < nested.length; i += preview.shape[d]) grouped.push(nested.slice(i, i + preview.shape[d]));
+        nested = grouped;
+    }
+    return nested;
+}
+
 /**
  * This dumb component renders the pixels of a tensor. Each pixel represents an element in the tensor.
  */
@@ -49,6 +88,62 @@ class TensorPixels extends PureComponent {
     }
 }
 
+/**
+ * This dumb component renders a large tensor as a heatmap on a canvas, drawing image tiles rendered by the program
+ * rather than an element per value. `tiles` is the {tilesize, minzoom, maxzoom} sent by the program in place of the
+ * tensor's contents.
+ */
+class TensorTiles extends PureComponent {
+
+    /** Prop expected types object. */
+    static propTypes = {
+        symbolId:   PropTypes.string.isRequired,
+        size:       PropTypes.array.isRequired,
+        tiles:      PropTypes.object.isRequired,
+        maxmag:     PropTypes.number,
+    };
+
+    /**
+     * Returns the zoom level at which the tensor best fits in `TILES_WIDTH`: each element is `2 ** zoom` pixels wide
+     * if `zoom` is positive, and each pixel `2 ** -zoom` elements wide if it is negative. It is at least the lowest
+     * level the program renders, so very large tensors are drawn wider than `TILES_WIDTH`.
+     */
+    getZoom() {
+        const { size, tiles } = this.props;
+        const extent = Math.max(...(size.length < 2 ? [1].concat(size) : size.slice(0, 2)));
+        const zoom = Math.min(Math.floor(Math.log2(TILES_WIDTH / extent)), Math.log2(SIZE) | 0, tiles.maxzoom);
+        return Math.max(zoom, tiles.minzoom);
+    }
+
+    componentDidMount() {
+        const { symbolId, size, tiles, maxmag } = this.props;
+        const zoom = this.getZoom();
+        const [rows, cols] = size.length < 2 ? [1].concat(size) : size.slice(0, 2);
+        const context = this.canvas.getContext('2d');
+        const tileSize = tiles.tilesize;
+        const elementsPerTile = zoom >= 0 ? tileSize / Math.pow(2, zoom) : tileSize * Math.pow(2, -zoom);
+        const query = maxmag ? `?maxmag=${maxmag}` : '';
+        for(let r = 0; r < Math.ceil(rows / elementsPerTile); r++) {
+            for(let c = 0; c < Math.ceil(cols / elementsPerTile); c++) {
+                const tile = new Image();
+                tile.onload = () => context.drawImage(tile, c * tileSize, r * tileSize);
+                tile.src = `/api/debug/get_tile/${symbolId.replace(`${REF}`, '')}/${zoom}/${r}/${c}${query}`;
+            }
+        }
+    }
+
+    render() {
+        const { size } = this.props;
+        const zoom = this.getZoom();
+        const [rows, cols] = size.length < 2 ? [1].concat(size) : size.slice(0, 2);
+        const scale = Math.pow(2, zoom);
+        return (
+            <canvas ref={(canvas) => this.canvas = canvas} style={{margin: PADDING}}
+                    width={Math.ceil(cols * scale)} height={Math.ceil(rows * scale)} />
+        );
+    }
+}
+
 /**
  * This dumb component renders elements that appear on highlight of a single pixel.
  */
@@ -94,9 +189,14 @@ class TensorViewer extends Component {
     /** Constructor. */
     constructor(props) {
         super(props);
+        // Large tensors are sent without their contents, and drawn from images rendered by the program instead.
+        const tiled = props.payload.tiles !== undefined;
+        const payload = tiled ? props.payload :
+            Object.assign({}, props.payload, { contents: decodeContents(props.payload) });
         this.state = {
-            elements: this.generateElements(props.payload),
-            distribution: this.generateDistribution(props.payload),
+            tiled,
+            elements: tiled ? { pixels: [], width: 0, height: 0 } : this.generateElements(payload),
+            distribution: tiled ? [] : this.generateDistribution(payload),
             highlight: null,
             mode: 'elements',
         };
@@ -187,12 +287,17 @@ class TensorViewer extends Component {
 
     /** Renders the pixels and highlight elements in an svg. */
     render() {
-        const { classes } = this.props;
-        const { elements, highlight, distribution, mode } = this.state;
+        const { classes, symbolId, payload } = this.props;
+        const { tiled, elements, highlight, distribution, mode } = this.state;
         const { pixels, width, height } = elements;
 
         let contents = null;
-        if (mode === 'elements') {
+        if (mode === 'elements' && tiled) {
+            // Only sparse tensors are sent with a maxmag when tiled; otherwise the program finds the whole array's.
+            contents = <TensorTiles symbolId={symbolId} size={payload.size} tiles={payload.tiles}
+                                    maxmag={payload.maxmag} />;
+        }
+        else if (mode === 'elements') {
             contents = (
                 <div>
                     <svg width={width + 2*PADDING} height={height + 2*PADDING}
@@ -231,11 +336,14 @@ class TensorViewer extends Component {
         return (
           <div className={classes.container}>
               {contents}
-              <Tooltip title="Change View" placement="bottom">
-                  <IconButton onClick={() => this.switchViews()} aria-label="Change View">
-                      <CompareArrowsIcon />
-                  </IconButton>
-              </Tooltip>
+              {/* The distribution is drawn from the contents, which tiled tensors are sent without. */}
+              {tiled ? null : (
+                  <Tooltip title="Change View" placement="bottom">
+                      <IconButton onClick={() => this.switchViews()} aria-label="Change View">
+                          <CompareArrowsIcon />
+                      </IconButton>
+                  </Tooltip>
+              )}
           </div>
         );
     }
@@ -9,12 +9,16 @@ import { composeWithDevTools } from 'redux-devtools-extension';
 
 import Debugger from './views/Debugger';
 import mainReducer from './reducers';
+import { subscribeToProgramUpdates } from './services/push.js';
 
 // Create store & link to main reducer
 let store = createStore(mainReducer, composeWithDevTools(
     applyMiddleware(thunk),
 ));
 
+// Receive program updates pushed by the server
+subscribeToProgramUpdates(store);
+
 // Link app to HTML
 ReactDOM.render(
     <ReduxProvider store={store}>
@@ -46,7 +46,10 @@ export default function rootReducer(state = initialState, action) {
 function ensureSymbolDataLoadedReducer(state, action) {
     const { symbolId, data, shells } = action;
     // It's important that `shells` be the first argument, so existing symbols are not overwritten
-    return Immutable.merge({symbolTable: shells}, state, {deep: true}).setIn(['symbolTable', symbolId, 'data'], data);
+    const newState = Immutable.merge({symbolTable: shells}, state, {deep: true})
+        .setIn(['symbolTable', symbolId, 'data'], data);
+    // The symbol's own shell is only sent if its `str` was a fallback, now replaced by the full string.
+    return symbolId in shells ? newState.setIn(['symbolTable', symbolId, 'str'], shells[symbolId].str) : newState;
 }
 
 /** Given a new namespace dict, reset the entire symbol table to only contain that namespace.
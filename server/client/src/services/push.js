@@ -0,0 +1,78 @@
+import { updateNamespaceAction } from '../actions/program.js';
+import { resetVarListAction } from '../actions/varlist.js';
+
+/**
+ * Subscribes `store` to the program updates pushed by the server, so that every open client follows the program from
+ * breakpoint to breakpoint, whichever client issued the command. Each breakpoint's namespace arrives as a diff against
+ * the previous one, which is applied to the namespace last received; if a diff was missed, the whole namespace is
+ * fetched instead. Diffs which arrive while it is being fetched are held, and those newer than the fetched namespace
+ * are applied once it arrives.
+ */
+export function subscribeToProgramUpdates(store) {
+    if (typeof window.io === 'undefined') {
+        return;  // Not served by the debugging server, e.g. in tests
+    }
+    const socket = window.io();
+    let namespace = {};
+    let seq = null;
+    let heldDiffs = null;  // The diffs received during a fetch of the whole namespace, or null if none is in flight
+    let fetchCount = 0;    // Identifies the latest fetch, so that fetches overtaken by a change of state are ignored
+
+    const showNamespace = (context) => {
+        store.dispatch(updateNamespaceAction('waiting', context, namespace));
+        store.dispatch(resetVarListAction(namespace));
+    };
+
+    const fetchNamespace = () => {
+        const fetchId = ++fetchCount;
+        heldDiffs = [];
+        fetch('/api/debug/get_namespace').then(resp => resp.json()).then(
+            (fetched) => {
+                if (fetchId !== fetchCount) {
+                    return;
+                }
+                const diffs = heldDiffs;
+                heldDiffs = null;
+                namespace = fetched.namespace;
+                seq = fetched.seq;
+                showNamespace(fetched.context);
+                diffs.filter((diff) => diff.seq > seq).forEach(receiveDiff);
+            },
+            () => {
+                if (fetchId === fetchCount) {
+                    heldDiffs = null;  // The next diff fetches again, as its base will not match
+                }
+            }
+        );
+    };
+
+    const receiveDiff = (diff) => {
+        if (heldDiffs !== null) {
+            heldDiffs.push(diff);
+            return;
+        }
+        if (diff.base !== null && diff.base !== seq) {
+            fetchNamespace();
+            return;
+        }
+        namespace = Object.assign(diff.base === null ? {} : Object.assign({}, namespace), diff.added);
+        diff.removed.forEach((symbolId) => delete namespace[symbolId]);
+        seq = diff.seq;
+        showNamespace(diff.context);
+    };
+
+    // While the program runs, the last namespace and its `seq` are kept, as the next breakpoint is pushed as a diff
+    // against them; they are only dropped once the program disconnects.
+    socket.on('program-state', ({ programState }) => {
+        fetchCount += 1;
+        heldDiffs = null;
+        if (programState === 'disconnected') {
+            namespace = {};
+            seq = null;
+        }
+        store.dispatch(updateNamespaceAction(programState, null, {}));
+        store.dispatch(resetVarListAction({}));
+    });
+
+    socket.on('namespace-diff', receiveDiff);
+}
@@ -0,0 +1,136 @@
+"use strict";
+
+/**
+ * This file defines a stand-in for the socket to the Python debugger, which serves a run recorded by the debugger
+ * (see `viz/recorder.py`) with no live program, so that its breakpoints can be browsed after it has exited.
+ *
+ * The recording's index is read once, and each record is read from the log only when it is requested, by its offset
+ * and length in the index. Tensor contents are read from the blob the same way, so browsing a long recording only
+ * ever reads the breakpoints and tensors which are inspected.
+ */
+
+let fs   = require("fs");    // Filesystem IO
+let path = require("path");  // Filesystem paths
+let zlib = require("zlib");  // Compressing payloads
+
+/** The typed arrays in which the blob's tensors are read, keyed by the numpy dtype string the recorder writes. */
+const BLOB_ARRAYS = {
+    "<f4": Float32Array,
+    "<f8": Float64Array,
+    "|i1": Int8Array,
+    "<i2": Int16Array,
+    "<i4": Int32Array,
+    "|u1": Uint8Array,
+    "<u2": Uint16Array,
+    "<u4": Uint32Array,
+};
+
+/**
+ * Reads `length` bytes at `offset` in an open file.
+ */
+function readAt(fd, offset, length) {
+    let buffer = Buffer.alloc(length);
+    fs.readSync(fd, buffer, 0, length, offset);
+    return buffer;
+}
+
+/**
+ * Returns the nested arrays of the tensor in the blob at `ref`, of the form {offset, dtype, shape}.
+ */
+function readTensor(blobFd, ref) {
+    let ArrayType = BLOB_ARRAYS[ref.dtype];
+    let size = ref.shape.reduce(function(product, dim) { return product * dim; }, 1);
+    let buffer = readAt(blobFd, ref.offset, size * ArrayType.BYTES_PER_ELEMENT);
+    let values = new ArrayType(buffer.buffer, buffer.byteOffset, size);
+    let nest = function(start, depth) {
+        if(depth === ref.shape.length) return values[start];
+        let stride = ref.shape.slice(depth + 1).reduce(function(product, dim) { return product * dim; }, 1);
+        let nested = [];
+        for(let i = 0; i < ref.shape[depth]; i++) nested.push(nest(start + i * stride, depth + 1));
+        return nested;
+    };
+    return nest(0, 0);
+}
+
+/**
+ * Returns `json` encoded as the program would send it: as is if `encoding` is null, or else compressed in `encoding`
+ * and base64-encoded (see `sendPayload` in `server.js`).
+ */
+function encodePayload(json, encoding) {
+    if(encoding === null || encoding === undefined) return json;
+    let compressed = encoding === "gzip" ? zlib.gzipSync(json) : zlib.deflateSync(json);
+    return compressed.toString("base64");
+}
+
+/**
+ * Returns an object which answers the debugger events sent by `server.js` from the recording in `directory`, as the
+ * program's socket would. Stepping or continuing moves to the next recorded breakpoint, and "dbg-seek" moves to any
+ * breakpoint by its number. Events which cannot be answered from a recording are answered with null.
+ */
+function createReplaySocket(directory) {
+    let index = fs.readFileSync(path.join(directory, "index.jsonl"), "utf8").split("\n")
+        .filter(function(line) { return line.length > 0; })
+        .map(function(line) { return JSON.parse(line); });
+    let breakpoints = index.filter(function(entry) { return entry.kind === "breakpoint"; });
+    let logFd = fs.openSync(path.join(directory, "snapshots.jsonl"), "r");
+    let blobFd = fs.openSync(path.join(directory, "tensors.blob"), "r");
+    let position = 0;
+
+    let readRecord = function(entry) {
+        return JSON.parse(readAt(logFd, entry.offset, entry.length).toString("utf8"));
+    };
+
+    let contextAndNamespace = function(encoding) {
+        if(breakpoints.length === 0) return null;
+        let record = readRecord(breakpoints[position]);
+        return encodePayload(JSON.stringify({context: record.context, namespace: record.namespace}), encoding);
+    };
+
+    let loadSymbol = function(symbol_id, encoding) {
+        if(breakpoints.length === 0) return null;
+        let seq = breakpoints[position].seq;
+        let entry = index.find(function(entry) {
+            return entry.kind === "symbol" && entry.seq === seq && entry.symbolid === symbol_id;
+        });
+        if(entry === undefined) return null;  // The symbol was not loaded at this breakpoint while recording
+        let record = readRecord(entry);
+        let viewer = record.data.viewer;
+        if(viewer && viewer.contents && viewer.contents.blob) {
+            viewer.contents = readTensor(blobFd, viewer.contents.blob);
+        }
+        return encodePayload(JSON.stringify({data: record.data, shells: record.shells}), encoding);
+    };
+
+    let step = function() {
+        position = Math.min(position + 1, Math.max(breakpoints.length - 1, 0));
+        return contextAndNamespace(null);
+    };
+
+    let handlers = {
+        "dbg-continue": step,
+        "dbg-step-over": step,
+        "dbg-step-into": step,
+        "dbg-step-out": step,
+        "dbg-seek": function(seq) {
+            let found = breakpoints.findIndex(function(entry) { return entry.seq === seq; });
+            if(found < 0) return null;
+            position = found;
+            return contextAndNamespace(null);
+        },
+        "dbg-stop": function() { return null; },
+        "dbg-get-namespace": contextAndNamespace,
+        "dbg-load-symbol": loadSymbol,
+    };
+
+    return {
+        emit: function(event) {
+            let args = Array.prototype.slice.call(arguments, 1, arguments.length - 1);
+            let callback = arguments[arguments.length - 1];
+            let handler = handlers[event];
+            let result = handler !== undefined ? handler.apply(null, args) : null;
+            setImmediate(function() { callback(result); });
+        },
+    };
+}
+
+module.exports = {createReplaySocket: createReplaySocket};
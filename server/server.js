@@ -14,6 +14,12 @@
  * Since the server is spun up as a child process of the Python program being debugged, once the program exits the
  * server will die.
  *
+ * A run recorded by the debugger (see `viz/recorder.py`) can instead be browsed with no live program by invoking:
+ *
+ *     node server.js --replay (record-dir) (client-port)
+ *
+ * in which case stepping moves through the recorded breakpoints, and `/api/debug/seek/:seq` jumps to any of them.
+ *
  * Notes:
  *     The server can be configured in the future to use HTTPS as such:
  *     https://stackoverflow.com/questions/11744975/enabling-https-on-express-js
@@ -25,22 +31,42 @@ let path     = require("path");      // Filesystem paths
 let http     = require("http");      // Serving over http protocol
 let async    = require("async");     // Asynchronous operations
 let socketio = require("socket.io"); // Inter-process socket communication
+let replay   = require("./replay");  // Serving recorded runs
 
 
 // Communication channels
 // ----------------------
 
+/** The directory of the recording being replayed, or null if the server is driven by a live program. */
+const REPLAY_DIR = process.argv[2] === "--replay" ? process.argv[3] : null;
+
 /** The port on which this server communicates with the Python debugger program. Specified during invocation of node. */
-const PROGRAM_PORT = process.argv[2] || 7000;
+const PROGRAM_PORT = REPLAY_DIR === null ? process.argv[2] || 7000 : null;
 
 /** The port on which this server communicates with the client browser. Specified during invocation of node. */
-const CLIENT_PORT = process.argv[3] || 8000;
+const CLIENT_PORT = (REPLAY_DIR === null ? process.argv[3] : process.argv[4]) || 8000;
 
 /** The socket currently being used to communicate with the Python debugger program. There should only be one socket
  *  to communicate on at any time, because the server is driven by a single debugger. It is the job of the debugger
  *  program to open a socket connection to this server, and reopen the connection on failure. */
 let programSocket = null;
 
+/** The requests which the connected program can serve beyond the usual ones, as it reports once connected. */
+let programCapabilities = {cancel: false};
+
+/** The breakpoint at which the program is paused, of the form {seq, context, namespace}, or null if the program is
+ *  running or not connected. `seq` counts the breakpoints published to clients (see `publishBreakpoint`). */
+let currentBreakpoint = null;
+let breakpointSeq = 0;
+
+/** The last breakpoint published to clients, of the same form, which is kept while the program runs so that the next
+ *  breakpoint is pushed as a diff against it; null if none has been published since the program connected. */
+let lastBreakpoint = null;
+
+/** The payloads of symbols loaded at the current breakpoint, keyed by symbol ID and encoding, so that a symbol
+ *  inspected in several clients is only loaded and serialized once by the program (see `loadSymbolPayload`). */
+let symbolPayloads = {};
+
 
 // =====================================================================================================================
 // Setup Express server with socket IO.
@@ -49,7 +75,10 @@ let programSocket = null;
 // Create server to use HTTP with socket IO
 let app = express();
 let server = http.createServer(app);
-let io = socketio(PROGRAM_PORT);
+let io = REPLAY_DIR === null ? socketio(PROGRAM_PORT) : null;
+
+// Clients subscribe to pushed program updates over socket IO on the client port.
+let clientIO = socketio(server);
 
 // =====================================================================================================================
 // Frontend request handlers.
@@ -81,6 +110,68 @@ app.use("/api", routerAPI);
 let routerAPIDebug = express.Router();
 routerAPI.use("/debug", routerAPIDebug);
 
+/** The debugging requests which a replayed recording can answer (see `replay.js`). The others need a live program,
+ *  and some, such as CANCEL, would act on whichever process launched this server, so they are not implemented. */
+const REPLAY_COMMANDS = ["continue", "stop", "step_over", "step_into", "step_out", "get_namespace", "seek",
+                         "load_symbol"];
+
+routerAPIDebug.use(function(req, resp, next) {
+    if(REPLAY_DIR !== null && REPLAY_COMMANDS.indexOf(req.path.split("/")[1]) < 0) {
+        console.error("Tried to " + req.path + " but replaying a recording.");
+        resp.sendStatus(501);  // "Not Implemented"
+        return;
+    }
+    next();
+});
+
+/** The content encodings in which the program can compress large payloads, in order of preference. */
+const PAYLOAD_ENCODINGS = ["gzip", "deflate"];
+
+/**
+ * Returns the content encoding in which the program should compress the payload for `req`, negotiated from its
+ * Accept-Encoding header, or null if the client accepts none of `PAYLOAD_ENCODINGS`.
+ */
+function negotiateEncoding(req) {
+    let encoding = req.acceptsEncodings(PAYLOAD_ENCODINGS);
+    return PAYLOAD_ENCODINGS.indexOf(encoding) >= 0 ? encoding : null;
+}
+
+/**
+ * Returns whether `payload` from the program is an error reply, the uncompressed JSON of an "error" message which the
+ * program sends instead of a payload when a request names a symbol it cannot serve. Compressed payloads are base64,
+ * so they never start with a brace.
+ */
+function isErrorPayload(payload) {
+    return typeof payload === "string" && payload.lastIndexOf("{\"error\"", 0) === 0;
+}
+
+/**
+ * Sends the client a payload from the program, which is either a JSON string or, if `encoding` is not null, the base64
+ * of the JSON compressed in that encoding. Compressed payloads are forwarded without being decompressed, so the server
+ * never holds their JSON, and the browser decompresses them. Namespaces are the exception: they are always sent
+ * uncompressed, as the server keeps and diffs each breakpoint's namespace (see `publishBreakpoint`). A null payload,
+ * which a replayed recording sends for data it does not hold, is sent as not found, and an error reply (see
+ * `isErrorPayload`) is sent uncompressed as a bad request.
+ */
+function sendPayload(resp, payload, encoding) {
+    if(payload === null) {
+        resp.sendStatus(404);  // "Not Found"
+        return;
+    }
+    if(isErrorPayload(payload)) {
+        resp.status(400).type("json").send(payload);  // "Bad Request"
+        return;
+    }
+    resp.type("json");
+    if(encoding === null) {
+        resp.send(payload);
+        return;
+    }
+    resp.set("Content-Encoding", encoding);
+    resp.vary("Accept-Encoding");
+    resp.send(Buffer.from(payload, "base64"));
+}
+
 /**
  * GET /api/debug/continue
  * Triggers the debugger to CONTINUE (resumes execution until the next breakpoint is reached).
@@ -93,8 +184,10 @@ routerAPIDebug.get("/continue", function(req, resp) {
         return;
     }
 
+    broadcastProgramState("running");
     programSocket.emit("dbg-continue", function(context_and_namespace) {
         resp.send(context_and_namespace);
+        publishBreakpoint(context_and_namespace);
         console.log("Sent namespace variable data after CONTINUE.");
     });
 });
@@ -129,8 +222,10 @@ routerAPIDebug.get("/step_over", function(req, resp) {
         return;
     }
 
+    broadcastProgramState("running");
     programSocket.emit("dbg-step-over", function(context_and_namespace) {
         resp.send(context_and_namespace);
+        publishBreakpoint(context_and_namespace);
         console.log("Sent namespace variable data after STEP OVER.");
     });
 });
@@ -147,8 +242,10 @@ routerAPIDebug.get("/step_into", function(req, resp) {
         return;
     }
 
+    broadcastProgramState("running");
     programSocket.emit("dbg-step-into", function(context_and_namespace) {
         resp.send(context_and_namespace);
+        publishBreakpoint(context_and_namespace);
         console.log("Sent namespace variable data after STEP INTO.");
     });
 });
@@ -165,8 +262,10 @@ routerAPIDebug.get("/step_out", function(req, resp) {
         return;
     }
 
+    broadcastProgramState("running");
     programSocket.emit("dbg-step-out", function(context_and_namespace) {
         resp.send(context_and_namespace);
+        publishBreakpoint(context_and_namespace);
         console.log("Sent namespace variable data after STEP OUT.");
     });
 });
@@ -183,12 +282,48 @@ routerAPIDebug.get("/get_namespace", function(req, resp) {
         return;
     }
 
-    programSocket.emit("dbg-get-namespace", function(context_and_namespace) {
-        resp.send(context_and_namespace);
+    // Every client asks for the namespace when it opens, so it is only serialized by the program once per breakpoint.
+    // The `seq` of the breakpoint is sent along, so that clients can apply the pushed diffs which follow it.
+    if(currentBreakpoint !== null) {
+        resp.type("json").send(currentBreakpoint);
+        console.log("Sent stored namespace variable data for GET NAMESPACE.");
+        return;
+    }
+    // The namespace is requested uncompressed, as the server parses it to diff it (see `publishBreakpoint`); it holds
+    // only shells, so it is small.
+    programSocket.emit("dbg-get-namespace", null, function(context_and_namespace) {
+        resp.type("json").send(publishBreakpoint(context_and_namespace));
         console.log("Sent namespace variable data after GET NAMESPACE.");
     });
 });
 
+/**
+ * GET /api/debug/seek/:seq
+ * Moves a replayed recording to the breakpoint numbered `seq`, so that a run can be browsed in any order.
+ * Sends the client the namespace variable data at that breakpoint.
+ */
+routerAPIDebug.get("/seek/:seq", function(req, resp) {
+    if(REPLAY_DIR === null) {
+        resp.sendStatus(501);  // "Not Implemented"
+        return;
+    }
+
+    var seq = parseInt(req.params.seq, 10);
+    if(isNaN(seq)) {
+        resp.sendStatus(400);  // "Bad Request"
+        return;
+    }
+    programSocket.emit("dbg-seek", seq, function(context_and_namespace) {
+        if(context_and_namespace === null) {
+            resp.sendStatus(404);  // "Not Found"
+            return;
+        }
+        resp.type("json").send(context_and_namespace);
+        publishBreakpoint(context_and_namespace);
+        console.log("Sent namespace variable data after SEEK.");
+    });
+});
+
 /**
  * GET /api/debug/load_symbol/:symbol_id
  * Triggers the debugger to LOAD SYMBOL using the specified symbol ID.
@@ -202,12 +337,238 @@ routerAPIDebug.get("/load_symbol/:symbol_id", function(req, resp) {
     }
 
     var symbol_id = req.params.symbol_id;
-    programSocket.emit("dbg-load-symbol", symbol_id, function(data_and_shells) {
-        resp.send(data_and_shells);
+    var encoding = negotiateEncoding(req);
+    loadSymbolPayload(symbol_id, encoding, function(data_and_shells) {
+        sendPayload(resp, data_and_shells, encoding);
         console.log("Sent symbol \"" + symbol_id + "\" data for LOAD SYMBOL.");
     });
 });
 
+/**
+ * GET /api/debug/get_graph/:symbol_id
+ * Triggers the debugger to GET GRAPH leading to the specified symbol ID.
+ * Sends the client a columnar snapshot of every graph object in the symbol's history, or an "error" message if the
+ * symbol is not tracked in the computation graph.
+ */
+routerAPIDebug.get("/get_graph/:symbol_id", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to GET GRAPH but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var symbol_id = req.params.symbol_id;
+    var encoding = negotiateEncoding(req);
+    programSocket.emit("dbg-get-graph", symbol_id, encoding, function(graph) {
+        sendPayload(resp, graph, encoding);
+        console.log("Sent symbol \"" + symbol_id + "\" graph for GET GRAPH.");
+    });
+});
+
+/**
+ * GET /api/debug/get_subgraph/:symbol_id/:height
+ * Triggers the debugger to GET SUBGRAPH of the specified container symbol ID, expanded down to the given height.
+ * Sends the client a columnar description of the container's contents, with deeper containers collapsed, or an
+ * "error" message if the symbol is not a loaded graph container.
+ */
+routerAPIDebug.get("/get_subgraph/:symbol_id/:height", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to GET SUBGRAPH but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var symbol_id = req.params.symbol_id;
+    var height = parseInt(req.params.height, 10);
+    if(isNaN(height)) {
+        resp.sendStatus(400);  // "Bad Request"
+        return;
+    }
+    var encoding = negotiateEncoding(req);
+    programSocket.emit("dbg-get-subgraph", symbol_id, height, encoding, function(graph) {
+        sendPayload(resp, graph, encoding);
+        console.log("Sent symbol \"" + symbol_id + "\" subgraph for GET SUBGRAPH.");
+    });
+});
+
+/**
+ * GET /api/debug/get_graph_diff/:symbol_id/:other_symbol_id
+ * Triggers the debugger to GET GRAPH DIFF between the computation graphs leading to the two specified symbol IDs.
+ * Sends the client only the ops which were added, removed or changed, or an "error" message if either symbol is not
+ * tracked in the computation graph.
+ */
+routerAPIDebug.get("/get_graph_diff/:symbol_id/:other_symbol_id", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to GET GRAPH DIFF but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var symbol_id = req.params.symbol_id;
+    var other_symbol_id = req.params.other_symbol_id;
+    programSocket.emit("dbg-get-graph-diff", symbol_id, other_symbol_id, function(diff) {
+        sendPayload(resp, diff, null);
+        console.log("Sent diff of symbols \"" + symbol_id + "\" and \"" + other_symbol_id + "\" for GET GRAPH DIFF.");
+    });
+});
+
+/**
+ * GET /api/debug/get_time_series/:width?method=lttb
+ * Triggers the debugger to GET TIME SERIES of the values surfaced at each tick, downsampled to the given width with
+ * the given method ("lttb" or "minmax", default "lttb").
+ */
+routerAPIDebug.get("/get_time_series/:width", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to GET TIME SERIES but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var width = parseInt(req.params.width, 10);
+    var method = req.query.method || "lttb";
+    if(isNaN(width) || (method !== "lttb" && method !== "minmax")) {
+        resp.sendStatus(400);  // "Bad Request"
+        return;
+    }
+    programSocket.emit("dbg-get-time-series", width, method, function(series) {
+        resp.send(series);
+        console.log("Sent time series at width " + width + " for GET TIME SERIES.");
+    });
+});
+
+/**
+ * GET /api/debug/get_overhead
+ * Triggers the debugger to GET OVERHEAD of graph tracking: the calls, cumulative time and retained bytes of each
+ * tracking function, if counting was enabled in the program.
+ */
+routerAPIDebug.get("/get_overhead", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to GET OVERHEAD but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    programSocket.emit("dbg-get-overhead", function(overhead) {
+        resp.send(overhead);
+        console.log("Sent tracking overhead for GET OVERHEAD.");
+    });
+});
+
+/**
+ * GET /api/debug/load_window/:symbol_id?window=0:100,0:100
+ * Triggers the debugger to LOAD WINDOW of the specified array-like symbol ID, given as a "start:stop" index range for
+ * each dimension. Sends the client the contents of only that window, or an "error" message if the symbol is not a
+ * loaded array or the window does not fit it.
+ */
+routerAPIDebug.get("/load_window/:symbol_id", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to LOAD WINDOW but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var symbol_id = req.params.symbol_id;
+    var window = String(req.query.window || "").split(",").map(function(range) {
+        return range.split(":").map(function(index) { return parseInt(index, 10); });
+    });
+    if(window.some(function(range) { return range.length !== 2 || isNaN(range[0]) || isNaN(range[1]); })) {
+        resp.sendStatus(400);  // "Bad Request"
+        return;
+    }
+    var encoding = negotiateEncoding(req);
+    programSocket.emit("dbg-load-window", symbol_id, window, encoding, function(contents) {
+        sendPayload(resp, contents, encoding);
+        console.log("Sent symbol \"" + symbol_id + "\" window for LOAD WINDOW.");
+    });
+});
+
+/**
+ * GET /api/debug/get_tile/:symbol_id/:zoom/:row/:col?maxmag=1.5
+ * Triggers the debugger to GET TILE of the heatmap of the specified array-like symbol ID, at the given zoom level and
+ * position in the tile grid. Sends the client the tile as a PNG image, so it can be drawn straight onto a canvas, or
+ * an "error" message if the symbol is not a loaded array or the tile is outside its tile grid.
+ */
+routerAPIDebug.get("/get_tile/:symbol_id/:zoom/:row/:col", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to GET TILE but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var symbol_id = req.params.symbol_id;
+    var zoom = parseInt(req.params.zoom, 10);
+    var row = parseInt(req.params.row, 10);
+    var col = parseInt(req.params.col, 10);
+    var maxmag = req.query.maxmag === undefined ? null : parseFloat(req.query.maxmag);
+    if(isNaN(zoom) || isNaN(row) || isNaN(col) || row < 0 || col < 0 || (maxmag !== null && !(maxmag > 0))) {
+        resp.sendStatus(400);  // "Bad Request"
+        return;
+    }
+    programSocket.emit("dbg-get-tile", symbol_id, zoom, row, col, maxmag, function(tile) {
+        if(tile === null || isErrorPayload(tile)) {
+            sendPayload(resp, tile, null);
+            return;
+        }
+        resp.type("png").send(Buffer.from(JSON.parse(tile).tile.png, "base64"));
+        console.log("Sent symbol \"" + symbol_id + "\" tile (" + zoom + ", " + row + ", " + col + ") for GET TILE.");
+    });
+});
+
+/**
+ * GET /api/debug/reload_symbol/:symbol_id?version=3
+ * Triggers the debugger to RELOAD SYMBOL of the specified array-like symbol ID, whose contents the client holds at the
+ * given version. Sends the client whether the contents are unchanged, a delta against that version, or that the
+ * symbol must be loaded anew, or an "error" message if the symbol is not a loaded array.
+ */
+routerAPIDebug.get("/reload_symbol/:symbol_id", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to RELOAD SYMBOL but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+
+    var symbol_id = req.params.symbol_id;
+    var version = parseInt(req.query.version, 10);
+    if(isNaN(version)) {
+        resp.sendStatus(400);  // "Bad Request"
+        return;
+    }
+    programSocket.emit("dbg-reload-symbol", symbol_id, version, function(reload) {
+        sendPayload(resp, reload, null);
+        console.log("Sent symbol \"" + symbol_id + "\" changes since version " + version + " for RELOAD SYMBOL.");
+    });
+});
+
+/**
+ * GET /api/debug/cancel
+ * Triggers the debugger to CANCEL the generation of the data object it is building, deferring attributes not yet
+ * evaluated. Requests to the program are handled one at a time, so this is signalled to the program process, the
+ * parent of this server, rather than sent over the socket. The signal would kill a program which cannot handle it, so
+ * it is only sent if the program said it can (see `programCapabilities`).
+ */
+routerAPIDebug.get("/cancel", function(req, resp) {
+    if(programSocket === null) {
+        console.error("Tried to CANCEL but not connected to program.");
+        resp.sendStatus(503);  // "Service Unavailable"
+        return;
+    }
+    if(!programCapabilities.cancel) {
+        console.error("Tried to CANCEL but the program cannot handle it.");
+        resp.sendStatus(501);  // "Not Implemented"
+        return;
+    }
+
+    try {
+        process.kill(process.ppid, "SIGUSR1");
+    } catch(err) {
+        console.error("Could not signal program to CANCEL: " + err.message);
+        resp.sendStatus(501);  // "Not Implemented"
+        return;
+    }
+    resp.sendStatus(200);
+    console.log("Signalled program to CANCEL data generation.");
+});
+
 /**
  * POST /api/debug/set_symbol/:symbol_id
  * Triggers the debugger to SET SYMBOL using the specified symbol ID.
@@ -226,25 +587,148 @@ routerAPIDebug.post("/set_symbol/:symbol_id", function(req, resp) {
 
 
 // =====================================================================================================================
-// IO communication handlers.
+// Client push handlers.
+// ---------------------
+// Every connected client is told when the program starts running and when it stops at a breakpoint, so that clients
+// need not poll, and a command issued in one client updates all of them. Namespaces are pushed as diffs against the
+// previous breakpoint, as most variables are unchanged from one step to the next.
 // =====================================================================================================================
 
-io.on("connection", function(socket) {
-    if(programSocket !== null) {
-        console.error("Tried to establish another program connection while already connected.");
+/**
+ * Pushes a change of the program's state ("running" or "disconnected") to every client. The last breakpoint is only
+ * forgotten once the program disconnects, as the breakpoint after a run is pushed as a diff against it.
+ */
+function broadcastProgramState(programState) {
+    currentBreakpoint = null;
+    if(programState === "disconnected") lastBreakpoint = null;
+    symbolPayloads = {};
+    clientIO.emit("program-state", {programState: programState});
+}
+
+/**
+ * Returns the diff between two namespaces, which map symbol IDs to shells: the shells which were `added` or changed,
+ * and the IDs of the symbols which were `removed`.
+ */
+function diffNamespaces(oldNamespace, newNamespace) {
+    let added = {};
+    Object.keys(newNamespace).forEach(function(symbol_id) {
+        if(!(symbol_id in oldNamespace) ||
+           JSON.stringify(oldNamespace[symbol_id]) !== JSON.stringify(newNamespace[symbol_id])) {
+            added[symbol_id] = newNamespace[symbol_id];
+        }
+    });
+    let removed = Object.keys(oldNamespace).filter(function(symbol_id) { return !(symbol_id in newNamespace); });
+    return {added: added, removed: removed};
+}
+
+/**
+ * Records the breakpoint the program has stopped at, given the JSON string of its context and namespace, and pushes it
+ * to every client as a "namespace-diff" against the previous breakpoint, whose `seq` is the diff's `base`. Symbol
+ * payloads loaded at the previous breakpoint are dropped. This parses the namespace, and serializes each of its shells
+ * to compare them; shells are small, so this costs far less than pushing the whole namespace to every client.
+ * Returns the breakpoint, of the form {seq, context, namespace}.
+ */
+function publishBreakpoint(context_and_namespace) {
+    let breakpoint = JSON.parse(context_and_namespace);
+    let previous = lastBreakpoint;
+    let diff = diffNamespaces(previous !== null ? previous.namespace : {}, breakpoint.namespace);
+    breakpointSeq += 1;
+    currentBreakpoint = lastBreakpoint = {seq: breakpointSeq, context: breakpoint.context,
+                                          namespace: breakpoint.namespace};
+    symbolPayloads = {};
+    clientIO.emit("namespace-diff", {
+        seq: breakpointSeq,
+        base: previous !== null ? previous.seq : null,
+        context: breakpoint.context,
+        added: diff.added,
+        removed: diff.removed,
+    });
+    return currentBreakpoint;
+}
+
+/**
+ * Calls `callback` with the payload of a symbol's data, loading it from the program only if it has not been loaded at
+ * the current breakpoint in the same encoding; requests for a symbol already being loaded wait for that load.
+ */
+function loadSymbolPayload(symbol_id, encoding, callback) {
+    let key = symbol_id + "/" + encoding;
+    let entry = symbolPayloads[key];
+    if(entry !== undefined && entry.payload !== undefined) {
+        callback(entry.payload);
         return;
     }
-    programSocket = socket;
-    console.log(`Connected to debugging program on port ${PROGRAM_PORT}`);
-
-    // Set disconnect handler.
-    socket.on("disconnect", function(){
-        programSocket = null;
-        console.log("Disconnected from debugging program.");
+    if(entry !== undefined) {
+        entry.waiting.push(callback);
+        return;
+    }
+    entry = symbolPayloads[key] = {waiting: [callback]};
+    programSocket.emit("dbg-load-symbol", symbol_id, encoding, function(data_and_shells) {
+        entry.payload = data_and_shells;
+        entry.waiting.forEach(function(waiting) { waiting(data_and_shells); });
+        entry.waiting = [];
     });
+}
+
+clientIO.on("connection", function(socket) {
+    // A new client is sent the whole namespace, as a diff against an empty one.
+    if(currentBreakpoint !== null) {
+        socket.emit("namespace-diff", {
+            seq: currentBreakpoint.seq,
+            base: null,
+            context: currentBreakpoint.context,
+            added: currentBreakpoint.namespace,
+            removed: [],
+        });
+    }
+    else {
+        socket.emit("program-state", {programState: programSocket !== null ? "running" : "disconnected"});
+    }
 });
 
 
+// =====================================================================================================================
+// IO communication handlers.
+// =====================================================================================================================
+
+if(REPLAY_DIR !== null) {
+    programSocket = replay.createReplaySocket(REPLAY_DIR);
+    console.log(`Replaying recording in ${REPLAY_DIR}`);
+}
+else {
+    io.on("connection", function(socket) {
+        if(programSocket !== null) {
+            console.error("Tried to establish another program connection while already connected.");
+            return;
+        }
+        programSocket = socket;
+        console.log(`Connected to debugging program on port ${PROGRAM_PORT}`);
+
+        // Set handler for the requests the program can serve.
+        socket.on("program-capabilities", function(capabilities) {
+            programCapabilities = JSON.parse(capabilities);
+        });
+
+        // Set handler for shells changed by loading a symbol, such as one whose full string replaced its fallback
+        // string, so that clients opened later are sent the new shells with the stored namespace.
+        socket.on("namespace-shells", function(shells) {
+            if(currentBreakpoint === null) return;
+            shells = JSON.parse(shells);
+            Object.keys(shells).forEach(function(symbol_id) {
+                if(symbol_id in currentBreakpoint.namespace) currentBreakpoint.namespace[symbol_id] = shells[symbol_id];
+            });
+        });
+
+        // Set disconnect handler.
+        socket.on("disconnect", function(){
+            programSocket = null;
+            programCapabilities = {cancel: false};
+            broadcastProgramState("disconnected");
+            console.log("Disconnected from debugging program.");
+        });
+    });
+}
+
+
 // =====================================================================================================================
 // Begin server operation.
 // =====================================================================================================================
@@ -0,0 +1,379 @@
+import base64
+import gzip
+import json
+import operator
+import os
+import signal
+import threading
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+import viz.graphtracker as gt
+from viz.engine import VisualizationEngine, DataGenerationCancelled
+
+
+def _load(engine, obj):
+    """Registers `obj` as a symbol at a new breakpoint and returns its ID."""
+    engine.reset_cache()
+    symbol_id = engine._sanitize_for_data_object(obj, set())[len(engine.REF_PREFIX):]
+    engine.get_symbol_shell(symbol_id)
+    return symbol_id
+
+
+# ======================================================================================================================
+# Deltas of array contents.
+# ======================================================================================================================
+
+def _apply_delta(held, delta):
+    flat = held.reshape(-1)
+    if delta['format'] == 'sparse':
+        flat[delta['indices']] = delta['values']
+        return
+    size, offset = delta['blocksize'], 0
+    for block in delta['blocks']:
+        n = len(flat[block * size:(block + 1) * size])
+        flat[block * size:(block + 1) * size] = delta['values'][offset:offset + n]
+        offset += n
+
+
+def test_get_delta_prefers_sparse_for_scattered_changes():
+    engine = VisualizationEngine()
+    contents = np.zeros(1000)
+    changed = np.array([3, 700])
+    delta = engine._get_delta(contents, changed)
+    assert delta == {'format': 'sparse', 'indices': [3, 700], 'values': [0.0, 0.0]}
+
+
+def test_get_delta_prefers_blocks_for_contiguous_changes():
+    engine = VisualizationEngine()
+    contents = np.arange(2048.0)
+    delta = engine._get_delta(contents, np.arange(256, 512))
+    assert delta['format'] == 'block' and delta['blocks'] == [1] and delta['values'] == list(range(256, 512))
+
+
+def test_get_delta_gives_up_on_large_changes():
+    engine = VisualizationEngine()
+    assert engine._get_delta(np.arange(100.0), np.arange(60)) is None
+
+
+def test_get_changed_indices_treats_nans_as_equal():
+    old = np.array([1.0, np.nan, 3.0])
+    new = np.array([1.0, np.nan, 4.0])
+    assert VisualizationEngine._get_changed_indices(old, new).tolist() == [2]
+
+
+def test_symbol_delta_is_snapshotted_only_on_reload():
+    engine = VisualizationEngine()
+    weights = np.random.RandomState(0).randn(20, 50)
+    symbol_id = _load(engine, weights)
+    viewer = engine.get_symbol_data(symbol_id)[0]['viewer']
+    held = np.array(viewer['contents'])
+    assert engine.snapshots == {}
+
+    assert engine.get_symbol_delta(symbol_id, viewer['version']) == {'status': 'unchanged',
+                                                                     'version': viewer['version']}
+    assert symbol_id in engine.snapshots
+
+    # Writes through a view bypass any modification counter, so only the contents can show the change.
+    view = weights[10:12]
+    view[:, 5] += 1
+    symbol_id = _load(engine, weights)
+    reload = engine.get_symbol_delta(symbol_id, viewer['version'])
+    assert reload['status'] == 'delta' and reload['base'] == viewer['version']
+    _apply_delta(held, reload['delta'])
+    assert np.array_equal(held, weights)
+    assert engine.get_symbol_delta(symbol_id, reload['version'])['status'] == 'unchanged'
+
+
+def test_symbol_delta_reloads_without_snapshot():
+    engine = VisualizationEngine()
+    weights = np.zeros(100)
+    symbol_id = _load(engine, weights)
+    version = engine.get_symbol_data(symbol_id)[0]['viewer']['version']
+    weights[0] = 1
+    symbol_id = _load(engine, weights)
+    assert engine.get_symbol_delta(symbol_id, version) == {'status': 'reload'}
+    # The reload snapshotted the contents the client loads next, so the following change is sent as a delta.
+    version = engine.get_symbol_data(symbol_id)[0]['viewer']['version']
+    weights[1] = 1
+    assert engine.get_symbol_delta(symbol_id, version)['status'] == 'delta'
+
+
+# ======================================================================================================================
+# Time budget and cancellation.
+# ======================================================================================================================
+
+class _Slow:
+    @property
+    def a_slow(self):
+        time.sleep(0.2)
+        return 'slow'
+
+    @property
+    def b_after(self):
+        return 'after'
+
+    @property
+    def hang(self):
+        while True:
+            time.sleep(0.01)
+
+
+def test_attributes_past_the_budget_are_deferred():
+    engine = VisualizationEngine()
+    engine.DATA_TIME_BUDGET = 0.1
+    symbol_id = _load(engine, _Slow())
+    data, shells = engine.get_symbol_data(symbol_id)
+    contents = data['viewer']['contents']
+    assert contents['a_slow'] == 'slow'
+    assert shells[contents['b_after']]['type'] == 'deferred'
+    deferred, _ = engine.get_symbol_data(contents['b_after'][len(engine.REF_PREFIX):])
+    assert deferred['viewer']['contents'] == 'after'
+
+
+def test_cancel_reports_evaluation_once():
+    engine = VisualizationEngine()
+    assert not engine.cancel()
+    engine.evaluating_attr = True
+    assert engine.cancel()
+    assert not engine.cancel()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR1'), reason='needs SIGUSR1')
+def test_cancel_signal_abandons_attribute():
+    engine = VisualizationEngine()
+
+    def handler(signum, frame):
+        if engine.cancel():
+            raise DataGenerationCancelled()
+
+    previous = signal.signal(signal.SIGUSR1, handler)
+    try:
+        threading.Timer(0.1, lambda: os.kill(os.getpid(), signal.SIGUSR1)).start()
+        symbol_id = _load(engine, type('Hanging', (), {'hang': _Slow.hang, 'b': 2})())
+        data, shells = engine.get_symbol_data(symbol_id)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+    assert shells[data['viewer']['contents']['hang']]['type'] == 'deferred'
+    assert not engine.evaluating_attr
+
+
+def test_shell_strings_fall_back_once_all_types_spend_the_total_budget():
+    engine = VisualizationEngine()
+    engine.str_costs['dict'] = engine.str_costs['list'] = engine.SHELL_STR_BUDGET
+    type_info = VisualizationEngine._get_type_info_obj(_Slow())
+    assert engine._get_shell_str(type_info, _Slow())[1] is False
+    engine.str_costs['set'] = engine.SHELL_STR_TOTAL_BUDGET
+    assert engine._get_shell_str(type_info, _Slow()) == ('<_Slow>', True)
+    assert engine._get_shell_str(VisualizationEngine._get_type_info_obj(3), 3) == ('3', False)
+
+
+# ======================================================================================================================
+# Windows of arrays.
+# ======================================================================================================================
+
+def test_leading_window_halves_longest_extent():
+    engine = VisualizationEngine()
+    engine.MAX_WINDOW_ELEMENTS = 100
+    assert engine._get_leading_window((10, 10)) == [10, 10]
+    assert engine._get_leading_window((1000, 3)) == [32, 3]
+    assert engine._get_leading_window(()) == []
+
+
+def test_array_data_object_holds_leading_window():
+    engine = VisualizationEngine()
+    array = np.arange(40000.0).reshape(2, 100, 200)
+    viewer = engine.get_symbol_data(_load(engine, array))[0]['viewer']
+    assert viewer['window'] == [2, 50, 100] and viewer['size'] == [2, 100, 200]
+    assert viewer['maxmag'] == array[1, 49, 99]
+
+
+def test_tiled_arrays_are_sent_without_contents():
+    engine = VisualizationEngine()
+    symbol_id = _load(engine, np.zeros((40, 40)))
+    viewer = engine.get_symbol_data(symbol_id)[0]['viewer']
+    assert viewer == {'size': [40, 40], 'type': 'float64', 'tiles': {'tilesize': 256, 'minzoom': -6, 'maxzoom': 8}}
+    assert engine.get_symbol_delta(symbol_id, 0) == {'status': 'reload'}
+
+
+def test_requested_windows_are_clamped():
+    engine = VisualizationEngine()
+    array = np.arange(40000.0).reshape(200, 200)
+    symbol_id = _load(engine, array)
+    window = engine.get_symbol_window(symbol_id, [[150, 10 ** 9], [-5, 200]])
+    assert window['window'][0][0] == 150 and window['window'][1][0] == 0
+    extents = [stop - start for start, stop in window['window']]
+    assert np.prod(extents) <= engine.MAX_WINDOW_ELEMENTS
+    assert np.array_equal(window['contents'], array[150:150 + extents[0], :extents[1]])
+    assert window['maxmag'] == np.abs(np.array(window['contents'])).max()
+
+
+def test_maxmag_ignores_non_finite_values():
+    assert VisualizationEngine._get_maxmag(np.array([1.0, -3.0, np.inf, np.nan])) == 3.0
+    assert VisualizationEngine._get_maxmag(np.array(['a'])) is None
+
+
+def test_tile_maxmag_covers_whole_array_once_per_breakpoint():
+    engine = VisualizationEngine()
+    engine.MAXMAG_CHUNK_ELEMENTS = 1000
+    array = np.ones((200, 200))
+    array[199, 199] = -8.0
+    array[0, 0] = np.inf
+    symbol_id = _load(engine, array)
+    engine.get_symbol_tile(symbol_id, 0, 0, 0)
+    assert engine.cache[symbol_id][engine.MAXMAG] == 8.0
+    array[199, 199] = -16.0
+    engine.get_symbol_tile(symbol_id, 0, 0, 0)
+    assert engine.cache[symbol_id][engine.MAXMAG] == 8.0
+    symbol_id = _load(engine, array)
+    engine.get_symbol_tile(symbol_id, 0, 0, 0)
+    assert engine.cache[symbol_id][engine.MAXMAG] == 16.0
+
+
+def test_pixels_keep_the_largest_magnitude_of_each_square():
+    engine = VisualizationEngine()
+    engine.MAXMAG_CHUNK_ELEMENTS = 8
+    array = np.random.RandomState(0).randn(7, 10)
+    array[6, 9] = np.nan
+    pixels = engine._read_matrix_pixels(engine.NDARRAY, array, [7, 10], [[0, 7], [0, 10]], 4)
+    assert pixels.shape == (2, 3)
+    for r in range(2):
+        for c in range(3):
+            square = array[4 * r:4 * r + 4, 4 * c:4 * c + 4]
+            square = square[np.isfinite(square)]
+            assert pixels[r, c] == square[np.argmax(np.abs(square))]
+
+
+def test_tile_zoom_is_clamped():
+    engine = VisualizationEngine()
+    symbol_id = _load(engine, np.arange(200000.0))
+    tile = engine.get_symbol_tile(symbol_id, -40, 0, 0)
+    assert tile['rows'] == 1 and tile['cols'] == -(-200000 // (engine.TILE_SIZE * 2 ** -engine.MIN_TILE_ZOOM))
+    assert engine.get_symbol_tile(symbol_id, 40, 0, 0)['cols'] == 200000
+
+
+def test_tiles_outside_the_grid_are_refused():
+    engine = VisualizationEngine()
+    symbol_id = _load(engine, np.zeros((300, 10)))
+    assert engine.get_symbol_tile(symbol_id, 0, 1, 0)['rows'] == 2
+    for row, col in [(2, 0), (0, 1), (-1, 0)]:
+        with pytest.raises(ValueError):
+            engine.get_symbol_tile(symbol_id, 0, row, col)
+
+
+class _SparseStub:
+    """Stands in for a sparse tensor, with nonzeros `values` at the (unsorted) COO `indices`."""
+    is_cuda = False
+
+    def __init__(self, indices, values, size):
+        self.indices, self.values, self._size = np.array(indices), np.array(values), size
+        self.coalesce_calls = 0
+
+    def size(self):
+        return self._size
+
+    def type(self):
+        return 'torch.sparse.DoubleTensor'
+
+    def coalesce(self):
+        self.coalesce_calls += 1
+        return self
+
+    def _indices(self):
+        return _CpuArray(self.indices)
+
+    def _values(self):
+        return _CpuArray(self.values)
+
+
+class _CpuArray:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+def test_sparse_coo_is_sorted_and_cached_per_breakpoint():
+    engine = VisualizationEngine()
+    obj = _SparseStub([[5, 1, 3], [0, 2, 1]], [1.0, 2.0, 3.0], [6, 4])
+    engine.cache[engine._get_symbol_id(obj)] = {engine.OBJ: obj}
+    indices, values = engine._get_sparse_coo(obj)
+    assert indices.tolist() == [[1, 3, 5], [2, 1, 0]] and values.tolist() == [2.0, 3.0, 1.0]
+    engine._get_sparse_coo(obj)
+    assert obj.coalesce_calls == 1
+
+
+def test_sparse_window_holds_only_its_nonzeros():
+    obj = _SparseStub([[1, 3, 3, 5], [2, 0, 3, 0]], [2.0, 3.0, 4.0, 1.0], [6, 4])
+    dense, indices, values = VisualizationEngine._get_sparse_window(obj, [[2, 5], [0, 3]], obj.indices, obj.values)
+    assert dense.tolist() == [[0.0, 0.0, 0.0], [3.0, 0.0, 0.0], [0.0, 0.0, 0.0]]
+    assert indices.tolist() == [[1], [0]] and values.tolist() == [3.0]
+
+
+def test_hybrid_sparse_tensors_window_their_dense_dimensions():
+    engine = VisualizationEngine()
+    obj = _SparseStub([[2, 0]], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]], [4, 3])
+    window = engine._generate_window_sparse_tensor(obj, [[0, 4], [1, 3]])
+    assert window.tolist() == [[5.0, 6.0], [0.0, 0.0], [2.0, 3.0], [0.0, 0.0]]
+    viewer = engine._generate_data_sparse_tensor(obj)[0]['viewer']
+    assert viewer['contents'] == [[4.0, 5.0, 6.0], [0.0, 0.0, 0.0], [1.0, 2.0, 3.0], [0.0, 0.0, 0.0]]
+    assert viewer['sparse']['indices'] == [[0, 2]] and viewer['sparse']['values'] == [[4.0, 5.0, 6.0], [1.0, 2.0, 3.0]]
+    assert viewer['sparse']['nnz'] == 2 and viewer['sparse']['density'] == 0.5
+
+
+
+# ======================================================================================================================
+# Computation graphs.
+# ======================================================================================================================
+
+def test_graphop_outputs_are_the_wrapped_objects():
+    engine = VisualizationEngine()
+    output = gt.OpGenerator(operator.add)(gt.track_data([1], None), [2])
+    data, refs = engine._generate_data_graphop(gt.get_graphdata(output).creator_op)
+    assert data['viewer']['outputs'] == [engine.REF_PREFIX + engine._get_symbol_id(output)]
+
+
+def test_subgraph_of_a_non_container_is_a_type_error():
+    engine = VisualizationEngine()
+    symbol_id = _load(engine, [1, 2])
+    with pytest.raises(TypeError):
+        engine.get_container_subgraph(symbol_id, 1)
+
+
+# ======================================================================================================================
+# Serialization.
+# ======================================================================================================================
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_compressed_json_round_trips(encoding):
+    engine = VisualizationEngine()
+    engine.JSON_CHUNK_SIZE = 64
+    obj = {'data': {'viewer': {'contents': list(range(1000))}}, 'shells': {'@id:1': {'str': 'x' * 300}}}
+    compressed = base64.b64decode(engine.to_json(obj, encoding))
+    decompressed = gzip.decompress(compressed) if encoding == 'gzip' else zlib.decompress(compressed)
+    assert json.loads(decompressed.decode('utf-8')) == obj == json.loads(engine.to_json(obj))
+
+
+def test_sparse_maxmag_reads_only_the_nonzeros():
+    engine = VisualizationEngine()
+    engine.MAXMAG_CHUNK_ELEMENTS = 1
+    obj = _SparseStub([[5, 1, 3], [0, 2, 1]], [1.0, -7.0, np.nan], [10 ** 9, 10 ** 9])
+    symbol_id = engine._get_symbol_id(obj)
+    engine.cache[symbol_id] = {engine.OBJ: obj}
+    assert engine._get_symbol_maxmag(symbol_id, engine.SPARSE_TENSOR, [10 ** 9, 10 ** 9]) == 7.0
+
+
+def test_non_numeric_arrays_are_sent_as_strings():
+    engine = VisualizationEngine()
+    for array, contents in [(np.array([1 + 2j]), ['(1+2j)']), (np.array([None, 'a'], dtype=object), ['None', 'a'])]:
+        symbol_id = _load(engine, array)
+        data, _ = engine.get_symbol_data(symbol_id)
+        assert json.loads(engine.to_json(data))['viewer']['contents'] == contents
+        assert engine.get_symbol_delta(symbol_id, 0) == {'status': 'reload'}
@@ -0,0 +1,36 @@
+import operator
+
+import numpy as np
+import pytest
+
+import viz.graphtracker as gt
+from viz.graphexport import BlobWriter, save_graph, load_graph
+
+
+class _Layer:
+    def __init__(self):
+        self.weights = np.arange(6.0).reshape(2, 3)
+        self.names = np.array(['a', 3], dtype=object)
+
+
+def test_saved_graph_round_trips_surfaced_values(tmpdir):
+    layer = gt.track_data(_Layer(), {'weights': 'weights', 'names': 'names'})
+    y = gt.OpGenerator(operator.add)(gt.track_data([1], None), [2])
+    y = gt.OpGenerator(lambda a, b: a)(y, layer)
+    path = str(tmpdir.join('graph.json'))
+    save_graph(y, path)
+
+    loaded = load_graph(path)
+    assert loaded.creator_op.fn_name == gt.get_graphdata(y).creator_op.fn_name
+    loaded_layer = loaded.creator_op.get_tracked_args()[1]
+    props = loaded_layer.get_visualization_dict()
+    assert isinstance(props['weights'], np.memmap) and np.array_equal(props['weights'], layer.weights)
+    assert props['names'] == ['a', 3]
+
+
+def test_blob_rejects_object_arrays(tmpdir):
+    with open(str(tmpdir.join('blob')), 'wb') as blob_file:
+        blob_writer = BlobWriter(blob_file)
+        assert blob_writer.write(np.arange(3, dtype=np.int32)) == {'offset': 0, 'dtype': '<i4', 'shape': [3]}
+        with pytest.raises(TypeError):
+            blob_writer.write(np.array([object()], dtype=object))
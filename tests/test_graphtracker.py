@@ -0,0 +1,125 @@
+import gc
+import operator
+import threading
+import weakref
+
+import pytest
+
+import viz.graphtracker as gt
+
+
+@pytest.fixture(autouse=True)
+def fresh_recording_state():
+    """Each test records as if on a thread which has not yet ticked, with no step templates."""
+    gt._state.__init__()
+    gt._step_templates.clear()
+    yield
+    gt._state.__init__()
+    gt._step_templates.clear()
+
+
+add = gt.OpGenerator(operator.add)
+mul = gt.OpGenerator(operator.mul)
+
+
+# ======================================================================================================================
+# Temporal containers.
+# ======================================================================================================================
+
+def test_ops_are_not_kept_without_tick():
+    x = gt.track_data([1], None)
+    y = add(x, [2])
+    op_ref = weakref.ref(gt.get_graphdata(y).creator_op)
+    assert not gt._state.frontiers and not gt._state.step_ops
+    del y
+    gc.collect()
+    assert op_ref() is None
+
+
+def test_first_tick_contains_ops_leading_to_output():
+    x = gt.track_data(1.0, {'self': None})
+    for _ in range(3):
+        x = mul(add(x, 1.0), 2.0)
+        gt.tick(x, 0)
+    step = gt.get_graphdata(x).creator_op.container
+    assert step.temporal_level == 1 and step.temporal_step == 2 and len(step.contents) == 2
+    first_step = gt.get_graphdata(x).creator_op.get_tracked_args()[0].creator_op.get_tracked_args()[0] \
+        .creator_op.container
+    assert first_step.temporal_step == 1
+    gt.tick(x, 1)
+    assert len(step.container.contents) == 3
+    assert sorted(s.temporal_step for s in step.container.contents) == [0, 1, 2]
+
+
+def test_isomorphic_steps_share_a_template():
+    x = gt.track_data(1.0, {'self': None})
+    steps = []
+    for _ in range(4):
+        x = mul(add(x, 1.0), 2.0)
+        gt.tick(x, 0)
+        steps.append(gt.get_graphdata(x).creator_op.container)
+    # The first step ends at the first tick, before any step ops are kept.
+    assert steps[0].step_ops is None and steps[1].template is None
+    assert steps[2].template is steps[1] and steps[3].template is steps[1]
+    assert len(steps[2].get_step_data()) == len(steps[1].get_step_data())
+
+
+# ======================================================================================================================
+# Sampled recording.
+# ======================================================================================================================
+
+def test_threads_follow_iterations_ended_by_other_threads():
+    previous_scheduler = gt.set_sampling_scheduler(gt.SamplingScheduler(period=2))
+    try:
+        assert gt._is_recording()
+        thread = threading.Thread(target=gt.tick, args=(None, 0))
+        thread.start()
+        thread.join()
+        assert not gt._is_recording()
+        assert not gt.has_graphdata(gt.track_data([1], None))
+        gt.tick(None, 0)
+        assert gt._is_recording()
+    finally:
+        gt.set_sampling_scheduler(previous_scheduler)
+
+
+# ======================================================================================================================
+# Graph diffs.
+# ======================================================================================================================
+
+def test_diff_graphs_reports_added_ops():
+    old = mul(add(gt.track_data(1.0, None), 1.0), 2.0)
+    new = add(mul(add(gt.track_data(1.0, None), 1.0), 2.0), 3.0)
+    added, removed, changed = gt.diff_graphs(old, new)
+    assert added == [gt.get_graphdata(new).creator_op] and removed == [] and changed == []
+
+
+def test_diff_graphs_reports_rewired_ops_as_changed():
+    old_x = gt.track_data(1.0, None)
+    old = mul(add(old_x, 1.0), old_x)
+    new_x = gt.track_data(1.0, None)
+    new = mul(new_x, add(new_x, 1.0))
+    added, removed, changed = gt.diff_graphs(old, new)
+    assert added == [] and removed == []
+    assert changed == [(gt.get_graphdata(old).creator_op, gt.get_graphdata(new).creator_op)]
+
+
+# ======================================================================================================================
+# Overhead instrumentation.
+# ======================================================================================================================
+
+def test_overhead_counters_are_installed_only_while_enabled():
+    track_data = gt.track_data
+    gt.set_overhead_stats(True)
+    try:
+        assert gt.track_data is not track_data and gt.track_data.__wrapped__ is track_data
+        x = gt.track_data([1], None)
+        for i in range(3):
+            gt.tick(add(x, [i]), 0)
+        stats = gt.get_overhead_stats()
+    finally:
+        gt.set_overhead_stats(False)
+    assert stats['OpGenerator.__call__']['calls'] == 3 and stats['GraphOp.__init__']['calls'] == 3
+    assert stats['tick']['calls'] == 3 and stats['track_data']['bytes'] > 0
+    assert gt.track_data is track_data and not hasattr(gt.GraphOp.__init__, '__wrapped__')
+    assert gt.get_overhead_stats() is None
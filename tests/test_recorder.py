@@ -0,0 +1,52 @@
+import json
+import os
+
+import numpy as np
+
+from viz.recorder import SnapshotRecorder
+
+
+def _read_records(directory):
+    with open(os.path.join(directory, 'index.jsonl')) as index_file:
+        index = [json.loads(line) for line in index_file]
+    with open(os.path.join(directory, 'snapshots.jsonl'), 'rb') as log_file:
+        log = log_file.read()
+    return index, [json.loads(log[entry['offset']:entry['offset'] + entry['length']]) for entry in index]
+
+
+def test_records_are_indexed(tmpdir):
+    recorder = SnapshotRecorder(str(tmpdir))
+    assert recorder.record_breakpoint(['frame'], {'@id:1': {'name': 'x'}}) == 1
+    recorder.record_symbol('1', 'number', {'viewer': {}}, {})
+    recorder.record_symbol('1', 'number', {'viewer': {}}, {})
+    recorder.close()
+    index, records = _read_records(str(tmpdir))
+    assert [entry['kind'] for entry in index] == ['breakpoint', 'symbol']
+    assert records[0]['namespace'] == {'@id:1': {'name': 'x'}}
+    assert records[1]['symbolid'] == '1' and records[1]['seq'] == 1
+
+
+def test_tensor_contents_are_moved_to_blob(tmpdir):
+    recorder = SnapshotRecorder(str(tmpdir))
+    recorder.record_breakpoint([], {})
+    data = {'viewer': {'type': 'float32', 'contents': [[1.0, 2.0], [3.0, 4.0]]}}
+    recorder.record_symbol('2', 'tensor', data, {})
+    recorder.close()
+    assert data['viewer']['contents'] == [[1.0, 2.0], [3.0, 4.0]]
+    _, records = _read_records(str(tmpdir))
+    ref = records[1]['data']['viewer']['contents']['blob']
+    blob = np.memmap(os.path.join(str(tmpdir), 'tensors.blob'), dtype=ref['dtype'], mode='r', offset=ref['offset'],
+                     shape=tuple(ref['shape']))
+    assert blob.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+
+
+def test_reopened_recording_appends(tmpdir):
+    recorder = SnapshotRecorder(str(tmpdir))
+    recorder.record_breakpoint([], {})
+    recorder.record_breakpoint([], {})
+    recorder.close()
+    recorder = SnapshotRecorder(str(tmpdir))
+    assert recorder.record_breakpoint([], {}) == 3
+    recorder.close()
+    index, records = _read_records(str(tmpdir))
+    assert [record['seq'] for record in records] == [1, 2, 3]
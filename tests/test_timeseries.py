@@ -0,0 +1,50 @@
+import numpy as np
+
+from viz.timeseries import RingBuffer, TimeSeriesRecorder, downsample_lttb, downsample_min_max
+
+
+def test_ring_buffer_returns_most_recent_points_oldest_first():
+    ring_buffer = RingBuffer(3)
+    for time in range(5):
+        ring_buffer.append(time, time * 10.0)
+    times, values = ring_buffer.get()
+    assert times.tolist() == [2, 3, 4] and values.tolist() == [20.0, 30.0, 40.0]
+
+
+def test_downsamplers_keep_endpoints_within_width():
+    times = np.arange(1000)
+    values = np.sin(times / 50.0)
+    for downsample in (downsample_min_max, downsample_lttb):
+        kept_times, kept_values = downsample(times, values, 50)
+        assert len(kept_times) <= 50
+        assert kept_times[0] == 0 and kept_times[-1] == 999
+        assert np.all(np.diff(kept_times) > 0)
+        assert np.array_equal(kept_values, values[kept_times])
+
+
+def test_min_max_keeps_spikes():
+    values = np.zeros(1000)
+    values[437] = 5.0
+    values[611] = -5.0
+    kept_times, _ = downsample_min_max(np.arange(1000), values, 20)
+    assert 437 in kept_times and 611 in kept_times
+
+
+def test_lttb_keeps_the_corner_of_a_step():
+    times = np.arange(100)
+    values = (times >= 40).astype(np.float64)
+    kept_times, _ = downsample_lttb(times, values, 10)
+    assert 39 in kept_times or 40 in kept_times
+
+
+def test_short_series_are_not_downsampled():
+    times, values = np.arange(5), np.arange(5.0)
+    for downsample in (downsample_min_max, downsample_lttb):
+        assert downsample(times, values, 10)[0] is times
+
+
+def test_recorder_leaves_gaps_for_untracked_ticks():
+    recorder = TimeSeriesRecorder(capacity=10)
+    recorder.record(None, 0)
+    recorder.record(None, 1)
+    assert recorder.time == 1 and recorder.series == {}
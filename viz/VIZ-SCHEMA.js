@@ -131,6 +131,16 @@
     }
 }
 
+{
+    "type": "deferred",
+    "str": "deferred <attr_name>"  // an attribute not evaluated within the time budget of its object's data object
+    "data": {
+    "viewer": {
+        "contents": "@id:1234",  // the value of the attribute, evaluated when this data object is loaded
+    },
+    "attributes": {}
+}
+
 {
     "type": "function",
     "str": "<fn function_name>"
@@ -156,6 +166,30 @@
 			"contents": [[1,2,3],[2,3,4]],
 			"size": [1,2,3],
 			"type": "float32", // "float16", "float32", "float64", "uint8", "int8", "int16", "int32", "int64"
+			"maxmag": 4, // largest magnitude in "contents"; for arrays with a "window", of that window only
+			// If the engine has a preview encoding, numeric "contents" are replaced by a quantized "preview", where
+			// each value is approximately quantized * scale + offset:
+			// "preview": {"encoding": "uint8", "shape": [1,2,3], "scale": 0.1, "offset": -2, "data": "<base64>"},
+			"window": [1,2,3], // for NumPy arrays, the extents of the leading window sent in "contents"; other windows
+			                   // are loaded with /api/debug/load_window
+			"version": 3, // a checksum of "contents", to send to /api/debug/reload_symbol?version=3 on a later inspection,
+			              // which returns {"status": "unchanged"}, {"status": "delta", "base": 3, "version": 4,
+			              // "delta": {"format": "sparse", "indices": [...], "values": [...]} or {"format": "block",
+			              // "blocksize": 256, "blocks": [...], "values": [...]}}, or {"status": "reload"}; flat indices
+			              // are into "contents" in row-major order
+			// Tensors with many elements are drawn from heatmap tiles, PNG images rendered by the program and loaded
+			// with /api/debug/get_tile/<symbol_id>/<zoom>/<row>/<col>?maxmag=<maxmag>. Their data objects have no
+			// "contents", "preview", "window" or "version", nor a "maxmag" unless sparse, but instead:
+			"tiles": {"tilesize": 256, "minzoom": -6, "maxzoom": 8}, // tile size in px, and the range of zoom levels
+			"sparse": { // only for sparse tensors, whose "contents" are the leading window densified
+				"format": "coo",
+				"indices": [[0,1],[2,0]], // for each sparse dimension, the indices of the nonzeros in the window;
+				                          // not sent for tiled tensors
+				"values": [1.5,-2], // the values of the nonzeros in the window, or in hybrid tensors, their blocks of
+				                    // the trailing dense dimensions; not sent for tiled tensors
+				"nnz": 2, // the number of nonzeros in the whole tensor
+				"density": 0.33, // the number of stored values divided by the number of elements
+			},
 		},
 		"attributes": {
 			// every non function attribute
@@ -172,6 +206,7 @@
 		"viewer": {
 			"creatorop": null, //reference to graphop symbol, or None if leaf,
 			"creatorpos"
+			"consumers": [], // references to graphop symbols which took this data as an argument, in order of execution
             "kvpairs": {
                 // user-defined key-value pairs
             }
@@ -1,12 +1,16 @@
 import atexit
 import bdb
+import signal
 import socket
 import sys
 import os
+import threading
 from subprocess import Popen
 from socketIO_client import SocketIO
 
-from viz.engine import VisualizationEngine
+from viz.engine import VisualizationEngine, DataGenerationCancelled
+from viz.graphtracker import get_overhead_stats
+from viz.recorder import SnapshotRecorder
 
 
 def _get_available_port(host, port_range):
@@ -129,14 +133,35 @@ class VisualDebugger(bdb.Bdb):
     DBG_STEP_OUT = 'dbg-step-out'                   # continue normal program flow until the current function exits
     DBG_LOAD_SYMBOL = 'dbg-load-symbol'             # return the data object for a given symbol
     DBG_GET_NAMESPACE = 'dbg-get-namespace'         # return the shells of all Python objects in the current namespace
-
-    def __init__(self, program_port_range=(3000, 5000), client_port_range=(8000, 9000)):
+    DBG_GET_GRAPH = 'dbg-get-graph'                 # return the whole computation graph leading to a given symbol
+    DBG_GET_SUBGRAPH = 'dbg-get-subgraph'           # return the contents of a graph container down to a given height
+    DBG_GET_GRAPH_DIFF = 'dbg-get-graph-diff'       # return the ops which differ between the graphs of two symbols
+    DBG_GET_TIME_SERIES = 'dbg-get-time-series'     # return the downsampled time series of values surfaced at ticks
+    DBG_GET_OVERHEAD = 'dbg-get-overhead'           # return the counters of graph tracking overhead, if enabled
+    DBG_LOAD_WINDOW = 'dbg-load-window'             # return the contents of a window of a given array-like symbol
+    DBG_GET_TILE = 'dbg-get-tile'                   # return a heatmap tile image of a given array-like symbol
+    DBG_RELOAD_SYMBOL = 'dbg-reload-symbol'         # return the changes to an array-like symbol since a given version
+
+    # This string is emitted by the VisualDebugger to the server once connected, with a JSON string of the requests it
+    # can serve beyond those above, of the form {'cancel': bool}.
+    PROGRAM_CAPABILITIES = 'program-capabilities'
+
+    # This string is emitted by the VisualDebugger to the server when loading a symbol's data changes the symbol's shell
+    # in the namespace, with a JSON string mapping its reference to the new shell, so that the namespace the server
+    # stores for newly opened clients holds the symbol's full string rather than its fallback string.
+    NAMESPACE_SHELLS = 'namespace-shells'
+
+    def __init__(self, program_port_range=(3000, 5000), client_port_range=(8000, 9000), preview_encoding=None,
+                 record_dir=None):
         """Instantiates the debugging server if not already running, connects to it via a socket, and prepares for
         requests.
 
         Args:
             program_port_range (int, int): The range of ports to sweep over for program-server communication.
             client_port_range (int, int): The range of ports to sweep over for server-client communication.
+            preview_encoding (str or None): The encoding of tensor previews; see `VisualizationEngine`.
+            record_dir (str or None): If given, every breakpoint, and every symbol loaded at it, is recorded to this
+                directory, to be browsed later by `node server.js --replay <record_dir>`; see `SnapshotRecorder`.
         """
         super(VisualDebugger, self).__init__()
         if self._server is None:
@@ -150,7 +175,10 @@ class VisualDebugger(bdb.Bdb):
         # -------------------
 
         # The visualization engine that generates and caches all visualizations for this debugger.
-        self.viz_engine = VisualizationEngine()
+        self.viz_engine = VisualizationEngine(preview_encoding)
+
+        # The recorder to which breakpoints and loaded symbols are appended, or `None` if the run is not recorded.
+        self.recorder = SnapshotRecorder(record_dir) if record_dir is not None else None
 
         # Indicates whether the debugger should wait for another request from the server, or stop listening.
         # Commands such as continue and step_over should not be waited after, so the program can continue until the
@@ -171,11 +199,24 @@ class VisualDebugger(bdb.Bdb):
         # context information should be extracted from.
         self.current_stack_index = None
 
+        # The context and namespace shells of the current breakpoint, computed when first requested; see
+        # `_get_context_and_namespace()`.
+        self.current_context_and_namespace = None
+
         # A list of callback functions to be executed once at the next encountered breakpoint. When the server issues
         # a control flow command, it will typically ask that a callback be executed when the command terminates. Such
         # callbacks would be added to this list, called when the program has halted again.
         self.next_breakpoint_callbacks = []
 
+        # The debugger handles requests on the thread which reads from the socket, so a cancellation cannot be sent as
+        # another request while a data object is being generated. The server, a child process of this program, sends
+        # SIGUSR1 instead. Signal handlers can only be set from the main thread, and SIGUSR1 does not exist on Windows.
+        # Otherwise, SIGUSR1 would kill the program, so the server is told whether it may send it.
+        can_cancel = hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread()
+        if can_cancel:
+            signal.signal(signal.SIGUSR1, self._handle_cancel_signal)
+        self.socket.emit(self.PROGRAM_CAPABILITIES, self.viz_engine.to_json({'cancel': can_cancel}))
+
     def _attach_socket_callbacks(self):
         """Adds callbacks to self.socket to handle requests from server.
 
@@ -190,6 +231,14 @@ class VisualDebugger(bdb.Bdb):
         self.socket.on(self.DBG_CONTINUE, self.callback_continue)
         self.socket.on(self.DBG_LOAD_SYMBOL, self.callback_load_symbol)
         self.socket.on(self.DBG_GET_NAMESPACE, self.callback_get_namespace_shells)
+        self.socket.on(self.DBG_GET_GRAPH, self.callback_get_graph)
+        self.socket.on(self.DBG_GET_SUBGRAPH, self.callback_get_subgraph)
+        self.socket.on(self.DBG_GET_GRAPH_DIFF, self.callback_get_graph_diff)
+        self.socket.on(self.DBG_GET_TIME_SERIES, self.callback_get_time_series)
+        self.socket.on(self.DBG_GET_OVERHEAD, self.callback_get_overhead)
+        self.socket.on(self.DBG_LOAD_WINDOW, self.callback_load_window)
+        self.socket.on(self.DBG_GET_TILE, self.callback_get_tile)
+        self.socket.on(self.DBG_RELOAD_SYMBOL, self.callback_reload_symbol)
 
     def forget_frame(self):
         """Wipes the debugger's knowledge of the current frame and stack.
@@ -201,6 +250,7 @@ class VisualDebugger(bdb.Bdb):
         self.current_frame = None
         self.current_stack = None
         self.current_stack_index = None
+        self.current_context_and_namespace = None
 
     def reset(self):
         """Extends `bdb`'s default behavior to also clear the `VisualDebugger`'s knowledge of the current frame."""
@@ -220,6 +270,9 @@ class VisualDebugger(bdb.Bdb):
         self.forget_frame()
         self.current_stack, self.current_stack_index = self.get_stack(frame, None)
         self.current_frame = self.current_stack[self.current_stack_index][0]
+        if self.recorder is not None:
+            # Every breakpoint is recorded, even if no client asks for it.
+            self._get_context_and_namespace()
         for callback in self.next_breakpoint_callbacks:
             callback()
         self.next_breakpoint_callbacks.clear()
@@ -282,10 +335,7 @@ class VisualDebugger(bdb.Bdb):
         def _callback():
             callback_fn(
                 self.viz_engine.to_json(
-                    {
-                        'context': self._get_context(),
-                        'namespace': self._get_namespace_shells()
-                    }
+                    self._get_context_and_namespace()
                 )
             )
         return _callback
@@ -296,7 +346,7 @@ class VisualDebugger(bdb.Bdb):
     # These functions return a piece of information requested by the server.
     # ==================================================================================================================
 
-    def callback_get_namespace_shells(self, callback_fn):
+    def callback_get_namespace_shells(self, encoding, callback_fn):
         """Gets the lightweight shell representations of all symbols in the program's current namespace.
 
         The server might at any time request the shells of all objects in the namespace (for example, when a new
@@ -304,20 +354,20 @@ class VisualDebugger(bdb.Bdb):
         and returns those shells as well as a string representing the program's current context (see `_get_context()`).
 
         Args:
+            encoding (str or None): The content encoding in which to compress the JSON (see
+                `VisualizationEngine.to_json()`), or `None`.
             callback_fn (fn): A (str, str) => None function from the server which expects a context string for the
                 program and the JSON string representation of the dict mapping symbol IDs to shells for each symbol in
                 the namespace.
         """
         callback_fn(
             self.viz_engine.to_json(
-                {
-                    'context': self._get_context(),
-                    'namespace': self._get_namespace_shells()
-                }
+                self._get_context_and_namespace(),
+                encoding
             )
         )
 
-    def callback_load_symbol(self, symbol_id, callback_fn):
+    def callback_load_symbol(self, symbol_id, encoding, callback_fn):
         """Load a symbol's data object and pass it into the given callback.
 
         When the server asks to load a symbol's data object, it sends the symbol ID and a callback function
@@ -326,19 +376,209 @@ class VisualDebugger(bdb.Bdb):
 
         Args:
             symbol_id (str): A string representing the unique ID of a Python object in the program.
+            encoding (str or None): The content encoding in which to compress the JSON (see
+                `VisualizationEngine.to_json()`), or `None`.
             callback_fn (fn): A (str, str) => None function which accepts a JSON string of the requested symbol's
                 data object and the JSON string mapping any symbols referenced by the data object to their shells.
         """
         data, shells = self._load_symbol(symbol_id)
+        ref = self.viz_engine.REF_PREFIX + symbol_id
+        if ref in shells:
+            self.socket.emit(self.NAMESPACE_SHELLS, self.viz_engine.to_json({ref: shells[ref]}))
+        if self.recorder is not None:
+            self.recorder.record_symbol(symbol_id, self.viz_engine.get_symbol_shell(symbol_id)['type'], data, shells)
         callback_fn(
             self.viz_engine.to_json(
                 {
                     'data': data,
                     'shells': shells,
+                },
+                encoding
+            )
+        )
+
+    def callback_get_graph(self, symbol_id, encoding, callback_fn):
+        """Load a snapshot of the computation graph leading to a symbol and pass it into the given callback.
+
+        The snapshot describes every graph object in the symbol's history in one response, rather than requiring the
+        client to load each one as a separate symbol (see `VisualizationEngine.get_graph_snapshot()`).
+
+        Args:
+            symbol_id (str): The ID of a symbol which is tracked in the computation graph.
+            encoding (str or None): The content encoding in which to compress the JSON (see
+                `VisualizationEngine.to_json()`), or `None`.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the graph snapshot, or of an
+                'error' message if the symbol is not tracked in the computation graph.
+        """
+        try:
+            payload = {'graph': self.viz_engine.get_graph_snapshot(symbol_id)}
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_engine_error(callback_fn, e)
+            return
+        callback_fn(self.viz_engine.to_json(payload, encoding))
+
+    def callback_get_subgraph(self, symbol_id, height, encoding, callback_fn):
+        """Load the contents of a graph container down to a nesting height and pass them into the given callback.
+
+        Containers nested deeper than `height` are collapsed and summarized (see
+        `VisualizationEngine.get_container_subgraph()`), so that zooming into one part of a large graph only transfers
+        that part.
+
+        Args:
+            symbol_id (str): The ID of a graph container symbol.
+            height (int or str): The number of nesting levels to expand.
+            encoding (str or None): The content encoding in which to compress the JSON (see
+                `VisualizationEngine.to_json()`), or `None`.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the subgraph, or of an 'error'
+                message if the symbol is not a loaded graph container.
+        """
+        try:
+            payload = {'graph': self.viz_engine.get_container_subgraph(symbol_id, int(height))}
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_engine_error(callback_fn, e)
+            return
+        callback_fn(self.viz_engine.to_json(payload, encoding))
+
+    def callback_get_graph_diff(self, symbol_id, other_symbol_id, callback_fn):
+        """Compare the computation graphs leading to two symbols and pass the ops which differ into the given callback.
+
+        Only the delta is transferred (see `VisualizationEngine.get_graph_diff()`), so that divergence between two
+        iterations can be found without loading either graph in full.
+
+        Args:
+            symbol_id (str): The ID of the symbol whose history is the first graph.
+            other_symbol_id (str): The ID of the symbol whose history is the second graph.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the graph diff, or of an 'error'
+                message if either symbol is not tracked in the computation graph.
+        """
+        try:
+            payload = {'diff': self.viz_engine.get_graph_diff(symbol_id, other_symbol_id)}
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_engine_error(callback_fn, e)
+            return
+        callback_fn(self.viz_engine.to_json(payload))
+
+    def callback_get_time_series(self, width, method, callback_fn):
+        """Load the time series of values surfaced at each tick and pass them into the given callback.
+
+        Each series is downsampled to at most `width` points (see `VisualizationEngine.get_time_series()`), so long
+        runs are sent in a constant payload.
+
+        Args:
+            width (int or str): The maximum number of points per series.
+            method (str): The downsampling method, 'lttb' or 'minmax'.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the time series.
+        """
+        callback_fn(
+            self.viz_engine.to_json(
+                {
+                    'series': self.viz_engine.get_time_series(int(width), method),
+                }
+            )
+        )
+
+    def callback_get_overhead(self, callback_fn):
+        """Load the counters of graph tracking overhead and pass them into the given callback.
+
+        The counters are only kept once enabled with `graphtracker.set_overhead_stats(True)`; otherwise, `None` is sent.
+
+        Args:
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the counters.
+        """
+        callback_fn(
+            self.viz_engine.to_json(
+                {
+                    'overhead': get_overhead_stats(),
                 }
             )
         )
 
+    def callback_load_window(self, symbol_id, window, encoding, callback_fn):
+        """Load the contents of a window of an array-like symbol and pass them into the given callback.
+
+        Data objects of large arrays only include a leading window (see `VisualizationEngine.get_symbol_window()`);
+        other windows are loaded on demand.
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol.
+            window (list): A [start, stop] index range for each dimension of the array.
+            encoding (str or None): The content encoding in which to compress the JSON (see
+                `VisualizationEngine.to_json()`), or `None`.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the window, or of an 'error'
+                message if the symbol is not a loaded array or the window does not fit it.
+        """
+        try:
+            payload = {'window': self.viz_engine.get_symbol_window(symbol_id, window)}
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_engine_error(callback_fn, e)
+            return
+        callback_fn(self.viz_engine.to_json(payload, encoding))
+
+    def callback_get_tile(self, symbol_id, zoom, row, col, maxmag, callback_fn):
+        """Render a heatmap tile of an array-like symbol and pass it into the given callback.
+
+        Large arrays are drawn by the client as a canvas of tiles (see `VisualizationEngine.get_symbol_tile()`), rather
+        than from their contents.
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol.
+            zoom (int): The zoom level of the tile.
+            row (int): The row of the tile in the tile grid.
+            col (int): The column of the tile in the tile grid.
+            maxmag (float or None): The magnitude drawn at full colour, or `None` to use that of the whole array.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the tile, or of an 'error'
+                message if the symbol is not a loaded array or the tile is outside its tile grid.
+        """
+        try:
+            payload = {'tile': self.viz_engine.get_symbol_tile(symbol_id, zoom, row, col, maxmag)}
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_engine_error(callback_fn, e)
+            return
+        callback_fn(self.viz_engine.to_json(payload))
+
+    def callback_reload_symbol(self, symbol_id, version, callback_fn):
+        """Load the changes to an array-like symbol's contents since a version and pass them into the given callback.
+
+        The client holds the contents of an array-like symbol at the 'version' given in its data object. When it
+        inspects the symbol again, it only needs to know whether they are unchanged, or a delta against that version
+        (see `VisualizationEngine.get_symbol_delta()`).
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol.
+            version (int): The version of the contents held by the client.
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the changes, or of an 'error'
+                message if the symbol is not a loaded array.
+        """
+        try:
+            payload = {'reload': self.viz_engine.get_symbol_delta(symbol_id, version)}
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_engine_error(callback_fn, e)
+            return
+        callback_fn(self.viz_engine.to_json(payload))
+
+    def _send_engine_error(self, callback_fn, error):
+        """Passes the message of an error raised by the engine for a request into the given callback.
+
+        Requests come from the socket's thread, where an exception would leave the client waiting forever, so the
+        callback is always called. The JSON is never compressed, so that the server can tell it apart from a payload
+        and send the client an error status (see `sendPayload` in server.js).
+
+        Args:
+            callback_fn (fn): A (str) => None function which accepts a JSON string of the 'error' message.
+            error (Exception): The KeyError, TypeError or ValueError raised by the engine.
+        """
+        message = error.args[0] if error.args else type(error).__name__
+        callback_fn(self.viz_engine.to_json({'error': str(message)}))
+
+    def _handle_cancel_signal(self, signum, frame):
+        """Cancels the generation of the current data object when the server sends SIGUSR1.
+
+        The remaining attributes of the data object are deferred, and an attribute being evaluated when the signal
+        arrives is abandoned, so a request held up by a slow property returns promptly.
+        """
+        if self.viz_engine.cancel():
+            raise DataGenerationCancelled()
+
     def _get_context(self):
         """Returns some object, for now a list describing the stack frame, capturing the state of the program.
 
@@ -394,6 +634,24 @@ class VisualDebugger(bdb.Bdb):
         program_state['line'] = linecache.getline(filename, lineno, frame.f_globals).strip()
         return program_state
 
+    def _get_context_and_namespace(self):
+        """Returns the context and namespace shells of the current breakpoint, as sent to the server.
+
+        They are computed when first requested at each breakpoint, so that the namespace is only serialized once
+        however many clients ask for it, and are recorded then if the debugger is recording.
+
+        Returns:
+            (dict): The 'context' (see `_get_context()`) and 'namespace' (see `_get_namespace_shells()`).
+        """
+        if self.current_context_and_namespace is None:
+            self.current_context_and_namespace = {
+                'context': self._get_context(),
+                'namespace': self._get_namespace_shells(),
+            }
+            if self.recorder is not None:
+                self.recorder.record_breakpoint(**self.current_context_and_namespace)
+        return self.current_context_and_namespace
+
     def _get_namespace_shells(self):
         """Returns a dict mapping string symbol IDs to dict shell representations.
 
@@ -498,12 +756,16 @@ class VisualDebugger(bdb.Bdb):
 # User-program-invoked debugging function.
 # ======================================================================================================================
 
-def set_trace():
+def set_trace(preview_encoding=None, record_dir=None):
     """A convenience function which instantiates a `VisualDebugger` object and sets trace at the current frame.
 
     This mimics the function of the same name in `pdb`, allowing users to just change `pdb` to `viz.debug` and
     run their code as normal. Crowding the runtime with multiple `VisualDebugger` objects is not terribly
     problematic, as at most one debugging server is created in each run.
+
+    Args:
+        preview_encoding (str or None): The encoding of tensor previews; see `VisualizationEngine`.
+        record_dir (str or None): The directory to which breakpoints are recorded, if any; see `VisualDebugger`.
     """
-    VisualDebugger().set_trace(sys._getframe().f_back)
+    VisualDebugger(preview_encoding=preview_encoding, record_dir=record_dir).set_trace(sys._getframe().f_back)
 
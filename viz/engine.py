@@ -1,9 +1,17 @@
 import json
-from collections import defaultdict
+import base64
+import struct
+import zlib
+from collections import defaultdict, OrderedDict
 import types
 import inspect
+import threading
+import time
+import hashlib
+import numpy as np
 from torch import _TensorBase
-from viz.graphtracker import GraphData, GraphContainer, GraphOp, get_graphdata, has_graphdata
+from viz.graphtracker import GraphData, GraphContainer, GraphOp, get_graphdata, has_graphdata, collect_graph, \
+    collect_container, diff_graphs, get_time_series_recorder
 
 
 class VisualizationType:
@@ -19,7 +27,8 @@ class VisualizationType:
     encapsulates the unique properties/functions for the `boolean` type. This construction ultimately allows objects of
     different types to be treated in a generic manner in code.
     """
-    def __init__(self, type_name, test_fn, data_fn, str_fn=str, is_primitive=False):
+    def __init__(self, type_name, test_fn, data_fn, str_fn=str, is_primitive=False, window_fn=None,
+                 fallback_str_fn=None):
         """Constructor. Fields should not be changed after instantiation, and only one instance of a `VisualizationType`
         should exist for each object type.
 
@@ -33,24 +42,80 @@ class VisualizationType:
             str_fn (fn): A function (obj) => str, which translates the given symbol object to a human-readable string.
                 Assumed that `test_fn(obj) == True`.
             is_primitive (bool): True if this `VisualizationType` is primitive.
+            window_fn (fn or None): For array-like types, a function (`VisualizationEngine`, obj, window) => np.ndarray,
+                which takes an engine, a symbol object and a list of [start, stop] index ranges, one per dimension,
+                and returns that window of the array. Large arrays send only a leading window in their data object,
+                and the client loads other windows, or heatmap tiles rendered from them, on demand.
+            fallback_str_fn (fn or None): A function (obj) => str which cheaply describes the given symbol object, used
+                in place of `str_fn` once the engine's budget for strings of this type has run out (see
+                `SHELL_STR_BUDGET`). If `None`, the name of the object's class is used.
         """
         self.type_name = type_name
         self.test_fn = test_fn
         self.data_fn = data_fn
         self.str_fn = str_fn
         self.is_primitive = is_primitive
+        self.window_fn = window_fn
+        self.fallback_str_fn = fallback_str_fn or (lambda obj: '<{}>'.format(type(obj).__name__))
         assert is_primitive or self.data_fn is not None, 'Non-primitive types must define a data_fn.'
 
 
+class DataGenerationCancelled(BaseException):
+    """Raised in an attribute's evaluation to abandon it when data generation is cancelled (see
+    `VisualizationEngine.cancel()`). It is not an `Exception`, so that attribute code which catches every error cannot
+    swallow it.
+    """
+    pass
+
+
+class _DeferredAttribute:
+    """A placeholder for an attribute which was not evaluated while generating a data object, because the time budget
+    ran out or generation was cancelled. It is a symbol of its own, whose data object holds the attribute's value.
+    """
+    def __init__(self, obj, attr):
+        """Constructor.
+
+        Args:
+            obj (object): The object whose attribute was deferred.
+            attr (str): The name of the attribute.
+        """
+        self.obj = obj
+        self.attr = attr
+
+
 class VisualizationEngine:
     """Encapsulates the translation of Python variable symbols into visualization schema. It is stateful, so it may
     implement caching in the future to improve performance.
     """
-    def __init__(self):
+    def __init__(self, preview_encoding=None):
         """Constructor. Initializes symbol cache to store and efficient serve generated data schemas and references.
         See "Symbol cache keys" section for more details.
+
+        Args:
+            preview_encoding (str or None): If 'uint8' or 'float16', the contents of numeric tensors and arrays are sent
+                as a quantized preview in that encoding, rather than at full precision (see `_encode_contents()`).
+                Windows loaded with `get_symbol_window()` are always sent at full precision.
         """
+        assert preview_encoding in self.PREVIEW_ENCODINGS, 'Unknown preview encoding {}.'.format(preview_encoding)
         self.cache = defaultdict(dict)
+        self.preview_encoding = preview_encoding
+        # Snapshots of the contents of array-like symbols which the client reloads, so that later reloads can send only
+        # what changed (see `get_symbol_delta()`). Unlike the cache, snapshots are kept across breakpoints; they are of
+        # the form {symbol_id -> {'version', 'array'}}, least recently used first.
+        self.snapshots = OrderedDict()
+        self.snapshot_bytes = 0
+        # The window of the contents sent in the data object of each array-like symbol, of the form
+        # {symbol_id -> [[start, stop], ...]}, kept across breakpoints so that reloads compare the same window.
+        self.content_windows = {}
+        # The `time.monotonic()` time after which attributes of the data object being generated are deferred, or
+        # `None` if no data object with a time budget is being generated.
+        self.deadline = None
+        # Set by `cancel()` to defer the remaining attributes of the data object being generated.
+        self.cancelled = threading.Event()
+        # Whether an attribute is being evaluated, during which a cancellation may abandon it.
+        self.evaluating_attr = False
+        # The time, in seconds, spent computing shell strings of each type since the cache was last reset.
+        self.str_costs = defaultdict(float)
 
     # ==================================================================================================================
     # Symbol cache.
@@ -89,6 +154,19 @@ class VisualizationEngine:
     # two symbols of the same type reference the same `VisualizationType`.
     TYPE_INFO = 'type-info'
 
+    # Key for whether this symbol's shell holds a fallback string, to be replaced by the full one when the symbol's data
+    # object is loaded. Undefined (not in the dict) if the shell's string is the full one.
+    STR_PENDING = 'str-pending'
+
+    # Key for the largest finite magnitude in this array-like symbol's whole contents, by which heatmap tiles are
+    # coloured. Undefined (not in the dict) until a tile is first rendered without a given magnitude.
+    MAXMAG = 'maxmag'
+
+    # Key for the COO indices and values of this sparse tensor symbol's nonzeros, coalesced and sorted by their index
+    # in the leading dimension (see `_get_sparse_coo()`). Undefined (not in the dict) until its data or a window of it
+    # is first generated.
+    SPARSE_COO = 'sparse-coo'
+
     # ==================================================================================================================
     # Schema generation.
     # ------------------
@@ -111,19 +189,132 @@ class VisualizationEngine:
         }, refs
 
     def _generate_data_tensor(self, obj):
-        """Data generation function for tensors."""
+        """Data generation function for tensors. Tensors drawn from heatmap tiles are sent without their contents (see
+        `_get_tiles()`)."""
         refs = set()
+        viewer = {
+            'size': list(obj.size()),
+            'type': self._sanitize_for_data_object(self.TENSOR_TYPES[obj.type()], refs),
+        }
+        tiles = self._get_tiles(viewer['size'])
+        if tiles is not None:
+            viewer['tiles'] = tiles
+        else:
+            viewer.update(self._encode_contents(obj.cpu().numpy()), maxmag=obj.abs().max())
         return {
-            self.VIEWER_KEY: {
-                # This is deliberately not datafied to prevent the lists from being turned into references.
-                'contents': obj.cpu().numpy().tolist(),
-                'size': list(obj.size()),
-                'type': self._sanitize_for_data_object(self.TENSOR_TYPES[obj.type()], refs),
-                'maxmag': obj.abs().max(),
-            },
+            self.VIEWER_KEY: viewer,
             self.ATTRIBUTES_KEY: self._get_data_object_attributes(obj, refs)
         }, refs
 
+    def _generate_data_sparse_tensor(self, obj):
+        """Data generation function for sparse tensors.
+
+        Sparse tensors are never densified as a whole. The data object holds the COO indices and values of the nonzeros
+        in a leading window (see `MAX_WINDOW_ELEMENTS`), along with the window densified, so that sparse tensors share
+        the viewer schema of dense ones. `maxmag`, `nnz` and `density` summarize all of the nonzeros. Sparse tensors
+        drawn from heatmap tiles are sent without any window (see `_get_tiles()`). In hybrid tensors, whose trailing
+        dimensions are dense, each nonzero's value is a dense block of those dimensions.
+        """
+        refs = set()
+        size = list(obj.size())
+        indices, values = self._get_sparse_coo(obj)
+        nnz = values.shape[0]
+        viewer = {
+            'size': size,
+            'type': self._sanitize_for_data_object(self.TENSOR_TYPES[obj.type()], refs),
+            'maxmag': float(np.abs(values).max()) if nnz > 0 else 0.0,
+            'sparse': {
+                'format': 'coo',
+                'nnz': nnz,
+                'density': values.size / max(int(np.prod(size)), 1),
+            },
+        }
+        tiles = self._get_tiles(size)
+        if tiles is not None:
+            viewer['tiles'] = tiles
+        else:
+            window = [[0, extent] for extent in self._get_leading_window(size)]
+            dense, window_indices, window_values = self._get_sparse_window(obj, window, indices, values)
+            viewer.update(self._encode_contents(dense), window=list(dense.shape))
+            viewer['sparse'].update(indices=window_indices.tolist(), values=window_values.tolist())
+        return {
+            self.VIEWER_KEY: viewer,
+            self.ATTRIBUTES_KEY: {
+                self._sanitize_for_data_object(key, refs): self._sanitize_for_data_object(value, refs)
+                for key, value in [('is_cuda', obj.is_cuda), ('nnz', nnz)]
+            },
+        }, refs
+
+    def _generate_window_sparse_tensor(self, obj, window):
+        """Window generation function for sparse tensors; only the nonzeros in the window are densified."""
+        dense, _, _ = self._get_sparse_window(obj, window, *self._get_sparse_coo(obj))
+        return dense
+
+    def _generate_data_ndarray(self, obj):
+        """Data generation function for NumPy arrays.
+
+        Arrays share the viewer schema of tensors. Only a leading window of at most `MAX_WINDOW_ELEMENTS` elements is
+        read, through a view of the array, so large arrays are not copied and memory-mapped arrays are only paged in
+        where the window lies; `maxmag` is likewise computed over the window only, as reading the whole of a large
+        memory-mapped array would defeat the window, and the 'window' in the data object marks it as such. Only a fixed
+        set of attributes is listed, since reading every attribute of an array (such as `T` or `flat`) can be slow or
+        create copies. Arrays drawn from heatmap tiles are sent without any window (see `_get_tiles()`).
+        """
+        refs = set()
+        attributes = {
+            self._sanitize_for_data_object(attr, refs): self._sanitize_for_data_object(getattr(obj, attr), refs)
+            for attr in self.NDARRAY_ATTRIBUTES if hasattr(obj, attr)
+        }
+        viewer = {
+            'size': list(obj.shape),
+            'type': self._sanitize_for_data_object(obj.dtype.name, refs),
+        }
+        # Tiles can only be drawn from numbers, so non-numeric arrays are always sent as a window of their strings.
+        tiles = self._get_tiles(viewer['size']) if obj.dtype.kind in 'biuf' else None
+        if tiles is not None:
+            viewer['tiles'] = tiles
+        else:
+            window = obj[tuple(slice(0, extent) for extent in self._get_leading_window(obj.shape))]
+            viewer.update(self._encode_contents(window), maxmag=self._get_maxmag(window), window=list(window.shape))
+        return {
+            self.VIEWER_KEY: viewer,
+            self.ATTRIBUTES_KEY: attributes,
+        }, refs
+
+    def _get_tiles(self, shape):
+        """Returns the 'tiles' of the viewer of an array-like, which tell the client to draw it from heatmap tiles, or
+        `None` if it is small enough to be drawn element by element (see `MAX_UNTILED_ELEMENTS`).
+
+        Args:
+            shape (list): The shape of the array.
+
+        Returns:
+            (dict or None): The 'tilesize' of tiles in pixels, and the 'minzoom' and 'maxzoom' at which they can be
+                rendered (see `get_symbol_tile()`).
+        """
+        rows, cols = self._get_matrix_shape(shape)
+        if rows * cols <= self.MAX_UNTILED_ELEMENTS:
+            return None
+        return {'tilesize': self.TILE_SIZE, 'minzoom': self.MIN_TILE_ZOOM, 'maxzoom': int(np.log2(self.TILE_SIZE))}
+
+    @staticmethod
+    def _get_maxmag(contents):
+        """Returns the largest finite magnitude in an array, or `None` if it has no numeric elements."""
+        if contents.size == 0 or contents.dtype.kind not in 'biuf':
+            return None
+        magnitudes = np.abs(contents)
+        if contents.dtype.kind == 'f':
+            magnitudes = magnitudes[np.isfinite(magnitudes)]
+        return float(magnitudes.max()) if magnitudes.size > 0 else None
+
+    def _generate_window_ndarray(self, obj, window):
+        """Window generation function for NumPy arrays; reads only the requested window, through a view."""
+        return obj[tuple(slice(start, stop) for start, stop in window)]
+
+    def _generate_window_tensor(self, obj, window):
+        """Window generation function for dense tensors."""
+        return obj.cpu().numpy()[tuple(slice(start, stop) for start, stop in window)]
+
     def _generate_data_graphdata(self, obj):
         """Data generation function for graph data nodes."""
         refs = set()
@@ -138,6 +329,7 @@ class VisualizationEngine:
             self.VIEWER_KEY: {
                 'creatorop': self._sanitize_for_data_object(graphdata_obj.creator_op, refs),
                 'creatorpos': self._sanitize_for_data_object(graphdata_obj.creator_pos, refs),
+                'consumers': [self._sanitize_for_data_object(op, refs) for op in graphdata_obj.get_consumers()],
                 'kvpairs': {
                     self._sanitize_for_data_object(key, refs): self._sanitize_for_data_object(value, refs)
                     for key, value in graphdata_obj.get_visualization_dict().items()
@@ -161,7 +353,11 @@ class VisualizationEngine:
         }, refs
 
     def _generate_data_graphop(self, obj):
-        """Data generation function for graph op nodes."""
+        """Data generation function for graph op nodes.
+
+        The op's outputs are held as `GraphData`; each is shown as the object it wraps, or, if that object was held
+        weakly and has been collected (see `set_prop_snapshots()`), as the `GraphData` itself.
+        """
         refs = set()
         print(obj.args)
         d = {
@@ -179,7 +375,8 @@ class VisualizationEngine:
                          for arg in obj.kwargs],
                 'container': self._sanitize_for_data_object(obj.container, refs),
                 'functionname': self._sanitize_for_data_object(obj.fn_name, refs),
-                'outputs': [self._sanitize_for_data_object(output, refs) for output in obj.outputs],
+                'outputs': [self._sanitize_for_data_object(output.obj if output.obj is not None else output, refs)
+                            for output in obj.outputs],
             },
             self.ATTRIBUTES_KEY: self._get_data_object_attributes(obj, refs)
         }
@@ -256,7 +453,7 @@ class VisualizationEngine:
         }
         refs = set()
         for attr in dir(obj):
-            value = getattr(obj, attr)
+            value = self._get_attr(obj, attr)
             if self.FUNCTION.test_fn(value):
                 contents['functions'][self._sanitize_for_data_object(attr, refs)] = \
                     self._sanitize_for_data_object(value, refs)
@@ -277,15 +474,15 @@ class VisualizationEngine:
         contents = dict()
         refs = set()
         for attr in dir(obj):
-            value = getattr(obj, attr)
+            value = self._get_attr(obj, attr)
             try:
                 if not self.FUNCTION.test_fn(value) and (
                                 attr not in instance_class_attrs or getattr(instance_class, attr, None) != value):
                     contents[self._sanitize_for_data_object(attr, refs)] = \
-                        self._sanitize_for_data_object(getattr(obj, attr), refs)
+                        self._sanitize_for_data_object(value, refs)
             except TypeError:
                 contents[self._sanitize_for_data_object(attr, refs)] = \
-                    self._sanitize_for_data_object(getattr(obj, attr), refs)
+                    self._sanitize_for_data_object(value, refs)
         return {
             self.VIEWER_KEY: {
                 'contents': contents,
@@ -293,22 +490,40 @@ class VisualizationEngine:
             self.ATTRIBUTES_KEY: self._get_data_object_attributes(obj, refs)
         }, refs
 
+    def _generate_data_deferred(self, obj):
+        """Data generation function for deferred attributes, which evaluates the attribute with no time budget."""
+        refs = set()
+        return {
+            self.VIEWER_KEY: {
+                'contents': self._sanitize_for_data_object(self._get_attr(obj.obj, obj.attr, budgeted=False), refs),
+            },
+            self.ATTRIBUTES_KEY: {},
+        }, refs
+
     # `VisualizationType` objects.
     # ----------------------------
     NUMBER          = VisualizationType('number', test_fn=lambda obj: isinstance(obj, (float, int)),
                                         data_fn=_generate_data_primitive, is_primitive=True)
     STRING          = VisualizationType('string', test_fn=lambda obj: isinstance(obj, str),
                                         data_fn=_generate_data_primitive,
-                                        str_fn=lambda obj: '"{}"'.format(obj),
+                                        str_fn=lambda obj: '"{}"'.format(obj[:VisualizationEngine.MAX_STR_LENGTH]),
                                         is_primitive=True)
     BOOL            = VisualizationType('bool', test_fn=lambda obj: isinstance(obj, bool),
                                         data_fn=_generate_data_primitive, is_primitive=True)
     NONE            = VisualizationType('none', test_fn=lambda obj: obj is None,
                                         data_fn=_generate_data_primitive, is_primitive=True)
+    SPARSE_TENSOR   = VisualizationType('tensor', test_fn=lambda obj: isinstance(obj, _TensorBase) and
+                                        getattr(obj, 'is_sparse', False),
+                                        str_fn=lambda obj: 'tensor <sparse {}>{}'.format(
+                                            VisualizationEngine.TENSOR_TYPES[obj.type()], list(obj.size())),
+                                        data_fn=_generate_data_sparse_tensor, window_fn=_generate_window_sparse_tensor)
     TENSOR          = VisualizationType('tensor', test_fn=lambda obj: isinstance(obj, _TensorBase),
                                         str_fn=lambda obj: 'tensor <{}>{}'.format(VisualizationEngine.TENSOR_TYPES
                                                                                   [obj.type()], list(obj.size())),
-                                        data_fn=_generate_data_tensor)
+                                        data_fn=_generate_data_tensor, window_fn=_generate_window_tensor)
+    NDARRAY         = VisualizationType('tensor', test_fn=lambda obj: isinstance(obj, np.ndarray),
+                                        str_fn=lambda obj: 'tensor <{}>{}'.format(obj.dtype.name, list(obj.shape)),
+                                        data_fn=_generate_data_ndarray, window_fn=_generate_window_ndarray)
     GRAPH_DATA      = VisualizationType('graphdata',
                                         test_fn=lambda obj: isinstance(obj, GraphData) or has_graphdata(obj),
                                         str_fn=lambda obj: VisualizationEngine._get_type_info_obj(obj, ['graphdata'])
@@ -338,6 +553,7 @@ class VisualizationEngine:
                                                                                    type(all.__call__))),
                                         str_fn=lambda obj: 'function {}{}'.format(obj.__name__, '()'
                                         if inspect.isbuiltin(obj) else str(inspect.signature(obj))),
+                                        fallback_str_fn=lambda obj: 'function {}(...)'.format(obj.__name__),
                                         data_fn=_generate_data_function)
     MODULE          = VisualizationType('module', test_fn=inspect.ismodule,
                                         str_fn=lambda obj: 'module <{}>'.format(obj.__name__),
@@ -345,16 +561,19 @@ class VisualizationEngine:
     CLASS           = VisualizationType('class', test_fn=inspect.isclass,
                                         str_fn=lambda obj: 'class <{}>'.format(obj.__name__),
                                         data_fn=_generate_data_class)
+    DEFERRED        = VisualizationType('deferred', test_fn=lambda obj: isinstance(obj, _DeferredAttribute),
+                                        str_fn=lambda obj: 'deferred <{}>'.format(obj.attr),
+                                        data_fn=_generate_data_deferred)
     INSTANCE        = VisualizationType('obj', test_fn=lambda obj: True,
-                                        str_fn=lambda obj: '<{}>'.format(obj.__class__.__name__, str(obj)),
+                                        str_fn=lambda obj: '<{}>'.format(obj.__class__.__name__),
                                         data_fn=_generate_data_instance)
 
     # A list of all `VisualizationType` objects, in the order in which type should be tested. For example, the
     # INSTANCE should be last, as it returns `True` on any object and is the most general type. `BOOL` should be
-    # before `NUMBER`, as bool is a subclass of number. `GRAPH_DATA` should be first, as it can wrap any type and
-    # will be mistaken for those types.
-    TYPES = [GRAPH_DATA, GRAPH_CONTAINER, GRAPH_OP, NONE, BOOL, NUMBER, STRING, TENSOR, DICT, LIST, SET, TUPLE, MODULE,
-             FUNCTION, CLASS, INSTANCE]
+    # before `NUMBER`, as bool is a subclass of number, and `SPARSE_TENSOR` before `TENSOR`. `GRAPH_DATA` should be
+    # first, as it can wrap any type and will be mistaken for those types.
+    TYPES = [GRAPH_DATA, GRAPH_CONTAINER, GRAPH_OP, NONE, BOOL, NUMBER, STRING, SPARSE_TENSOR, TENSOR, NDARRAY, DICT,
+             LIST, SET, TUPLE, MODULE, FUNCTION, CLASS, DEFERRED, INSTANCE]
 
     # Utility functions for data generation.
     # --------------------------------------
@@ -379,14 +598,44 @@ class VisualizationEngine:
             # There are some functions, like torch.Tensor.data, which exist just to throw errors. Testing these
             # fields will throw the errors. We should consume them and keep moving if so.
             try:
-                if exclude_fns and self.FUNCTION.test_fn(getattr(obj, attr)):
+                value = self._get_attr(obj, attr)
+                if exclude_fns and self.FUNCTION.test_fn(value):
                     continue
             except RuntimeError:
                 continue
             attributes[self._sanitize_for_data_object(attr, refs)] = \
-                self._sanitize_for_data_object(getattr(obj, attr), refs)
+                self._sanitize_for_data_object(value, refs)
         return attributes
 
+    def _get_attr(self, obj, attr, budgeted=True):
+        """Returns an attribute of an object, or a `_DeferredAttribute` placeholder for it if it is not evaluated.
+
+        Attributes may be properties which run arbitrary code, such as loading a dataset or querying a database, so
+        data generation functions read attributes through this function. Once the time budget of the data object being
+        generated has run out, or generation is cancelled, the remaining attributes are deferred; the client may load
+        each placeholder individually. An attribute whose evaluation is interrupted by `cancel()` is also deferred.
+
+        Args:
+            obj (object): The object.
+            attr (str): The name of the attribute.
+            budgeted (bool): If `False`, the attribute is evaluated even if the time budget has run out.
+
+        Returns:
+            (object): The value of the attribute, or a `_DeferredAttribute`.
+        """
+        if self.cancelled.is_set() or (budgeted and self.deadline is not None and time.monotonic() > self.deadline):
+            return _DeferredAttribute(obj, attr)
+        # `cancel()` clears `evaluating_attr` as it reports it, so `DataGenerationCancelled` is raised at most once per
+        # evaluation, and only within the outer `try`, even if the signal arrives as the inner `finally` runs.
+        try:
+            try:
+                self.evaluating_attr = True
+                return getattr(obj, attr)
+            finally:
+                self.evaluating_attr = False
+        except DataGenerationCancelled:
+            return _DeferredAttribute(obj, attr)
+
     def _is_primitive(self, obj):
         """Returns `True` if `obj` is primitive, as defined by the engine's `VisualizationType` objects."""
         for type_info in self.TYPES:
@@ -466,12 +715,355 @@ class VisualizationEngine:
         'torch.cuda.ShortTensor': 'int16',
         'torch.cuda.IntTensor': 'int32',
         'torch.cuda.LongTensor': 'int64',
+        'torch.sparse.HalfTensor': 'float16',
+        'torch.sparse.FloatTensor': 'float32',
+        'torch.sparse.DoubleTensor': 'float64',
+        'torch.sparse.ByteTensor': 'uint8',
+        'torch.sparse.CharTensor': 'int8',
+        'torch.sparse.ShortTensor': 'int16',
+        'torch.sparse.IntTensor': 'int32',
+        'torch.sparse.LongTensor': 'int64',
+        'torch.cuda.sparse.HalfTensor': 'float16',
+        'torch.cuda.sparse.FloatTensor': 'float32',
+        'torch.cuda.sparse.DoubleTensor': 'float64',
+        'torch.cuda.sparse.ByteTensor': 'uint8',
+        'torch.cuda.sparse.CharTensor': 'int8',
+        'torch.cuda.sparse.ShortTensor': 'int16',
+        'torch.cuda.sparse.IntTensor': 'int32',
+        'torch.cuda.sparse.LongTensor': 'int64',
     }
 
+    # The encodings in which the contents of tensors and arrays can be previewed; `None` sends full precision.
+    PREVIEW_ENCODINGS = (None, 'uint8', 'float16')
+
+    # The width and height, in pixels, of heatmap tiles rendered by `get_symbol_tile()`.
+    TILE_SIZE = 256
+
+    # The lowest zoom level of heatmap tiles, at which each pixel shows a square of `2 ** -MIN_TILE_ZOOM` elements on a
+    # side; lower levels are drawn at this one, so that a tile never covers more than `(TILE_SIZE * 64) ** 2` elements.
+    MIN_TILE_ZOOM = -6
+
+    # The number of elements in the matrix drawn from a tensor or array (see `get_symbol_tile()`) above which the client
+    # draws it from heatmap tiles rather than element by element. The data objects of such arrays hold no contents.
+    MAX_UNTILED_ELEMENTS = 1024
+
+    # The RGB colours of -1, 0 and 1 in heatmaps; these match the diverging colour scale of the client's tensor viewer.
+    HEATMAP_COLORS = [(0x05, 0x71, 0xb0), (0xf7, 0xf7, 0xf7), (0xca, 0x00, 0x20)]
+
+    # The maximum number of elements of an array-like sent in its data object; larger arrays send a leading window.
+    MAX_WINDOW_ELEMENTS = 10000
+
+    # The time, in seconds, after which the remaining attributes of a data object being generated are deferred.
+    DATA_TIME_BUDGET = 1.0
+
+    # The window sizes of `zlib` streams in each content encoding in which payloads can be compressed: 'gzip' has a
+    # gzip header, and HTTP's 'deflate' a zlib header.
+    COMPRESSION_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+    # The `zlib` level at which payloads are compressed.
+    COMPRESSION_LEVEL = 6
+
+    # The number of characters of JSON encoded before each call to the compressor.
+    JSON_CHUNK_SIZE = 2 ** 16
+
+    # The maximum length of a shell's string; longer strings are cut short and end in '...'.
+    MAX_STR_LENGTH = 100
+
+    # The time, in seconds, which may be spent computing the shell strings of each non-primitive type between cache
+    # resets. Once it runs out, shells of that type get their `fallback_str_fn` string, and the full string is only
+    # computed if the symbol's data object is loaded; so a namespace with many objects whose strings are slow to
+    # compute, such as functions, whose signatures are inspected, is still built in bounded time. The budget is only
+    # checked before each string is computed, so it is overrun by up to the time of one `str_fn` call per type, and a
+    # single call which never returns is not bounded at all.
+    SHELL_STR_BUDGET = 0.05
+
+    # The time, in seconds, which may be spent computing the shell strings of all non-primitive types together between
+    # cache resets, so that a namespace holding many types with slow strings is not slowed by each type's budget in
+    # turn. Once it runs out, shells of every non-primitive type get their `fallback_str_fn` string.
+    SHELL_STR_TOTAL_BUDGET = 0.2
+
+    # The maximum total size, in bytes, of the snapshots kept for delta reloads; the least recently used are dropped.
+    MAX_SNAPSHOT_BYTES = 2 ** 28
+
+    # The number of elements read at a time to find the largest magnitude in an array (see `_get_symbol_maxmag()`).
+    MAXMAG_CHUNK_ELEMENTS = 2 ** 20
+
+    # The number of consecutive elements, in row-major order, in each block of a block delta.
+    DELTA_BLOCK_SIZE = 256
+
+    # The attributes listed for NumPy arrays, including those of memory-mapped arrays.
+    NDARRAY_ATTRIBUTES = ['shape', 'dtype', 'ndim', 'size', 'itemsize', 'nbytes', 'strides',
+                          'filename', 'offset', 'mode']
+
     # ==================================================================================================================
     # Utility functions for public methods.
     # ==================================================================================================================
 
+    def _encode_contents(self, array):
+        """Returns the viewer fields which hold the contents of a tensor or array.
+
+        Without a preview encoding, or for non-numeric arrays, the contents are sent at full precision as nested lists
+        under 'contents'; elements which are not booleans or real numbers, such as complex numbers, strings or
+        arbitrary objects, are sent as their strings, as they have no JSON form. Otherwise they are quantized and sent
+        under 'preview', as a dict of the form
+
+            {'encoding': 'uint8' or 'float16', 'shape': [...], 'scale': float, 'offset': float,
+             'data': base64 of the little-endian quantized values in row-major order},
+
+        where each value is approximately `quantized * scale + offset`. For 'uint8', the finite range of the array is
+        mapped onto [0, 255] and non-finite values are sent as the minimum; for 'float16', values are only scaled
+        down if they would overflow. Previews are 4-8x smaller than full precision before base64 encoding.
+
+        Args:
+            array (np.ndarray): The contents to encode.
+
+        Returns:
+            (dict): Either {'contents': nested lists} or {'preview': quantized preview}.
+        """
+        if array.dtype.kind not in 'biuf':
+            return {'contents': array.astype(str).tolist()}
+        if self.preview_encoding is None or array.dtype.kind not in 'iuf' or array.size == 0:
+            # This is deliberately not datafied to prevent the lists from being turned into references.
+            return {'contents': array.tolist()}
+        values = array.astype(np.float64)
+        finite = np.isfinite(values)
+        low, high = (float(values[finite].min()), float(values[finite].max())) if finite.any() else (0.0, 0.0)
+        if self.preview_encoding == 'uint8':
+            offset = low
+            scale = (high - low) / 255 or 1.0
+            quantized = np.round((np.where(finite, values, low) - offset) / scale).astype(np.uint8)
+        else:
+            offset = 0.0
+            scale = max(1.0, max(abs(low), abs(high)) / float(np.finfo(np.float16).max))
+            quantized = (values / scale).astype('<f2')
+        return {
+            'preview': {
+                'encoding': self.preview_encoding,
+                'shape': list(array.shape),
+                'scale': scale,
+                'offset': offset,
+                'data': base64.b64encode(quantized.tobytes()).decode('ascii'),
+            }
+        }
+
+    @classmethod
+    def _colormap(cls, scaled):
+        """Colours values in [-1, 1] with the client's diverging scale, interpolating linearly in RGB between the
+        colours of -1, 0 and 1 in `HEATMAP_COLORS`; values outside [-1, 1] are clamped.
+
+        Args:
+            scaled (np.ndarray): A 2D array of values, normalized by the magnitude drawn at full colour.
+
+        Returns:
+            (np.ndarray): An RGBA image of the same height and width, of dtype uint8.
+        """
+        scaled = np.clip(np.nan_to_num(scaled), -1, 1)[..., None]
+        low, mid, high = [np.array(color, dtype=np.float64) for color in cls.HEATMAP_COLORS]
+        rgb = np.where(scaled < 0, mid + (low - mid) * -scaled, mid + (high - mid) * scaled)
+        alpha = np.full(scaled.shape, 255.0)
+        return np.round(np.concatenate([rgb, alpha], axis=-1)).astype(np.uint8)
+
+    @staticmethod
+    def _encode_png(rgba):
+        """Encodes an RGBA image as a PNG file.
+
+        Args:
+            rgba (np.ndarray): An image of shape (height, width, 4) and dtype uint8.
+
+        Returns:
+            (bytes): The PNG file.
+        """
+        def chunk(chunk_type, data):
+            return (struct.pack('>I', len(data)) + chunk_type + data +
+                    struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+        height, width = rgba.shape[:2]
+        # Each scanline starts with its filter type; 0 leaves it unfiltered.
+        scanlines = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+        return (b'\x89PNG\r\n\x1a\n' +
+                chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+                chunk(b'IDAT', zlib.compress(scanlines.tobytes())) +
+                chunk(b'IEND', b''))
+
+    def _get_leading_window(self, shape):
+        """Returns the extents of the leading window of an array of shape `shape` sent in its data object.
+
+        The longest extent is halved until the window holds at most `MAX_WINDOW_ELEMENTS` elements, so that windows of
+        long, thin arrays keep their full width.
+
+        Args:
+            shape (tuple): The shape of the array.
+
+        Returns:
+            (list): The extent of the window in each dimension.
+        """
+        extents = list(shape)
+        while len(extents) > 0 and int(np.prod(extents)) > self.MAX_WINDOW_ELEMENTS:
+            longest = int(np.argmax(extents))
+            extents[longest] = (extents[longest] + 1) // 2
+        return extents
+
+    def _get_sparse_coo(self, obj):
+        """Returns the COO indices, of shape (sparse dims, nnz), and the values of the nonzeros of a sparse tensor.
+
+        The nonzeros are sorted by their index in the leading dimension, so that `_get_sparse_window()` can find those
+        in a window by binary search. They are cached with the tensor's symbol until the next breakpoint, so that they
+        are coalesced and sorted once rather than for every window.
+        """
+        symbol_cache = self.cache.get(self._get_symbol_id(obj))
+        if symbol_cache is not None and self.SPARSE_COO in symbol_cache:
+            return symbol_cache[self.SPARSE_COO]
+        # Coalescing sums duplicate entries, so that each index appears once, and sorts them in row-major order.
+        obj = obj.coalesce()
+        indices, values = obj._indices().cpu().numpy(), obj._values().cpu().numpy()
+        if indices.shape[1] > 1 and np.any(np.diff(indices[0]) < 0):
+            order = np.argsort(indices[0], kind='stable')
+            indices, values = indices[:, order], values[order]
+        if symbol_cache is not None:
+            symbol_cache[self.SPARSE_COO] = (indices, values)
+        return indices, values
+
+    @staticmethod
+    def _get_sparse_window(obj, window, indices, values):
+        """Densifies a window of a sparse tensor, touching only its nonzeros in the window's range of the leading
+        dimension.
+
+        The nonzeros are selected by the window's ranges of the sparse dimensions. In a hybrid tensor, the values are
+        dense blocks of the trailing dimensions, which are sliced by the window's ranges of those dimensions.
+
+        Args:
+            obj (object): A sparse tensor.
+            window (list): A [start, stop] index range for each dimension of the tensor.
+            indices (np.ndarray): The COO indices of the tensor, sorted as returned by `_get_sparse_coo()`.
+            values (np.ndarray): The values of the tensor, as returned by `_get_sparse_coo()`.
+
+        Returns:
+            (np.ndarray): The dense window.
+            (np.ndarray): The COO indices of the nonzeros in the window, relative to the window.
+            (np.ndarray): The values of the nonzeros in the window, sliced to the window in a hybrid tensor.
+        """
+        size = list(obj.size())
+        window = [[max(start, 0), min(stop, size[dim])] for dim, (start, stop) in enumerate(window)]
+        sparse_window, dense_window = window[:indices.shape[0]], window[indices.shape[0]:]
+        if len(sparse_window) > 0:
+            first, last = np.searchsorted(indices[0], [window[0][0], max(window[0][1], window[0][0])])
+            indices, values = indices[:, first:last], values[first:last]
+        in_window = np.ones(values.shape[0], dtype=bool)
+        for dim, (start, stop) in enumerate(sparse_window[1:], 1):
+            in_window &= (indices[dim] >= start) & (indices[dim] < stop)
+        window_indices = indices[:, in_window] - np.array([[start] for start, _ in sparse_window], dtype=indices.dtype)
+        window_values = values[in_window][(slice(None),) + tuple(slice(start, stop) for start, stop in dense_window)]
+        dense = np.zeros([max(stop - start, 0) for start, stop in window], dtype=values.dtype)
+        dense[tuple(window_indices)] = window_values
+        return dense, window_indices, window_values
+
+    @staticmethod
+    def _get_contents_version(contents):
+        """Returns the version of the contents of an array-like symbol: a checksum of their dtype, shape and values.
+
+        The checksum is 48 bits long, so that it is exactly representable as a JavaScript number.
+
+        Args:
+            contents (np.ndarray): The contents.
+
+        Returns:
+            (int): The version.
+        """
+        digest = hashlib.blake2b(digest_size=6)
+        digest.update('{}{}'.format(contents.dtype.str, contents.shape).encode('ascii'))
+        digest.update(np.ascontiguousarray(contents).tobytes())
+        return int.from_bytes(digest.digest(), 'little')
+
+    def _store_snapshot(self, symbol_id, version, contents):
+        """Stores a copy of the contents of an array-like symbol, to send deltas against on later reloads.
+
+        Args:
+            symbol_id (str): The ID of the symbol.
+            version (int): The version of the contents (see `_get_contents_version()`).
+            contents (np.ndarray): The contents.
+        """
+        self._drop_snapshot(symbol_id)
+        if contents.nbytes > self.MAX_SNAPSHOT_BYTES:
+            return
+        while self.snapshots and self.snapshot_bytes + contents.nbytes > self.MAX_SNAPSHOT_BYTES:
+            self._drop_snapshot(next(iter(self.snapshots)))
+        self.snapshots[symbol_id] = {
+            'version': version,
+            'array': np.array(contents, copy=True),
+        }
+        self.snapshot_bytes += contents.nbytes
+
+    def _drop_snapshot(self, symbol_id):
+        """Removes the snapshot of a symbol, if it has one."""
+        snapshot = self.snapshots.pop(symbol_id, None)
+        if snapshot is not None:
+            self.snapshot_bytes -= snapshot['array'].nbytes
+
+    @staticmethod
+    def _get_changed_indices(old, new):
+        """Returns the flat indices of the elements which differ between two arrays of one shape; NaNs are equal."""
+        old, new = old.reshape(-1), new.reshape(-1)
+        changed = old != new
+        if new.dtype.kind in 'fc':
+            changed &= ~(np.isnan(old) & np.isnan(new))
+        return np.flatnonzero(changed)
+
+    def _get_delta(self, contents, changed):
+        """Returns the smaller of a sparse and a block delta which update a snapshot to `contents`.
+
+        Both forms index `contents` in row-major order. A sparse delta is of the form {'format': 'sparse', 'indices',
+        'values'}, with the index and new value of each changed element; a block delta is of the form {'format':
+        'block', 'blocksize', 'blocks', 'values'}, with the index of each block of `DELTA_BLOCK_SIZE` elements which
+        changed, and all of the new values of those blocks, concatenated.
+
+        Args:
+            contents (np.ndarray): The new contents.
+            changed (np.ndarray): The flat indices of the changed elements.
+
+        Returns:
+            (dict or None): The delta, or `None` if it would hold more than half as many numbers as `contents`.
+        """
+        flat = contents.reshape(-1)
+        blocks = np.unique(changed // self.DELTA_BLOCK_SIZE)
+        size = self.DELTA_BLOCK_SIZE
+        block_values = np.concatenate([flat[:0]] + [flat[block * size:(block + 1) * size] for block in blocks])
+        if 2 * len(changed) <= len(blocks) + len(block_values):
+            delta, size = {'format': 'sparse', 'indices': changed.tolist(), 'values': flat[changed].tolist()}, \
+                          2 * len(changed)
+        else:
+            delta, size = {'format': 'block', 'blocksize': self.DELTA_BLOCK_SIZE, 'blocks': blocks.tolist(),
+                           'values': block_values.tolist()}, len(blocks) + len(block_values)
+        return delta if size <= flat.size / 2 else None
+
+    def _truncate_str(self, s):
+        """Returns a shell string cut short to `MAX_STR_LENGTH` characters."""
+        return s if len(s) <= self.MAX_STR_LENGTH else s[:self.MAX_STR_LENGTH - 3] + '...'
+
+    def _get_shell_str(self, type_info, obj):
+        """Returns the string of a symbol's shell, within the budget for strings of its type and for all strings.
+
+        The budgets are checked before `str_fn` is called, and the call is not interrupted, so a `str_fn` which hangs
+        still hangs the namespace; types whose strings may be unbounded should compute them in their data object
+        instead, and give a cheap `str_fn`.
+
+        Args:
+            type_info (VisualizationType): The type of the symbol.
+            obj (object): The symbol's object.
+
+        Returns:
+            (str): The string, cut short to `MAX_STR_LENGTH` characters.
+            (bool): `True` if the string is a fallback, since the budget of the type has run out.
+        """
+        if not type_info.is_primitive and (self.str_costs[type_info.type_name] > self.SHELL_STR_BUDGET or
+                                           sum(self.str_costs.values()) > self.SHELL_STR_TOTAL_BUDGET):
+            return self._truncate_str(type_info.fallback_str_fn(obj)), True
+        if type_info.is_primitive:
+            return self._truncate_str(type_info.str_fn(obj)), False
+        start = time.monotonic()
+        try:
+            return self._truncate_str(type_info.str_fn(obj)), False
+        finally:
+            self.str_costs[type_info.type_name] += time.monotonic() - start
+
     def _get_symbol_id(self, obj):
         """Returns the symbol ID (a string unique for the object's lifetime) of a given object.
 
@@ -522,6 +1114,119 @@ class VisualizationEngine:
             if (exclude_types is None or type_info.type_name not in exclude_types) and type_info.test_fn(obj):
                 return type_info
 
+    def _generate_graph_tables(self, data, ops, containers, edges, collapsed=(), steps=()):
+        """Builds the columnar tables describing a collection of graph objects.
+
+        Every object is given a row in one of the following tables, each a dict mapping column names to equal-length
+        lists:
+
+            'nodes': One row per `GraphData`, `GraphOp` and collapsed `GraphContainer`, with columns
+                'id': The symbol ID reference of the node, which can be used to load its full data object.
+                'type': 'graphdata', 'graphop' or 'graphcontainer'.
+                'name': The function name of an op or container, or `None` for data.
+                'container': The row in 'containers' of the node's container, or -1 if it has none (or for data).
+            'edges': One row per edge, with columns
+                'source': The row in 'nodes' of the data (for arguments) or op (for outputs).
+                'target': The row in 'nodes' of the op (for arguments) or data (for outputs).
+                'argname': The name of the argument, or `None` for outputs.
+                'pos': The position of a positional argument or output, or -1 for keyword arguments.
+            'containers': One row per expanded `GraphContainer`, with columns
+                'id': The symbol ID reference of the container.
+                'name': The function name of the container.
+                'parent': The row in 'containers' of the container's own container, or -1 if it has none.
+                'temporalstep': The container's temporal step, or -1 for abstractive containers.
+                'height': The container's height.
+            'collapsed': One row per collapsed `GraphContainer`, with columns
+                'node': The row in 'nodes' of the container.
+                'opcount': The number of ops nested anywhere inside the container.
+                'containercount': The number of containers nested anywhere inside the container.
+            'steps': One row per temporal step which is described by its template rather than by its own ops, with
+                columns
+                'container': The row in 'containers' of the step.
+                'template': The row in 'containers' of the step's template, whose ops are included as usual.
+                'data': The symbol ID references of the step's data, in the order of
+                    `GraphContainer.get_step_data()`. The i-th reference takes the place of the i-th data of the
+                    template.
+
+        Containers which are not in `containers` are given -1. Every object is added to the cache, so its full data
+        object can be loaded as usual.
+
+        Args:
+            data (list): `GraphData` objects to include.
+            ops (list): `GraphOp` objects to include.
+            containers (list): Expanded `GraphContainer` objects to include.
+            edges (list): Tuples (source, target, arg_name, pos) between the given objects, as returned by
+                `collect_graph()`.
+            collapsed (list): Collapsed `GraphContainer` objects, which are included as nodes.
+            steps (list): Expanded temporal `GraphContainer` objects, whose templates are also in `containers`, and
+                whose ops, data and edges have been left out in favor of their templates.
+
+        Returns:
+            (dict): The 'nodes', 'edges', 'containers' and 'collapsed' tables.
+            (dict): A mapping of each object included in the tables to its row.
+        """
+        refs = set()
+        rows = dict()
+        nodes = {'id': [], 'type': [], 'name': [], 'container': []}
+        edge_table = {'source': [], 'target': [], 'argname': [], 'pos': []}
+        container_table = {'id': [], 'name': [], 'parent': [], 'temporalstep': [], 'height': []}
+        collapsed_table = {'node': [], 'opcount': [], 'containercount': []}
+        step_table = {'container': [], 'template': [], 'data': []}
+
+        for i, container in enumerate(containers):
+            rows[container] = i
+        for container in containers:
+            container_table['id'].append(self._sanitize_for_data_object(container, refs))
+            container_table['name'].append(container.fn_name)
+            container_table['parent'].append(rows.get(container.container, -1))
+            container_table['temporalstep'].append(container.temporal_step)
+            container_table['height'].append(container.height)
+
+        for graphdata in data:
+            rows[graphdata] = len(nodes['id'])
+            nodes['id'].append(self._sanitize_for_data_object(graphdata, refs))
+            nodes['type'].append(self.GRAPH_DATA.type_name)
+            nodes['name'].append(None)
+            nodes['container'].append(-1)
+        for item, type_info in [(op, self.GRAPH_OP) for op in ops] + [(c, self.GRAPH_CONTAINER) for c in collapsed]:
+            rows[item] = len(nodes['id'])
+            nodes['id'].append(self._sanitize_for_data_object(item, refs))
+            nodes['type'].append(type_info.type_name)
+            nodes['name'].append(item.fn_name)
+            nodes['container'].append(rows.get(item.container, -1))
+        for container in collapsed:
+            collapsed_table['node'].append(rows[container])
+            collapsed_table['opcount'].append(container.op_count)
+            collapsed_table['containercount'].append(container.container_count)
+
+        for source, target, arg_name, pos in edges:
+            edge_table['source'].append(rows[source])
+            edge_table['target'].append(rows[target])
+            edge_table['argname'].append(self._sanitize_for_data_object(arg_name, refs))
+            edge_table['pos'].append(pos)
+
+        for step in steps:
+            step_table['container'].append(rows[step])
+            step_table['template'].append(rows[step.template])
+            step_table['data'].append([self._sanitize_for_data_object(graphdata, refs)
+                                       for graphdata in step.get_step_data()])
+
+        # Shells are cached (but not sent) so that the full data object of any row can be loaded later.
+        for ref in refs:
+            self.get_symbol_shell(ref)
+        return {
+            'nodes': nodes,
+            'edges': edge_table,
+            'containers': container_table,
+            'collapsed': collapsed_table,
+            'steps': step_table,
+        }, rows
+
+    @staticmethod
+    def _get_graphdata_obj(obj):
+        """Returns `obj` if it is a `GraphData`, or else the `GraphData` associated with it."""
+        return obj if isinstance(obj, GraphData) else get_graphdata(obj)
+
     def _load_symbol_data(self, symbol_id):
         """Builds the data object for a symbol.
 
@@ -536,7 +1241,23 @@ class VisualizationEngine:
         """
         symbol_type_info = self._get_type_info_symbol(symbol_id)
         symbol_obj = self.cache[symbol_id][self.OBJ]
-        return symbol_type_info.data_fn(self, symbol_obj)
+        self.cancelled.clear()
+        self.deadline = time.monotonic() + self.DATA_TIME_BUDGET
+        try:
+            data, refs = symbol_type_info.data_fn(self, symbol_obj)
+        finally:
+            self.deadline = None
+        if symbol_type_info.window_fn is not None and 'tiles' not in data[self.VIEWER_KEY]:
+            # Only the version of the contents sent is kept; they are snapshotted once the client reloads the symbol.
+            viewer = data[self.VIEWER_KEY]
+            window = [[0, extent] for extent in viewer.get('window', viewer['size'])]
+            contents = symbol_type_info.window_fn(self, symbol_obj, window)
+            # The bytes of object arrays are pointers, which do not change when the objects do, so only numeric
+            # contents are versioned; others are always reloaded (see `get_symbol_delta()`).
+            if contents.dtype.kind in 'biuf':
+                self.content_windows[symbol_id] = window
+                viewer['version'] = self._get_contents_version(contents)
+        return data, refs
 
     # ==================================================================================================================
     # Public functions.
@@ -576,9 +1297,12 @@ class VisualizationEngine:
         if self.SHELL not in self.cache[symbol_id]:
             symbol_type_info = self._get_type_info_symbol(symbol_id)
             symbol_obj = self.cache[symbol_id][self.OBJ]
+            symbol_str, is_fallback = self._get_shell_str(symbol_type_info, symbol_obj)
+            if is_fallback:
+                self.cache[symbol_id][self.STR_PENDING] = True
             self.cache[symbol_id][self.SHELL] = {
                 'type': symbol_type_info.type_name,
-                'str': symbol_type_info.str_fn(symbol_obj),
+                'str': symbol_str,
                 'name': name,
                 'data': None,
             }
@@ -622,7 +1346,8 @@ class VisualizationEngine:
         This function requires a shell to have already been generated for symbol_id and stored at
         cache[symbol_id][SHELL]. It uses, and fills if empty, cache[symbol_id][DATA] and cache[symbol_id][REFS]. REFS
         stores all symbol IDs referenced by the data object, and the shells of each such symbol are returned along
-        with the data object.
+        with the data object. If the symbol's own shell was built with a fallback string, its full string is computed
+        now, and the shell is returned too.
 
         Args:
             symbol_id (str): The requested symbol's ID, as defined by self._get_symbol_id.
@@ -638,10 +1363,391 @@ class VisualizationEngine:
         shells = dict()
         for ref in self.cache[symbol_id][self.REFS]:
             shells[self.REF_PREFIX + ref] = self.get_symbol_shell(ref)
+        if self.cache[symbol_id].pop(self.STR_PENDING, False):
+            shell = self.cache[symbol_id][self.SHELL]
+            symbol_type_info = self._get_type_info_symbol(symbol_id)
+            shell['str'] = self._truncate_str(symbol_type_info.str_fn(self.cache[symbol_id][self.OBJ]))
+            shells[self.REF_PREFIX + symbol_id] = shell
         return self.cache[symbol_id][self.DATA], shells
 
-    def to_json(self, obj):
-        """Converts a visualization dict to its corresponding JSON string.
+    def get_symbol_window(self, symbol_id, window):
+        """Returns the contents of a window of an array-like symbol.
+
+        The data objects of large arrays only include a leading window of their contents (see `MAX_WINDOW_ELEMENTS`);
+        other windows are loaded with this function. Only the elements in the window are read. The window is clipped to
+        the array, and then cut down to its leading `MAX_WINDOW_ELEMENTS` elements, as the leading window is (see
+        `_get_leading_window()`), so that no request serializes more than that.
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol, whose shell has been loaded.
+            window (list): A [start, stop] index range for each dimension of the array.
+
+        Returns:
+            (dict): The 'contents' of the window as nested lists, the 'window' they cover, and the 'maxmag' of the
+                window's contents.
+        """
+        if symbol_id not in self.cache or self.OBJ not in self.cache[symbol_id]:
+            raise KeyError('Symbol id {} not found in cache.'.format(symbol_id))
+        type_info = self._get_type_info_symbol(symbol_id)
+        if type_info.window_fn is None:
+            raise TypeError('Symbol {} of type {} has no windows.'.format(symbol_id, type_info.type_name))
+        obj = self.cache[symbol_id][self.OBJ]
+        shape = list(obj.size()) if isinstance(obj, _TensorBase) else list(obj.shape)
+        if len(window) != len(shape):
+            raise ValueError('Window {} does not match the {} dimensions of symbol {}.'.format(window, len(shape),
+                                                                                              symbol_id))
+        window = [[min(max(int(start), 0), extent), min(max(int(stop), 0), extent)]
+                  for (start, stop), extent in zip(window, shape)]
+        extents = self._get_leading_window([max(stop - start, 0) for start, stop in window])
+        window = [[start, start + extent] for (start, _), extent in zip(window, extents)]
+        contents = type_info.window_fn(self, obj, window)
+        return {
+            'contents': contents.tolist(),
+            'window': window,
+            'maxmag': self._get_maxmag(contents),
+        }
+
+    def get_symbol_delta(self, symbol_id, version):
+        """Returns the changes to the contents of an array-like symbol since a version held by the client.
+
+        The data object of an array-like symbol holds the 'version' of its contents. When the symbol is inspected again,
+        such as at a later breakpoint, the client sends that version rather than loading the data object anew. Versions
+        are checksums of the contents, so unchanged contents are detected however they were written. Otherwise, the
+        contents are compared with a snapshot of the version, and only a delta is sent (see `_get_delta()`). The cost of
+        sending a large, slowly changing array, such as a weight at each step of an optimizer, is thus proportional to
+        the change.
+
+        Snapshots are only kept for symbols which the client reloads, so the first reload of a symbol whose contents
+        changed is answered with 'reload', and its contents are snapshotted for the next.
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol, whose shell has been loaded.
+            version (int): The version of the contents held by the client.
+
+        Returns:
+            (dict): A dict with 'status' of either
+                'unchanged', if the contents are still those of `version`;
+                'delta', with the 'delta' to apply to the contents of `version` (the 'base') to get those of the new
+                    'version'; or
+                'reload', if the client should load the data object anew, as no snapshot of `version` is kept, or the
+                    contents changed shape, or too much to send as a delta.
+        """
+        if symbol_id not in self.cache or self.OBJ not in self.cache[symbol_id]:
+            raise KeyError('Symbol id {} not found in cache.'.format(symbol_id))
+        type_info = self._get_type_info_symbol(symbol_id)
+        if type_info.window_fn is None:
+            raise TypeError('Symbol {} of type {} has no windows.'.format(symbol_id, type_info.type_name))
+        window = self.content_windows.get(symbol_id)
+        if window is None:
+            return {'status': 'reload'}
+        contents = type_info.window_fn(self, self.cache[symbol_id][self.OBJ], window)
+        new_version = self._get_contents_version(contents)
+        snapshot = self.snapshots.get(symbol_id)
+        if snapshot is None or snapshot['version'] != version or snapshot['array'].shape != contents.shape or \
+                snapshot['array'].dtype != contents.dtype:
+            snapshot = None
+        self._store_snapshot(symbol_id, new_version, contents)
+        if new_version == version:
+            return {'status': 'unchanged', 'version': version}
+        if snapshot is None:
+            return {'status': 'reload'}
+        delta = self._get_delta(contents, self._get_changed_indices(snapshot['array'], contents))
+        if delta is None:
+            return {'status': 'reload'}
+        return {
+            'status': 'delta',
+            'base': version,
+            'version': new_version,
+            'delta': delta,
+        }
+
+    def _get_symbol_maxmag(self, symbol_id, type_info, shape):
+        """Returns the largest finite magnitude in the whole of an array-like symbol, or 1 if it has none.
+
+        The array is read in windows of about `MAXMAG_CHUNK_ELEMENTS` elements, so that no copy of the whole array is
+        made, and the result is cached until the next breakpoint, so that it is computed once for all of the tiles.
+        Sparse tensors are never densified: only the values of their nonzeros are read (see `_get_sparse_coo()`).
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol, whose shell has been loaded.
+            type_info (VisualizationType): The type of the symbol.
+            shape (list): The shape of the array.
+
+        Returns:
+            (float): The magnitude.
+        """
+        if self.MAXMAG not in self.cache[symbol_id] and type_info is self.SPARSE_TENSOR:
+            _, values = self._get_sparse_coo(self.cache[symbol_id][self.OBJ])
+            self.cache[symbol_id][self.MAXMAG] = self._get_maxmag(values) or 1.0
+        if self.MAXMAG not in self.cache[symbol_id]:
+            obj = self.cache[symbol_id][self.OBJ]
+            rows = shape[0] if len(shape) > 0 else 1
+            rows_per_chunk = max(self.MAXMAG_CHUNK_ELEMENTS // max(int(np.prod(shape[1:])), 1), 1)
+            maxmag = None
+            for start in range(0, rows, rows_per_chunk):
+                window = [[start, min(start + rows_per_chunk, rows)]] + [[0, extent] for extent in shape[1:]]
+                chunk_maxmag = self._get_maxmag(type_info.window_fn(self, obj, window[:len(shape)]))
+                if chunk_maxmag is not None and (maxmag is None or chunk_maxmag > maxmag):
+                    maxmag = chunk_maxmag
+            self.cache[symbol_id][self.MAXMAG] = maxmag or 1.0
+        return self.cache[symbol_id][self.MAXMAG]
+
+    @staticmethod
+    def _get_matrix_shape(shape):
+        """Returns the [rows, cols] of the matrix drawn from an array of shape `shape` (see `get_symbol_tile()`)."""
+        return ([1, 1] + list(shape))[-2:] if len(shape) < 2 else list(shape[:2])
+
+    def _read_matrix_window(self, type_info, obj, shape, matrix_window):
+        """Returns a window of the matrix drawn from an array-like symbol (see `get_symbol_tile()`), as float64.
+
+        Args:
+            type_info (VisualizationType): The type of the symbol.
+            obj (object): The symbol's object.
+            shape (list): The shape of the array.
+            matrix_window (list): The [start, stop] index ranges of the window's rows and columns in the matrix.
+
+        Returns:
+            (np.ndarray): The window, of shape [rows, cols].
+        """
+        window = matrix_window[2 - len(shape):] if len(shape) < 2 else matrix_window + [[0, 1] for _ in shape[2:]]
+        return type_info.window_fn(self, obj, window).astype(np.float64).reshape(
+            [stop - start for start, stop in matrix_window])
+
+    def _read_matrix_pixels(self, type_info, obj, shape, matrix_window, pixel_size):
+        """Returns a window of the matrix drawn from an array-like symbol, reduced to one value per square of
+        `pixel_size` elements on a side: the value of largest magnitude, so that outliers stay visible.
+
+        The window is read in strips of whole pixel rows of about `MAXMAG_CHUNK_ELEMENTS` elements, so that only one
+        strip is held at a time however many elements the window covers.
+
+        Args:
+            type_info (VisualizationType): The type of the symbol.
+            obj (object): The symbol's object.
+            shape (list): The shape of the array.
+            matrix_window (list): The [start, stop] index ranges of the window's rows and columns in the matrix.
+            pixel_size (int): The number of elements along each side of a pixel.
+
+        Returns:
+            (np.ndarray): The pixels, of shape [ceil(rows / pixel_size), ceil(cols / pixel_size)].
+        """
+        (first_row, last_row), (first_col, last_col) = matrix_window
+        pixel_rows, pixel_cols = -(-(last_row - first_row) // pixel_size), -(-(last_col - first_col) // pixel_size)
+        rows_per_strip = max(self.MAXMAG_CHUNK_ELEMENTS // (pixel_size * pixel_size * pixel_cols), 1) * pixel_size
+        strips = []
+        for start in range(first_row, last_row, rows_per_strip):
+            strip = self._read_matrix_window(type_info, obj, shape,
+                                             [[start, min(start + rows_per_strip, last_row)], [first_col, last_col]])
+            # Pad the strip with NaNs to whole pixels, whose magnitude is taken to be less than any other.
+            padded = np.full((-(-strip.shape[0] // pixel_size) * pixel_size, pixel_cols * pixel_size), np.nan)
+            padded[:strip.shape[0], :strip.shape[1]] = strip
+            squares = padded.reshape(-1, pixel_size, pixel_cols, pixel_size).transpose(0, 2, 1, 3)
+            squares = squares.reshape(squares.shape[0], pixel_cols, pixel_size ** 2)
+            magnitudes = np.abs(squares)
+            magnitudes[np.isnan(magnitudes)] = -1
+            largest = np.argmax(magnitudes, axis=-1)
+            strips.append(np.take_along_axis(squares, largest[..., None], axis=-1)[..., 0])
+        return np.concatenate(strips)[:pixel_rows]
+
+    def get_symbol_tile(self, symbol_id, zoom, row, col, maxmag=None):
+        """Returns a heatmap tile of an array-like symbol, as a PNG image.
+
+        The array is drawn as a grid of `TILE_SIZE` x `TILE_SIZE` pixel tiles, coloured with the client's diverging
+        scale (see `_colormap()`), so the client can draw large tensors by placing images on a canvas rather than by
+        creating elements for each value. At zoom level `zoom`, each element is drawn as a square of `2 ** zoom`
+        pixels; at negative levels, each pixel shows the element of largest magnitude in a square of `2 ** -zoom`
+        elements. Only the elements under the tile are read. Arrays are drawn as matrices: 1D arrays as a single row,
+        and arrays of more dimensions as the matrix at index 0 of the dimensions after the first two.
+
+        Args:
+            symbol_id (str): The ID of an array-like symbol, whose shell has been loaded.
+            zoom (int): The zoom level, clamped to between `MIN_TILE_ZOOM` and `log2(TILE_SIZE)`.
+            row (int): The row of the tile in the tile grid.
+            col (int): The column of the tile in the tile grid.
+            maxmag (float or None): The magnitude drawn at full colour, such as the `maxmag` of the symbol's data object
+                if it covers the whole array; if `None`, it is computed over the whole array once per breakpoint (see
+                `_get_symbol_maxmag()`).
+
+        Returns:
+            (dict): 'png', the base64 PNG of the tile, in which pixels outside the array are transparent; and 'rows'
+                and 'cols', the size of the tile grid at this zoom level.
+
+        Raises:
+            ValueError: If the tile lies outside the tile grid at this zoom level.
+        """
+        if symbol_id not in self.cache or self.OBJ not in self.cache[symbol_id]:
+            raise KeyError('Symbol id {} not found in cache.'.format(symbol_id))
+        type_info = self._get_type_info_symbol(symbol_id)
+        if type_info.window_fn is None:
+            raise TypeError('Symbol {} of type {} has no windows.'.format(symbol_id, type_info.type_name))
+        obj = self.cache[symbol_id][self.OBJ]
+        shape = list(obj.size()) if isinstance(obj, _TensorBase) else list(obj.shape)
+        matrix_shape = self._get_matrix_shape(shape)
+        zoom = min(max(zoom, self.MIN_TILE_ZOOM), int(np.log2(self.TILE_SIZE)))
+
+        # The number of elements along each side of the tile, and the number of pixels along each side of an element,
+        # or the number of elements along each side of a pixel.
+        elements_per_tile = self.TILE_SIZE // 2 ** zoom if zoom >= 0 else self.TILE_SIZE * 2 ** -zoom
+        grid_rows = -(-matrix_shape[0] // elements_per_tile)
+        grid_cols = -(-matrix_shape[1] // elements_per_tile)
+        if not (0 <= row < max(grid_rows, 1) and 0 <= col < max(grid_cols, 1)):
+            raise ValueError('Tile ({}, {}) is outside the {} x {} tile grid of symbol {} at zoom {}.'.format(
+                row, col, grid_rows, grid_cols, symbol_id, zoom))
+        first_row, first_col = row * elements_per_tile, col * elements_per_tile
+        matrix_window = [[first_row, min(first_row + elements_per_tile, matrix_shape[0])],
+                         [first_col, min(first_col + elements_per_tile, matrix_shape[1])]]
+        if maxmag is None:
+            maxmag = self._get_symbol_maxmag(symbol_id, type_info, shape)
+
+        # The pixels of the tile which lie inside the array are filled from its block, read a strip of rows at a time.
+        values = np.zeros((self.TILE_SIZE, self.TILE_SIZE))
+        inside = np.zeros((self.TILE_SIZE, self.TILE_SIZE), dtype=bool)
+        if all(start < stop for start, stop in matrix_window):
+            if zoom >= 0:
+                block = self._read_matrix_window(type_info, obj, shape, matrix_window)
+                block = np.repeat(np.repeat(block, 2 ** zoom, axis=0), 2 ** zoom, axis=1)
+            else:
+                block = self._read_matrix_pixels(type_info, obj, shape, matrix_window, 2 ** -zoom)
+            values[:block.shape[0], :block.shape[1]] = block
+            inside[:block.shape[0], :block.shape[1]] = True
+
+        rgba = self._colormap(values / (maxmag or 1.0))
+        rgba[~(inside & np.isfinite(values))] = 0
+        return {
+            'png': base64.b64encode(self._encode_png(rgba)).decode('ascii'),
+            'rows': grid_rows,
+            'cols': grid_cols,
+        }
+
+    def get_graph_snapshot(self, symbol_id):
+        """Returns the whole computation graph leading to a graph data symbol, in a compact columnar form.
+
+        Walking the graph symbol by symbol (loading each `graphdata`, `graphop` and `graphcontainer` and following
+        their references) takes one request per object. The snapshot instead describes every object in the history of
+        the symbol in a single pass over the graph; see `_generate_graph_tables()` for the table layouts. The full data
+        object of any row can still be loaded by its 'id'.
+
+        Unrolled recurrent graphs repeat the same temporal step many times. Each step whose template (see
+        `GraphContainer.template`) is also in the snapshot is sent as a reference to the template plus its own data,
+        without its ops, so the payload grows with the number of distinct steps rather than the sequence length.
+
+        Args:
+            symbol_id (str): The ID of a `GraphData` symbol, or of a symbol which has an associated `GraphData`.
+
+        Returns:
+            (dict): The 'nodes', 'edges' and 'containers' tables, plus 'output', the row in 'nodes' of the symbol.
+        """
+        if symbol_id not in self.cache or self.OBJ not in self.cache[symbol_id]:
+            raise KeyError('Symbol id {} not found in cache.'.format(symbol_id))
+        output = self._get_graphdata_obj(self.cache[symbol_id][self.OBJ])
+        data, ops, containers, edges = collect_graph(output)
+
+        containers_collected = set(containers)
+        steps = [c for c in containers if c.template is not None and c.template in containers_collected]
+        step_ops = {op for step in steps for op in step.step_ops}
+        if len(step_ops) > 0:
+            ops = [op for op in ops if op not in step_ops]
+            edges = [edge for edge in edges if edge[0] not in step_ops and edge[1] not in step_ops]
+            data_kept = {output}.union(*[{edge[0], edge[1]} for edge in edges])
+            data = [graphdata for graphdata in data if graphdata in data_kept]
+
+        tables, rows = self._generate_graph_tables(data, ops, containers, edges, steps=steps)
+        tables['output'] = rows[output]
+        return tables
+
+    def get_container_subgraph(self, symbol_id, height):
+        """Returns the contents of a graph container symbol down to a nesting height, in a compact columnar form.
+
+        Containers nested deeper than `height` are collapsed into single nodes, summarized by the number of ops and
+        containers inside them, so only the requested part of a large graph is sent and laid out. See
+        `graphtracker.collect_container()` for which objects are included, and `_generate_graph_tables()` for the
+        table layouts.
+
+        Args:
+            symbol_id (str): The ID of a `GraphContainer` symbol.
+            height (int): The number of nesting levels to expand, at least 1.
+
+        Returns:
+            (dict): The 'nodes', 'edges', 'containers' and 'collapsed' tables. The container itself is the first row of
+                'containers'.
+
+        Raises:
+            KeyError: If the symbol is not in the cache.
+            TypeError: If the symbol is not a `GraphContainer`.
+        """
+        if symbol_id not in self.cache or self.OBJ not in self.cache[symbol_id]:
+            raise KeyError('Symbol id {} not found in cache.'.format(symbol_id))
+        if not isinstance(self.cache[symbol_id][self.OBJ], GraphContainer):
+            raise TypeError('Symbol {} is not a graph container.'.format(symbol_id))
+        data, ops, containers, collapsed, edges = collect_container(self.cache[symbol_id][self.OBJ], max(height, 1))
+        tables, _ = self._generate_graph_tables(data, ops, containers, edges, collapsed)
+        return tables
+
+    def get_graph_diff(self, symbol_id, other_symbol_id):
+        """Returns the ops which differ between the computation graphs leading to two symbols.
+
+        Only the delta is sent, so that two iterations of a large graph can be compared without loading either in
+        full. See `graphtracker.diff_graphs()` for how ops are matched.
+
+        Args:
+            symbol_id (str): The ID of the symbol whose history is the first graph, e.g. an earlier iteration's output.
+            other_symbol_id (str): The ID of the symbol whose history is the second graph.
+
+        Returns:
+            (dict): The 'added', 'removed' and 'changed' tables, each a dict mapping column names to equal-length lists.
+                'added' and 'removed' have columns 'id' and 'name', for the symbol ID reference and function name of
+                each op; 'changed' has columns 'old', 'new' and 'name'.
+        """
+        for requested_id in (symbol_id, other_symbol_id):
+            if requested_id not in self.cache or self.OBJ not in self.cache[requested_id]:
+                raise KeyError('Symbol id {} not found in cache.'.format(requested_id))
+        added, removed, changed = diff_graphs(self._get_graphdata_obj(self.cache[symbol_id][self.OBJ]),
+                                              self._get_graphdata_obj(self.cache[other_symbol_id][self.OBJ]))
+        refs = set()
+        delta = {
+            'added': {
+                'id': [self._sanitize_for_data_object(op, refs) for op in added],
+                'name': [op.fn_name for op in added],
+            },
+            'removed': {
+                'id': [self._sanitize_for_data_object(op, refs) for op in removed],
+                'name': [op.fn_name for op in removed],
+            },
+            'changed': {
+                'old': [self._sanitize_for_data_object(old_op, refs) for old_op, _ in changed],
+                'new': [self._sanitize_for_data_object(new_op, refs) for _, new_op in changed],
+                'name': [new_op.fn_name for _, new_op in changed],
+            },
+        }
+        # Shells are cached (but not sent) so that the full data object of any op can be loaded later.
+        for ref in refs:
+            self.get_symbol_shell(ref)
+        return delta
+
+    def get_time_series(self, width, method='lttb'):
+        """Returns the time series of surfaced values recorded at each `tick()`, downsampled to a plot width.
+
+        The series are kept by the `TimeSeriesRecorder` set with `graphtracker.set_time_series_recorder()`. Since each
+        series is downsampled to at most `width` points (see `viz.timeseries`), the payload does not grow with the
+        length of the run.
+
+        Args:
+            width (int): The maximum number of points per series, such as the width of the plot in pixels.
+            method (str): The downsampling method, 'lttb' or 'minmax'.
+
+        Returns:
+            (dict): A dict of the form {property name: {'time': [time indices], 'value': [values]}}, empty if no
+                recorder is set.
+        """
+        recorder = get_time_series_recorder()
+        if recorder is None:
+            return dict()
+        return {
+            name: {'time': times, 'value': values}
+            for name, (times, values) in recorder.get_downsampled(width, method).items()
+        }
+
+    def to_json(self, obj, encoding=None):
+        """Converts a visualization dict to its corresponding JSON string, optionally compressed.
 
         `obj` can be any output of the engine's exposed calls -- in particular, it can be either a symbol's shell or a
         symbol's data object. There is currently no difference in behavior, but for some more complex types (like
@@ -651,14 +1757,50 @@ class VisualizationEngine:
         it can exploit the internal cache for object referencing if need be, as well as understand the engine's
         string escaping protocol. It should be called on the same engine where the dict was created.
 
+        If an `encoding` is given, the JSON is encoded incrementally and each chunk of `JSON_CHUNK_SIZE` characters is
+        compressed as it is produced, so the full JSON string is never held in memory. The compressed bytes are then
+        sent as base64, since the socket carries strings, and the server forwards them to the client still compressed.
+
         Args:
             obj (object): A Python object output by the `VisualizationEngine`.
+            encoding (str or None): A content encoding in `COMPRESSION_WBITS`, 'gzip' or 'deflate', negotiated with the
+                client; if `None`, the JSON is not compressed.
+
+        Returns:
+            (str): The JSON representation of the input object, or the base64 of it compressed in `encoding`.
+        """
+        if encoding is None:
+            return json.dumps(obj)
+        compressor = zlib.compressobj(self.COMPRESSION_LEVEL, zlib.DEFLATED, self.COMPRESSION_WBITS[encoding])
+        compressed = []
+        chunk, chunk_length = [], 0
+        for piece in json.JSONEncoder().iterencode(obj):
+            chunk.append(piece)
+            chunk_length += len(piece)
+            if chunk_length >= self.JSON_CHUNK_SIZE:
+                compressed.append(compressor.compress(''.join(chunk).encode('utf-8')))
+                chunk, chunk_length = [], 0
+        compressed.append(compressor.compress(''.join(chunk).encode('utf-8')))
+        compressed.append(compressor.flush())
+        return base64.b64encode(b''.join(compressed)).decode('ascii')
+
+    def cancel(self):
+        """Cancels the generation of the current data object, whose remaining attributes are deferred.
+
+        This is safe to call from another thread, or from a signal handler. In the latter case, if an attribute is being
+        evaluated in the interrupted thread, the handler may then raise `DataGenerationCancelled` to abandon it as well;
+        it must not raise otherwise, as the exception would then escape data generation.
 
         Returns:
-            (str): The JSON representation of the input object.
+            (bool): `True` if an attribute is being evaluated, and may be abandoned by raising
+                `DataGenerationCancelled`. This is only returned once for each evaluation.
         """
-        return json.dumps(obj)
+        self.cancelled.set()
+        evaluating_attr, self.evaluating_attr = self.evaluating_attr, False
+        return evaluating_attr
 
     def reset_cache(self):
-        """Clear the cache completely, resetting the engine to its starting state."""
+        """Clear the cache completely. Snapshots of array contents are kept, so that the contents held by the client can
+        still be updated with deltas (see `get_symbol_delta()`)."""
         self.cache.clear()
+        self.str_costs.clear()
@@ -0,0 +1,247 @@
+"""
+Saves recorded computation graphs to disk and loads them back, so that a graph can be inspected after the program
+that recorded it has exited.
+
+A graph is saved as two files: a JSON file which describes the structure of the graph in columns, one table each for
+data, ops and containers, and a sidecar blob which holds the raw bytes of every array-like surfaced property. The blob
+is memory-mapped on load, so arrays are only read from disk when they are inspected.
+
+Example:
+    A graph saved by a training script can be browsed in the client by loading it at a breakpoint::
+
+        from viz.graphexport import load_graph
+        from viz.debug import set_trace
+        graph = load_graph('graph.json')
+        set_trace()
+"""
+import json
+import os
+import reprlib
+import numpy as np
+
+from viz.graphtracker import GraphData, GraphOp, GraphContainer, collect_graph, get_graphdata
+
+# The version of the file format written by `save_graph()`.
+FORMAT_VERSION = 1
+
+# The alignment, in bytes, of each array in the blob, so that memory-mapped arrays can be read without copying.
+_BLOB_ALIGNMENT = 64
+
+# The kinds of dtype (see `np.dtype.kind`) whose arrays can be written to the blob: booleans and numbers, whose bytes
+# are their values. The bytes of object arrays are pointers, which mean nothing once the program has exited.
+_BLOB_DTYPE_KINDS = 'biufc'
+
+
+# ======================================================================================================================
+# Saving.
+# -------
+# Graph objects are written as rows of columnar tables, and refer to each other by row. Surfaced values are encoded as
+# JSON where possible, arrays as references into the blob, and anything else by an abbreviated `repr`.
+# ======================================================================================================================
+
+def _as_ndarray(value):
+    """Returns `value` as a NumPy array if it is an array or tensor, or else `None`."""
+    if isinstance(value, np.ndarray):
+        return value
+    if hasattr(value, 'cpu') and hasattr(value, 'shape'):
+        # PyTorch variables wrap their tensor in `data`.
+        return getattr(value, 'data', value).cpu().numpy()
+    return None
+
+
+class BlobWriter:
+    """Appends arrays to a binary file, recording where each one starts."""
+    def __init__(self, blob_file):
+        """Constructor.
+
+        Args:
+            blob_file (file): A file opened for writing in binary mode.
+        """
+        self.blob_file = blob_file
+        self.size = 0
+
+    def write(self, array):
+        """Writes an array to the blob.
+
+        Args:
+            array (np.ndarray): The array to write, of a boolean or numeric dtype.
+
+        Returns:
+            (dict): The reference to the array stored in place of its value, of the form {'offset', 'dtype', 'shape'}.
+
+        Raises:
+            TypeError: If the array's dtype is not boolean or numeric.
+        """
+        if array.dtype.kind not in _BLOB_DTYPE_KINDS:
+            raise TypeError('Arrays of dtype {} cannot be written to the blob.'.format(array.dtype))
+        padding = -self.size % _BLOB_ALIGNMENT
+        self.blob_file.write(b'\0' * padding)
+        offset = self.size + padding
+        array_bytes = np.ascontiguousarray(array).tobytes()
+        self.blob_file.write(array_bytes)
+        self.size = offset + len(array_bytes)
+        return {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+
+def _encode_value(value, blob_writer):
+    """Returns a JSON-serializable encoding of a surfaced value, writing any arrays it contains to the blob."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    array = _as_ndarray(value)
+    if array is not None and array.dtype.kind not in _BLOB_DTYPE_KINDS:
+        # Arrays of objects or strings are encoded element by element instead.
+        return _encode_value(array.tolist(), blob_writer)
+    if array is not None:
+        return {'array': blob_writer.write(array)}
+    if isinstance(value, dict):
+        return {'dict': {str(key): _encode_value(item, blob_writer) for key, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'list': [_encode_value(item, blob_writer) for item in value]}
+    return {'repr': reprlib.repr(value)}
+
+
+def _encode_arg_list(arg_list, data_rows):
+    """Returns a `GraphOp.args` or `GraphOp.kwargs` list with each `GraphData` replaced by its row."""
+    return [
+        [arg[0], data_rows[arg[1]] if not isinstance(arg[1], list) else [data_rows[item] for item in arg[1]]]
+        if len(arg) > 1 else [arg[0]]
+        for arg in arg_list
+    ]
+
+
+def save_graph(output, path):
+    """Saves the history of a tracked object to disk.
+
+    The history is that returned by `collect_graph()`. Containers are saved with only the items in the history, and the
+    template of a step is kept only if it is also in the history.
+
+    Args:
+        output (object): A tracked object (see `track_data()`), or its `GraphData`.
+        path (str): The path of the JSON file to write. The blob is written to `path + '.blob'`.
+    """
+    output = output if isinstance(output, GraphData) else get_graphdata(output)
+    data, ops, containers, _ = collect_graph(output)
+    data_rows = {graphdata: i for i, graphdata in enumerate(data)}
+    op_rows = {op: i for i, op in enumerate(ops)}
+    # Containers are written innermost first, so that each one can be rebuilt from already-loaded contents.
+    containers = sorted(containers, key=lambda container: container.height)
+    container_rows = {container: i for i, container in enumerate(containers)}
+
+    def get_row(rows, item):
+        return rows.get(item, -1) if item is not None else -1
+
+    with open(path + '.blob', 'wb') as blob_file:
+        blob_writer = BlobWriter(blob_file)
+        tables = {
+            'version': FORMAT_VERSION,
+            'output': data_rows[output],
+            'data': {
+                'creator': [get_row(op_rows, graphdata.creator_op) for graphdata in data],
+                'creatorpos': [graphdata.creator_pos for graphdata in data],
+                'props': [{key: _encode_value(value, blob_writer)
+                           for key, value in graphdata.get_visualization_dict().items()} for graphdata in data],
+            },
+            'ops': {
+                'name': [op.fn_name for op in ops],
+                'container': [get_row(container_rows, op.container) for op in ops],
+                'args': [_encode_arg_list(op.args, data_rows) for op in ops],
+                'kwargs': [_encode_arg_list(op.kwargs, data_rows) for op in ops],
+                'outputs': [[data_rows[op_output] for op_output in op.outputs] for op in ops],
+            },
+            'containers': {
+                'name': [container.fn_name for container in containers],
+                'parent': [get_row(container_rows, container.container) for container in containers],
+                'temporallevel': [container.temporal_level for container in containers],
+                'temporalstep': [container.temporal_step for container in containers],
+                'template': [get_row(container_rows, container.template) for container in containers],
+                'stepops': [[op_rows[op] for op in container.step_ops if op in op_rows]
+                            if container.step_ops is not None else None for container in containers],
+            },
+        }
+    with open(path, 'w') as graph_file:
+        json.dump(tables, graph_file, separators=(',', ':'))
+
+
+# ======================================================================================================================
+# Loading.
+# --------
+# Loaded graphs are made of ordinary `GraphData`, `GraphOp` and `GraphContainer` objects, so they can be queried and
+# visualized like live ones. The wrapped objects and functions themselves are not saved; each `GraphData` holds only
+# its surfaced values, and each `GraphOp` only its function name.
+# ======================================================================================================================
+
+def _decode_value(encoded, blob):
+    """Returns the value encoded by `_encode_value()`, with arrays read lazily from the memory-mapped blob."""
+    if not isinstance(encoded, dict):
+        return encoded
+    if 'array' in encoded:
+        ref = encoded['array']
+        dtype = np.dtype(ref['dtype'])
+        size = int(np.prod(ref['shape'])) * dtype.itemsize
+        if size == 0:
+            return np.empty(ref['shape'], dtype=dtype)
+        return blob[ref['offset']:ref['offset'] + size].view(dtype).reshape(ref['shape'])
+    if 'dict' in encoded:
+        return {key: _decode_value(item, blob) for key, item in encoded['dict'].items()}
+    if 'list' in encoded:
+        return [_decode_value(item, blob) for item in encoded['list']]
+    return encoded['repr']
+
+
+def _decode_arg_list(arg_list, data):
+    """Returns a `GraphOp.args` or `GraphOp.kwargs` list with each row replaced by its `GraphData`."""
+    return [
+        [arg[0], data[arg[1]] if not isinstance(arg[1], list) else [data[item] for item in arg[1]]]
+        if len(arg) > 1 else [arg[0]]
+        for arg in arg_list
+    ]
+
+
+def load_graph(path):
+    """Loads a graph saved by `save_graph()`.
+
+    Args:
+        path (str): The path of the JSON file; the blob is read from `path + '.blob'`.
+
+    Returns:
+        (GraphData): The `GraphData` of the object whose history was saved.
+    """
+    with open(path) as graph_file:
+        tables = json.load(graph_file)
+    assert tables['version'] == FORMAT_VERSION, 'Unsupported graph file version {}.'.format(tables['version'])
+    # An empty file cannot be memory-mapped, but then no value refers to the blob.
+    blob = np.memmap(path + '.blob', dtype=np.uint8, mode='r') if os.path.getsize(path + '.blob') > 0 else None
+
+    data_table, op_table, container_table = tables['data'], tables['ops'], tables['containers']
+    data = [GraphData.from_snapshot({key: _decode_value(value, blob) for key, value in props.items()},
+                                    creator_pos=creator_pos)
+            for props, creator_pos in zip(data_table['props'], data_table['creatorpos'])]
+    ops = [GraphOp.from_record(name, _decode_arg_list(args, data), _decode_arg_list(kwargs, data))
+           for name, args, kwargs in zip(op_table['name'], op_table['args'], op_table['kwargs'])]
+    for graphdata, creator in zip(data, data_table['creator']):
+        if creator != -1:
+            graphdata.creator_op = ops[creator]
+    for op, outputs in zip(ops, op_table['outputs']):
+        op.outputs = tuple([data[row] for row in outputs])
+        for arg in dict.fromkeys(op.get_tracked_args()):
+            arg.add_consumer(op)
+
+    # Containers are listed innermost first, so the contents of each are complete when it is built.
+    contents = [[] for _ in container_table['name']]
+    for op, container in zip(ops, op_table['container']):
+        if container != -1:
+            contents[container].append(op)
+    containers = []
+    for i, (name, level, step) in enumerate(zip(container_table['name'], container_table['temporallevel'],
+                                                container_table['temporalstep'])):
+        container = GraphContainer(set(contents[i]), name=name, temporal_level=level, temporal_step=step)
+        for item in contents[i]:
+            item.set_container(container)
+        if container_table['parent'][i] != -1:
+            contents[container_table['parent'][i]].append(container)
+        step_ops = container_table['stepops'][i]
+        container.step_ops = [ops[row] for row in step_ops] if step_ops is not None else None
+        containers.append(container)
+    for container, template in zip(containers, container_table['template']):
+        container.template = containers[template] if template != -1 else None
+    return data[tables['output']]
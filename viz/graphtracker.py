@@ -9,7 +9,97 @@ See viz.md for underlying principles and concepts.
 """
 import wrapt
 import inspect
-from collections import deque
+import random
+import weakref
+import reprlib
+import threading
+import functools
+import sys
+import time
+from collections import deque, defaultdict, OrderedDict
+
+
+# ======================================================================================================================
+# Overhead instrumentation.
+# -------------------------
+# Tracking adds work to every tracked call. When enabled with `set_overhead_stats()`, the tracker counts the calls, the
+# cumulative time, and the approximate bytes retained by the graph objects created, for each of its main entry points,
+# so that the cost of tracking a model can be measured and budgeted. The counting wrappers are only installed while
+# enabled, so when disabled the instrumented functions run unwrapped, and only the creation of graph objects checks a
+# global.
+# ======================================================================================================================
+
+class _OverheadStats:
+    """Counters of the calls, time and retained bytes of each instrumented function."""
+    def __init__(self):
+        self.counters = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+        # Counters are shared by all threads that record graphs.
+        self.lock = threading.Lock()
+
+    def add_call(self, name, seconds):
+        """Counts a finished call of the function `name` which took `seconds`."""
+        with self.lock:
+            counter = self.counters[name]
+            counter['calls'] += 1
+            counter['seconds'] += seconds
+
+    def add_bytes(self, name, obj):
+        """Counts the shallow size of a graph object, its attribute dict, and the collections among its attributes."""
+        attrs = vars(obj)
+        size = sys.getsizeof(obj) + sys.getsizeof(attrs) + sum(
+            sys.getsizeof(value) for value in attrs.values() if isinstance(value, (list, tuple, dict, set)))
+        with self.lock:
+            self.counters[name]['bytes'] += size
+
+
+# The counters of each instrumented function, or `None` if instrumentation is disabled. Set through
+# `set_overhead_stats()`.
+_overhead_stats = None
+
+# Every instrumented function, with the name it is counted under, in the form [(fn, name)].
+_instrumented_fns = []
+
+
+def _instrumented(name):
+    """Returns a decorator which registers a function to be counted under `name` by `set_overhead_stats()`. The
+    function itself is returned unchanged."""
+    def decorator(fn):
+        _instrumented_fns.append((fn, name))
+        return fn
+    return decorator
+
+
+def _make_counting_wrapper(fn, name):
+    """Returns a wrapper of `fn` which counts its calls and cumulative time under `name`. Times include the time
+    spent in any instrumented function called within."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        stats = _overhead_stats
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if stats is not None:
+                stats.add_call(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _install_counting_wrappers(enabled):
+    """Replaces each instrumented function, in its module or class, with a counting wrapper if `enabled`, or else with
+    the function itself."""
+    for fn, name in _instrumented_fns:
+        owner = sys.modules[__name__]
+        for owner_name in fn.__qualname__.split('.')[:-1]:
+            owner = getattr(owner, owner_name)
+        setattr(owner, fn.__name__, _make_counting_wrapper(fn, name) if enabled else fn)
+
+
+def _count_retained(name, obj):
+    """Counts the bytes retained by a newly created graph object under `name`, while instrumentation is enabled.
+    Callers check `_overhead_stats` first, so that the call is skipped otherwise."""
+    stats = _overhead_stats
+    if stats is not None:
+        stats.add_bytes(name, obj)
 
 
 class Nestable:
@@ -20,6 +110,12 @@ class Nestable:
         # container of its own. Containers should also be `Nestable` instances.
         self.container = None
 
+        # A link towards this `Nestable`'s outermost parent, or `None` if it is its own outermost parent. The links
+        # form a union-find forest over the container hierarchy: a link always points to some (not necessarily direct)
+        # container of this `Nestable`, and is shortened whenever the outermost parent is looked up. This keeps
+        # `get_outermost_parent()` near constant time no matter how deeply containers are nested.
+        self._outermost_link = None
+
     def get_outermost_parent(self):
         """Returns the first `Nestable` with no container, found by iterating through this `Nestable`'s container
         hierarchy.
@@ -30,7 +126,25 @@ class Nestable:
         Returns:
             (Nestable): This instance's outermost parent.
         """
-        return self if self.container is None else self.container.get_outermost_parent()
+        outermost_parent = self
+        while outermost_parent._outermost_link is not None:
+            outermost_parent = outermost_parent._outermost_link
+        # Compress the path, so that every `Nestable` visited links directly to the outermost parent.
+        nestable = self
+        while nestable is not outermost_parent:
+            next_nestable = nestable._outermost_link
+            nestable._outermost_link = outermost_parent
+            nestable = next_nestable
+        return outermost_parent
+
+    def set_container(self, container):
+        """Places this `Nestable` inside `container`, updating the outermost parent index.
+
+        Args:
+            container (GraphContainer): The container which directly contains this `Nestable`.
+        """
+        self.container = container
+        self._outermost_link = container
 
 
 # ======================================================================================================================
@@ -42,6 +156,7 @@ class Nestable:
 
 class GraphOp(Nestable):
     """A record of a single function execution."""
+    @_instrumented('GraphOp.__init__')
     def __init__(self, fn, args, kwargs):
         """Constructor.
 
@@ -96,6 +211,32 @@ class GraphOp(Nestable):
         self.temporal_level = 0
 
         self.outputs = []
+        if _overhead_stats is not None:
+            _count_retained('GraphOp.__init__', self)
+
+    @classmethod
+    def from_record(cls, fn_name, args, kwargs):
+        """Creates a `GraphOp` for a call whose function is no longer available, such as one loaded from disk (see
+        `viz.graphexport`).
+
+        Args:
+            fn_name (str): The name of the function executed in the op.
+            args (list): The recorded positional arguments, in the format of `GraphOp.args`.
+            kwargs (list): The recorded keyword arguments, in the format of `GraphOp.kwargs`.
+
+        Returns:
+            (GraphOp): An op with no function, which otherwise behaves like a recorded op.
+        """
+        op = cls.__new__(cls)
+        Nestable.__init__(op)
+        op.fn = None
+        op.fn_name = fn_name
+        op.name = fn_name
+        op.args = args
+        op.kwargs = kwargs
+        op.temporal_level = 0
+        op.outputs = []
+        return op
 
     def _make_arg_list(self, args, arg_names):
         # len(args) == len(arg_names)
@@ -126,6 +267,31 @@ class GraphOp(Nestable):
                     tracked_args.extend([arg_item for arg_item in arg[1] if arg_item is not None])
         return tracked_args
 
+    def get_tracked_arg_edges(self):
+        """Return, for each recorded argument wrapped in `GraphData`, the argument and where it was passed.
+
+        Returns:
+            (list): Tuples (graphdata, arg_name, pos), where `pos` is the position of a positional argument or -1 for
+                a keyword argument.
+        """
+        arg_edges = []
+        for arg_list, is_positional in [(self.args, True), (self.kwargs, False)]:
+            for pos, arg in enumerate(arg_list):
+                if len(arg) < 2:
+                    continue
+                for arg_item in arg[1] if isinstance(arg[1], list) else [arg[1]]:
+                    if arg_item is not None:
+                        arg_edges.append((arg_item, arg[0], pos if is_positional else -1))
+        return arg_edges
+
+    def get_output_edges(self):
+        """Return, for each output of the op wrapped in `GraphData`, the output and its position.
+
+        Returns:
+            (list): Tuples (graphdata, pos).
+        """
+        return [(output, pos) for pos, output in enumerate(self.outputs)]
+
 
 # ======================================================================================================================
 # Graph data.
@@ -152,6 +318,10 @@ class GraphData:
             creator_op (GraphOp): The `GraphOp` which created the wrapped object.
             creator_pos (int): The position of the object in the `creator_op`'s output tuple.
         """
+        # In snapshot mode (see `set_prop_snapshots()`), the surfaced values are copied when they are surfaced and the
+        # object itself is only held weakly, so that recording a graph does not keep every intermediate alive.
+        self._snapshot_fn = _prop_snapshot_fn
+        self._prop_snapshots = dict()
         self.obj = obj
         self.creator_op = creator_op
         self.creator_pos = creator_pos
@@ -160,6 +330,68 @@ class GraphData:
             for name_in_client, attr_name in props_to_surface.items():
                 self.surface_prop_in_client(name_in_client, attr_name)
 
+        # Weak references to the `GraphOp` objects which took this `GraphData` as an argument, in order of execution.
+        # This forward index lets consumers be found without searching the whole history. The references are weak so
+        # that long-lived inputs, such as model parameters, do not keep every op they ever fed into alive.
+        self._consumer_refs = []
+
+    @classmethod
+    def from_snapshot(cls, props, creator_op=None, creator_pos=-1):
+        """Creates a `GraphData` whose wrapped object is no longer available, such as one loaded from disk (see
+        `viz.graphexport`), from the values of its surfaced properties.
+
+        Args:
+            props (dict): A dict of the form {user-selected name: value to visualize}.
+            creator_op (GraphOp): The `GraphOp` which created the wrapped object.
+            creator_pos (int): The position of the object in the `creator_op`'s output tuple.
+
+        Returns:
+            (GraphData): A `GraphData` in snapshot mode, wrapping `None`.
+        """
+        graphdata = cls(None, creator_op=creator_op, creator_pos=creator_pos)
+        graphdata._snapshot_fn = lambda value: value
+        graphdata.props_to_surface = {name: name for name in props}
+        graphdata._prop_snapshots = dict(props)
+        return graphdata
+
+    @property
+    def obj(self):
+        """The wrapped object, or `None` if it was held weakly and has since been garbage-collected."""
+        return self._obj_ref() if self._obj_is_weak else self._obj_ref
+
+    @obj.setter
+    def obj(self, obj):
+        self._obj_is_weak = False
+        self._obj_ref = obj
+        if self._snapshot_fn is not None:
+            try:
+                self._obj_ref = weakref.ref(obj)
+                self._obj_is_weak = True
+            except TypeError:
+                # Some objects, such as subclasses of `int` and `tuple`, cannot be weakly referenced; these are small,
+                # so they are simply kept alive.
+                pass
+
+    def add_consumer(self, op):
+        """Records that `op` took this `GraphData` as an argument.
+
+        Args:
+            op (GraphOp): The op which consumed this `GraphData`.
+        """
+        self._consumer_refs.append(weakref.ref(op))
+
+    def get_consumers(self):
+        """Returns the `GraphOp` objects, still alive, which took this `GraphData` as an argument.
+
+        Returns:
+            (list): Consumer `GraphOp` objects, in order of execution.
+        """
+        consumers = [ref() for ref in self._consumer_refs]
+        if None in consumers:
+            self._consumer_refs = [ref for ref, consumer in zip(self._consumer_refs, consumers) if consumer is not None]
+            consumers = [consumer for consumer in consumers if consumer is not None]
+        return consumers
+
     def surface_prop_in_client(self, name_in_client, attr_name):
         """Add a new property to the `GraphData`'s visualization in the client.
 
@@ -176,21 +408,71 @@ class GraphData:
                 `name_in_client`, rather than a single one of its attributes.
         """
         self.props_to_surface[name_in_client] = attr_name
+        if self._snapshot_fn is not None:
+            obj = self.obj
+            if obj is not None:
+                self._prop_snapshots[name_in_client] = self._snapshot_fn(getattr(obj, attr_name)
+                                                                         if attr_name is not None else obj)
 
     def get_visualization_dict(self):
         """Returns a mapping of user-selected names to attributes of the wrapped Python object.
 
         The dict values will not be string names of the attributes, but rather the values of the attributes themselves.
 
+        In snapshot mode (see `set_prop_snapshots()`), the values are those recorded when each property was surfaced.
+
         Returns:
             (dict): A dict of the form {user-selected name: value to visualize}.
         """
+        if self._snapshot_fn is not None:
+            return dict(self._prop_snapshots)
         return {
             key: getattr(self.obj, attr) if attr is not None else self.obj
             for key, attr in self.props_to_surface.items()
         }
 
 
+# The function applied to each surfaced value when a `GraphData` is created, or `None` if `GraphData` objects should
+# keep their wrapped objects alive and read surfaced values lazily. Set through `set_prop_snapshots()`.
+_prop_snapshot_fn = None
+
+
+def summarize_value(value, preview_size=8):
+    """Returns a small, self-contained summary of a surfaced value, for use in snapshot mode.
+
+    Primitives are kept as they are. Array-likes (anything with a `shape`, such as tensors and NumPy arrays) are
+    reduced to their shape, dtype, a few statistics and the first few elements, so that the summary does not keep the
+    array's memory alive. Everything else is reduced to an abbreviated `repr`.
+
+    Args:
+        value (object): The value of a surfaced property.
+        preview_size (int): The maximum number of elements of an array-like kept in its preview.
+
+    Returns:
+        (object): A primitive, or a dict summarizing an array-like, or a string.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, 'shape'):
+        summary = {
+            'type': type(value).__name__,
+            'shape': tuple(value.shape),
+            'dtype': str(getattr(value, 'dtype', None)),
+        }
+        try:
+            flat = value.contiguous().view(-1) if hasattr(value, 'contiguous') else value.reshape(-1)
+            summary['preview'] = flat[:preview_size].tolist()
+            if len(flat) > 0:
+                summary['min'] = float(flat.min())
+                summary['max'] = float(flat.max())
+                summary['mean'] = float(flat.mean())
+        except (AttributeError, TypeError, RuntimeError, ValueError):
+            # Some array-likes, such as those of non-numeric dtypes, cannot be flattened or reduced.
+            pass
+        return summary
+    return reprlib.repr(value)
+
+
 # ======================================================================================================================
 # Graph containers.
 # -----------------
@@ -201,7 +483,6 @@ class GraphData:
 # level".
 # ======================================================================================================================
 
-# TODO handle paralellism
 class GraphContainer(Nestable):
     """Represents a collection of grouped `GraphOp` and `GraphContainer` objects."""
     def __init__(self, contents, name='null', temporal_level=0, temporal_step=-1):
@@ -220,7 +501,149 @@ class GraphContainer(Nestable):
         self.temporal_step = temporal_step
         self.fn_name = name
 
+        # Totals over the whole hierarchy below this container, so that it can be summarized when collapsed.
+        self.op_count = sum(c.op_count if isinstance(c, GraphContainer) else 1 for c in self.contents)
+        self.container_count = sum(c.container_count + 1 if isinstance(c, GraphContainer) else 0
+                                   for c in self.contents)
+
+        # For temporal containers of level 1, the ops of the step in execution order, and an earlier step with the same
+        # structure (see `_get_step_signature()`), or `None` if this step is the first of its structure. Steps which
+        # share a template can be sent and laid out as the template plus the data of each step.
+        self.step_ops = None
+        self.template = None
+
+    def get_step_data(self):
+        """Returns the data passed to and from each op of a level 1 temporal container, in a structural order.
+
+        For each op in `step_ops`, its tracked arguments (in the order of `GraphOp.get_tracked_arg_edges()`) are
+        listed, followed by its tracked outputs. Two steps with the same template therefore list corresponding data at
+        the same positions.
 
+        Returns:
+            (list): `GraphData` objects; the same object may appear more than once.
+        """
+        step_data = []
+        for op in self.step_ops or []:
+            step_data.extend(arg for arg, _, _ in op.get_tracked_arg_edges())
+            step_data.extend(op_output for op_output, _ in op.get_output_edges())
+        return step_data
+
+
+class _RecordingState(threading.local):
+    """The recording buffers of a single thread.
+
+    Each thread records into its own frontiers, so threads running tracked code concurrently (for example, the workers
+    of an inference server) build separate graphs and never contend on the per-op path. Shared state is only touched
+    at `tick()`, under `_tick_lock`.
+    """
+    def __init__(self):
+        # Every outermost `GraphOp` or `GraphContainer` recorded since the last `tick()` at its temporal level, keyed by
+        # that level. Each frontier is a dict used as an insertion-ordered set. A temporal container is built from
+        # exactly one frontier, so `tick()` costs time proportional to the number of items recorded since the last
+        # tick, no matter how long the program has run. Frontiers are only kept once the thread has called `tick()`,
+        # so that a program which never does is not made to keep every op alive.
+        self.frontiers = defaultdict(dict)
+        self.ticking = False
+
+        # The `temporal_step` of the next temporal container built at each temporal level.
+        self.next_temporal_steps = defaultdict(int)
+
+        # Every `GraphOp` recorded since the last temporal container of level 1 was built, in execution order. Like the
+        # frontiers, these are only kept once the thread has called `tick()`, so the step ended by the first call has
+        # none, and is not deduplicated.
+        self.step_ops = []
+
+        # The `SamplingScheduler` this thread last consulted, the index of its iteration at the time, and whether that
+        # iteration is being recorded. The decision is cached until the scheduler advances, whichever thread ends the
+        # iteration, so that threads which never call `tick()` follow the iterations ended by those which do.
+        self.scheduler = None
+        self.iteration = None
+        self.recording = True
+
+
+_state = _RecordingState()
+
+# Guards the state shared between threads which is updated at `tick()`: the step templates and the sampling scheduler.
+_tick_lock = threading.Lock()
+
+# The first level 1 temporal container of each step structure still alive, keyed by step signature. Templates are
+# shared between threads, so steps recorded by different threads are deduplicated against each other.
+_step_templates = weakref.WeakValueDictionary()
+
+
+def _get_fn_key(fn):
+    """Returns a hashable key which is equal for calls to the same function, even if it was redefined (e.g. a lambda
+    created inside a loop)."""
+    return getattr(fn, '__code__', None) or id(fn)
+
+
+def _get_step_signature(step_ops):
+    """Returns a hashable description of the structure of a temporal step, which is equal for isomorphic steps.
+
+    Two steps have the same signature if they executed the same functions in the same order, wired together the same
+    way, within the same nesting of abstractive containers. Data from outside of the step (such as the hidden state
+    from the previous step) matches regardless of where it came from.
+
+    Args:
+        step_ops (list): The `GraphOp` objects of the step, in execution order.
+
+    Returns:
+        (tuple): The step's signature.
+    """
+    op_indices = {op: i for i, op in enumerate(step_ops)}
+    container_keys = dict()
+
+    def get_container_index(container):
+        if container is None:
+            return -1
+        if container not in container_keys:
+            parent_index = get_container_index(container.container)
+            container_keys[container] = (len(container_keys), container.fn_name, parent_index)
+        return container_keys[container][0]
+
+    def get_arg_key(arg, arg_name, pos):
+        if arg.creator_op in op_indices:
+            return op_indices[arg.creator_op], arg.creator_pos, arg_name, pos
+        return -1, -1, arg_name, pos
+
+    op_keys = tuple(
+        (_get_fn_key(op.fn),
+         get_container_index(op.container),
+         tuple(get_arg_key(*arg_edge) for arg_edge in op.get_tracked_arg_edges()),
+         len(op.outputs))
+        for op in step_ops
+    )
+    return op_keys, tuple(container_keys.values())
+
+
+def _add_to_frontier(item):
+    """Records a new outermost `GraphOp` or `GraphContainer` in the frontier of its temporal level, if the current
+    thread has started calling `tick()`."""
+    state = _state
+    if state.ticking:
+        state.frontiers[item.temporal_level][item] = None
+
+
+def _start_ticking(output):
+    """Starts keeping frontiers for the current thread at its first `tick()`, filling the frontier of level 0 with
+    the outermost parents of the ops leading to `output`, as nothing was kept before.
+
+    Args:
+        output (GraphData): The tracked output passed to the first `tick()`.
+    """
+    _state.ticking = True
+    ops_checked = set()
+    ops_to_check = deque([output.creator_op])
+    while len(ops_to_check) > 0:
+        op = ops_to_check.popleft()
+        if op is None or op in ops_checked:
+            continue
+        ops_checked.add(op)
+        _add_to_frontier(op.get_outermost_parent())
+        ops_to_check.extend(arg.creator_op for arg in op.get_tracked_args())
+
+
+@_instrumented('_build_abstractive_container')
 def _build_abstractive_container(outputs, inputs, container_name):
     """Creates an abstractive container enveloping all ops between the container's proposed outputs and inputs.
 
@@ -248,13 +671,125 @@ def _build_abstractive_container(outputs, inputs, container_name):
             contents.add(outermost_parent)
             data_to_check.extend(creator_op.get_tracked_args())
             ops_checked.add(creator_op)
+    if len(contents) == 0:
+        return
     container = GraphContainer(contents, name=container_name)
+    if _overhead_stats is not None:
+        _count_retained('_build_abstractive_container', container)
     # Update newly contained objects after iterating through the graph to prevent the new container from containing
     # itself (consider ops op1, op2, which share container c1. We are adding a new container c2. If we update the
     # container of op1 during iteration, then c1's container becomes c2. When we check op2, its outermost container
     # is now c2, meaning c2's container would become c2).
     for item in container.contents:
-        item.container = container
+        item.set_container(container)
+        _state.frontiers[item.temporal_level].pop(item, None)
+    _add_to_frontier(container)
+
+
+# ======================================================================================================================
+# Sampled recording.
+# ------------------
+# Long-running programs rarely need every iteration recorded; one representative graph out of every few thousand is
+# usually enough. A `SamplingScheduler` decides which iterations are recorded, where an "iteration" is the span between
+# two calls of `tick()` at the scheduler's `tick_level`. While an iteration is not sampled, `OpGenerator`,
+# `AbstractContainerGenerator` and `track_data()` pass straight through to the wrapped objects and record nothing.
+# ======================================================================================================================
+
+class SamplingScheduler:
+    """Selects the iterations whose computation graphs should be recorded."""
+    def __init__(self, period=None, rate=None, predicate=None, offset=0, tick_level=0, seed=None, history=0):
+        """Constructor. Any combination of `period`, `rate` and `predicate` may be given; an iteration is sampled only
+        if it satisfies every given criterion. If none are given, every iteration is sampled.
+
+        Args:
+            period (int or None): Record one iteration out of every `period`, namely those whose index `i` satisfies
+                `i % period == offset`.
+            rate (float or None): Record each iteration independently with probability `rate`.
+            predicate (fn or None): A function (int) => bool, which returns `True` if the iteration with the given
+                index should be recorded.
+            offset (int): The index, modulo `period`, of the first sampled iteration.
+            tick_level (int): Calls to `tick()` with at least this temporal level end the current iteration.
+            seed (int or None): Seed for the random number generator used with `rate`, for reproducible sampling.
+            history (int): The number of recent sampled iterations whose outputs are kept in `sampled_outputs`, so
+                that their graphs can be compared with `diff_graphs()`.
+        """
+        assert period is None or period > 0, 'Sampling period must be positive.'
+        assert rate is None or 0 <= rate <= 1, 'Sampling rate must be in [0, 1].'
+        self.period = period
+        self.rate = rate
+        self.predicate = predicate
+        self.offset = offset
+        self.tick_level = tick_level
+        self._random = random.Random(seed)
+
+        # The index of the current iteration, and whether it is being recorded. `recording` is read on every tracked
+        # call, so it is computed once per iteration rather than on demand.
+        self.iteration = 0
+        self.recording = self.should_record(self.iteration)
+
+        # The `GraphData` passed to the `tick()` which ended each of the last `history` sampled iterations, keyed by
+        # iteration index.
+        self.history = history
+        self.sampled_outputs = OrderedDict()
+
+    def should_record(self, iteration):
+        """Returns `True` if the iteration with index `iteration` should be recorded.
+
+        Args:
+            iteration (int): The index of an iteration, starting at 0.
+
+        Returns:
+            (bool): Whether the iteration is sampled.
+        """
+        if self.period is not None and iteration % self.period != self.offset % self.period:
+            return False
+        if self.rate is not None and self._random.random() >= self.rate:
+            return False
+        if self.predicate is not None and not self.predicate(iteration):
+            return False
+        return True
+
+    def keep_output(self, output):
+        """Keeps the output of the current iteration in `sampled_outputs`, dropping the oldest if there are more than
+        `history`.
+
+        Args:
+            output (GraphData): The output which ended the current iteration.
+        """
+        if self.history <= 0:
+            return
+        self.sampled_outputs[self.iteration] = output
+        while len(self.sampled_outputs) > self.history:
+            self.sampled_outputs.popitem(last=False)
+
+    def advance(self):
+        """Ends the current iteration and decides whether the next one should be recorded."""
+        # `iteration` is updated last, so that a thread which reads it before `recording` (see `_is_recording()`) never
+        # caches the decision of the previous iteration under the index of the next.
+        iteration = self.iteration + 1
+        self.recording = self.should_record(iteration)
+        self.iteration = iteration
+
+
+# The scheduler consulted by all tracking calls, or `None` if every call should be recorded. Set through
+# `set_sampling_scheduler()`. A single scheduler is shared by all threads, so iterations are counted across threads.
+_sampling_scheduler = None
+
+# The `viz.timeseries.TimeSeriesRecorder` which records the surfaced values of each output passed to `tick()`, or
+# `None`. Set through `set_time_series_recorder()`.
+_time_series_recorder = None
+
+
+def _is_recording():
+    """Returns `True` if graph objects should be created for the current thread's current iteration."""
+    scheduler = _sampling_scheduler
+    if scheduler is None:
+        return True
+    if _state.scheduler is not scheduler or _state.iteration != scheduler.iteration:
+        _state.scheduler = scheduler
+        _state.iteration = scheduler.iteration
+        _state.recording = scheduler.recording
+    return _state.recording
 
 
 # ======================================================================================================================
@@ -264,6 +799,7 @@ def _build_abstractive_container(outputs, inputs, container_name):
 # directly created, and should be created only using the following methods.
 # ======================================================================================================================
 
+@_instrumented('track_data')
 def track_data(obj, props_to_surface, creator_op=None, creator_pos=-1):
     """Creates a `GraphData` object which records the properties of `obj` and allows it to be shown in the graph.
 
@@ -280,19 +816,46 @@ def track_data(obj, props_to_surface, creator_op=None, creator_pos=-1):
             `obj` is a leaf, `creator_op = None`.
 
     Returns:
-        (GraphData): A wrapped version of the object, which can be used as if it were unwrapped.
+        (GraphData): A wrapped version of the object, which can be used as if it were unwrapped. If the current
+            iteration is not sampled (see `SamplingScheduler`), `obj` is returned unchanged.
     """
+    if not _is_recording():
+        return obj
     try:
         obj.xnode_graphdata = GraphData(obj, props_to_surface, creator_op, creator_pos)
     except AttributeError:
         # Built-in types, like `dict` and `list`, cannot have new properties added to them unless subclassed
-        class WrapperClass(type(obj)):
-            pass
-        obj = WrapperClass(obj)
+        obj = _get_wrapper_class(type(obj))(obj)
         obj.xnode_graphdata = GraphData(obj, props_to_surface, creator_op, creator_pos)
+    if _overhead_stats is not None:
+        _count_retained('track_data', obj.xnode_graphdata)
     return obj
 
 
+# Subclasses of built-in types, keyed by the built-in type, used to wrap objects which do not accept new attributes.
+_wrapper_classes = dict()
+
+
+def _get_wrapper_class(base_type):
+    """Returns the subclass of `base_type` whose instances can be tracked, creating it on first use.
+
+    Only one subclass is created per type, so tracking built-in objects in a loop does not define a new class each
+    time, and wrapped objects of the same type share a type.
+
+    Args:
+        base_type (type): The type of an object which does not accept new attributes.
+
+    Returns:
+        (type): A subclass of `base_type` which accepts new attributes.
+    """
+    wrapper_class = _wrapper_classes.get(base_type)
+    if wrapper_class is None:
+        # The subclass keeps the name of its base, so that it is shown the same way in the client. `setdefault` keeps
+        # the first class created if two threads race to create one.
+        wrapper_class = _wrapper_classes.setdefault(base_type, type(base_type.__name__, (base_type,), {}))
+    return wrapper_class
+
+
 def has_graphdata(obj):
     """Returns `True` if an object has an associated `GraphData` object.
 
@@ -327,6 +890,412 @@ def get_graphdata(obj):
     return getattr(obj, 'xnode_graphdata')
 
 
+def collect_graph(output):
+    """Returns every `GraphData`, `GraphOp` and `GraphContainer` in the history of a `GraphData`, in one pass.
+
+    The DAG is built backwards from `output` in a breadth-first search. Every output of each op found is collected,
+    even if it is not in the history of `output`, so that ops are complete. Each op's containers are collected as it is
+    found, walking up its container hierarchy only until a container that has already been collected.
+
+    Args:
+        output (GraphData): The `GraphData` whose history should be collected.
+
+    Returns:
+        (list): `GraphData` objects, starting with `output`, in breadth-first order.
+        (list): `GraphOp` objects, in breadth-first order.
+        (list): `GraphContainer` objects, each listed before any container it contains.
+        (list): Edges between the collected data and ops, as tuples (source, target, arg_name, pos). Argument edges go
+            from a `GraphData` to the `GraphOp` it was passed to, with the name and position given by
+            `GraphOp.get_tracked_arg_edges()`; output edges go from a `GraphOp` to its output, with `arg_name=None`.
+    """
+    data = [output]
+    ops = []
+    containers = []
+    edges = []
+    data_seen = {output}
+    ops_seen = set()
+    containers_seen = set()
+    data_to_check = deque([output])
+    while len(data_to_check) > 0:
+        op = data_to_check.popleft().creator_op
+        if op is None or op in ops_seen:
+            continue
+        ops_seen.add(op)
+        ops.append(op)
+        new_containers = []
+        container = op.container
+        while container is not None and container not in containers_seen:
+            containers_seen.add(container)
+            new_containers.append(container)
+            container = container.container
+        containers.extend(reversed(new_containers))
+        for op_output, pos in op.get_output_edges():
+            edges.append((op, op_output, None, pos))
+            if op_output not in data_seen:
+                data_seen.add(op_output)
+                data.append(op_output)
+        for arg, arg_name, pos in op.get_tracked_arg_edges():
+            edges.append((arg, op, arg_name, pos))
+            if arg not in data_seen:
+                data_seen.add(arg)
+                data.append(arg)
+                data_to_check.append(arg)
+    return data, ops, containers, edges
+
+
+def collect_container(container, height):
+    """Returns the contents of a `GraphContainer` down to a given nesting height, with deeper containers collapsed.
+
+    Items directly inside `container` are at depth 1. Containers at depth less than `height` are expanded, and their
+    contents collected; containers at depth `height` are collapsed, and stand in for every op inside them. Data is
+    collected only where it is passed to or from an expanded op, or crosses the boundary of a collapsed container,
+    so data internal to a collapsed container is left out. Both directions of the boundary are found through
+    `GraphData.creator_op` and `GraphData.get_consumers()`, so the cost is linear in the number of ops in `container`.
+
+    Args:
+        container (GraphContainer): The container whose contents should be collected.
+        height (int): The number of nesting levels to expand, at least 1.
+
+    Returns:
+        (list): `GraphData` objects passed to or from the collected ops and collapsed containers.
+        (list): `GraphOp` objects at depth `height` or less.
+        (list): `GraphContainer` objects which are expanded, starting with `container`.
+        (list): `GraphContainer` objects which are collapsed.
+        (list): Edges between the collected data, ops and collapsed containers, as tuples (source, target, arg_name,
+            pos); see `collect_graph()`.
+    """
+    containers = [container]
+    collapsed = []
+    # Every op in the container, mapped to the op itself if it is expanded or else the collapsed container it is in.
+    representatives = dict()
+    items_to_check = [(item, 1, None) for item in container.contents]
+    while len(items_to_check) > 0:
+        item, depth, representative = items_to_check.pop()
+        if isinstance(item, GraphOp):
+            representatives[item] = item if representative is None else representative
+            continue
+        if representative is None:
+            if depth < height:
+                containers.append(item)
+            else:
+                collapsed.append(item)
+                representative = item
+        items_to_check.extend((child, depth + 1, representative) for child in item.contents)
+
+    data = []
+    edges = []
+    data_seen = set()
+    edges_seen = set()
+
+    def add_edge(source, target, arg_name, pos):
+        if (source, target, arg_name, pos) in edges_seen:
+            return
+        edges_seen.add((source, target, arg_name, pos))
+        edges.append((source, target, arg_name, pos))
+        for graphdata in [source, target]:
+            if isinstance(graphdata, GraphData) and graphdata not in data_seen:
+                data_seen.add(graphdata)
+                data.append(graphdata)
+
+    for op, representative in representatives.items():
+        for arg, arg_name, pos in op.get_tracked_arg_edges():
+            if representative is not op and representatives.get(arg.creator_op) is representative:
+                continue
+            add_edge(arg, representative, arg_name, pos)
+        for op_output, pos in op.get_output_edges():
+            consumers = op_output.get_consumers()
+            if representative is op or len(consumers) == 0 \
+                    or any(representatives.get(consumer) is not representative for consumer in consumers):
+                add_edge(representative, op_output, None, pos)
+    ops = [op for op, representative in representatives.items() if representative is op]
+    return data, ops, containers, collapsed, edges
+
+
+def get_forward_slice(obj):
+    """Returns every `GraphOp` and `GraphData` that was computed, directly or indirectly, from a tracked object.
+
+    The graph is otherwise only navigable backwards, from outputs to the ops that created them. The forward slice
+    instead answers "what did this data feed into?", following the consumers recorded on each `GraphData`, so it takes
+    time proportional to the size of the slice rather than the size of the history.
+
+    Args:
+        obj (object): An object which has been tracked (see `track_data()`).
+
+    Returns:
+        (list): `GraphOp` objects in the slice, in breadth-first order.
+        (list): `GraphData` objects in the slice, excluding that of `obj`, in breadth-first order.
+    """
+    ops = []
+    data = []
+    ops_seen = set()
+    data_to_check = deque([get_graphdata(obj)])
+    while len(data_to_check) > 0:
+        for op in data_to_check.popleft().get_consumers():
+            if op in ops_seen:
+                continue
+            ops_seen.add(op)
+            ops.append(op)
+            data.extend(op.outputs)
+            data_to_check.extend(op.outputs)
+    return ops, data
+
+
+def _get_structural_keys(ops, interned_keys):
+    """Returns a key for each op which is equal for ops with the same callable, wired in the same way to ops with equal
+    keys.
+
+    Keys are computed from an op's callable, the name and position of each tracked argument, and the key and output
+    position of the op which created each argument, so two ops have equal keys exactly when their histories have the
+    same structure. Each key is interned to an int, so comparing keys takes constant time however deep the history.
+
+    Args:
+        ops (list): `GraphOp` objects, including the creator of each of their tracked arguments.
+        interned_keys (dict): The int of each key seen so far; shared between graphs whose keys will be compared.
+
+    Returns:
+        (dict): A mapping of each op to its key.
+    """
+    keys = dict()
+    for root in ops:
+        # Creators are keyed before the ops that consume their outputs, with an explicit stack since histories can be
+        # far deeper than the recursion limit.
+        ops_to_key = [root]
+        while len(ops_to_key) > 0:
+            op = ops_to_key[-1]
+            if op in keys:
+                ops_to_key.pop()
+                continue
+            arg_edges = op.get_tracked_arg_edges()
+            creators_to_key = [arg.creator_op for arg, _, _ in arg_edges
+                               if arg.creator_op is not None and arg.creator_op not in keys]
+            if len(creators_to_key) > 0:
+                ops_to_key.extend(creators_to_key)
+                continue
+            ops_to_key.pop()
+            key = (_get_op_fn_key(op), tuple([
+                (arg_name, pos, keys[arg.creator_op] if arg.creator_op is not None else -1, arg.creator_pos)
+                for arg, arg_name, pos in arg_edges
+            ]))
+            keys[op] = interned_keys.setdefault(key, len(interned_keys))
+    return keys
+
+
+def _get_op_fn_key(op):
+    """Returns the key of an op's callable, or its function name if it has none (see `GraphOp.from_record()`)."""
+    return _get_fn_key(op.fn) if op.fn is not None else op.fn_name
+
+
+def _get_local_key(op):
+    """Returns a key for an op which is equal for ops with the same callable, wired in the same way to ops with the
+    same callables."""
+    return _get_op_fn_key(op), tuple([
+        (arg_name, pos, _get_op_fn_key(arg.creator_op) if arg.creator_op is not None else -1, arg.creator_pos)
+        for arg, arg_name, pos in op.get_tracked_arg_edges()
+    ])
+
+
+def _match_ops(old_ops, new_ops, get_key):
+    """Pairs ops with equal keys, in order of occurrence.
+
+    Args:
+        old_ops (list): `GraphOp` objects of the first graph.
+        new_ops (list): `GraphOp` objects of the second graph.
+        get_key (fn): A (GraphOp) => hashable function.
+
+    Returns:
+        (list): Tuples (old op, new op) of matched ops.
+        (list): Unmatched ops of `old_ops`, in order.
+        (list): Unmatched ops of `new_ops`, in order.
+    """
+    candidates = defaultdict(deque)
+    for op in old_ops:
+        candidates[get_key(op)].append(op)
+    matches = []
+    unmatched_new_ops = []
+    for op in new_ops:
+        same_key_ops = candidates.get(get_key(op))
+        if same_key_ops:
+            matches.append((same_key_ops.popleft(), op))
+        else:
+            unmatched_new_ops.append(op)
+    matched_old_ops = {old_op for old_op, _ in matches}
+    return matches, [op for op in old_ops if op not in matched_old_ops], unmatched_new_ops
+
+
+def diff_graphs(old_output, new_output):
+    """Compares the histories of two tracked objects, such as the outputs of two iterations, and returns the ops which
+    differ.
+
+    Ops are matched, in order of occurrence, in three passes. First, ops whose whole histories have the same structure
+    are matched (see `_get_structural_keys()`). Of those left, ops with the same callable and the same direct wiring are
+    matched; these only differ upstream, so they are not reported. Finally, ops with the same callable are matched and
+    reported as changed. The remaining ops were added or removed. Each pass takes time linear in the size of the
+    graphs.
+
+    Graphs loaded from disk have no callables (see `GraphOp.from_record()`), so their ops are matched by function name
+    and should only be compared with other loaded graphs.
+
+    Args:
+        old_output (object): A tracked object, or its `GraphData`, whose history is the first graph.
+        new_output (object): A tracked object, or its `GraphData`, whose history is the second graph.
+
+    Returns:
+        (list): `GraphOp` objects only in the second graph.
+        (list): `GraphOp` objects only in the first graph.
+        (list): Tuples (old op, new op) of ops with the same callable but different wiring.
+    """
+    old_ops = collect_graph(old_output if isinstance(old_output, GraphData) else get_graphdata(old_output))[1]
+    new_ops = collect_graph(new_output if isinstance(new_output, GraphData) else get_graphdata(new_output))[1]
+    interned_keys = dict()
+    structural_keys = _get_structural_keys(old_ops, interned_keys)
+    structural_keys.update(_get_structural_keys(new_ops, interned_keys))
+    _, old_ops, new_ops = _match_ops(old_ops, new_ops, structural_keys.__getitem__)
+    _, old_ops, new_ops = _match_ops(old_ops, new_ops, _get_local_key)
+    changed, removed, added = _match_ops(old_ops, new_ops, _get_op_fn_key)
+    return added, removed, changed
+
+
+def set_sampling_scheduler(scheduler):
+    """Sets the `SamplingScheduler` which decides the iterations whose computation graphs are recorded.
+
+    For example, `set_sampling_scheduler(SamplingScheduler(period=1000))` records the first iteration and every
+    thousandth after it, where iterations are delimited by calls to `tick(output, 0)`.
+
+    Args:
+        scheduler (SamplingScheduler or None): The new scheduler, or `None` to record every iteration.
+
+    Returns:
+        (SamplingScheduler or None): The previously set scheduler.
+    """
+    global _sampling_scheduler
+    previous_scheduler = _sampling_scheduler
+    _sampling_scheduler = scheduler
+    return previous_scheduler
+
+
+def set_time_series_recorder(recorder):
+    """Sets the `viz.timeseries.TimeSeriesRecorder` which keeps a time series of the values surfaced by the outputs
+    passed to `tick()`.
+
+    Args:
+        recorder (TimeSeriesRecorder or None): The new recorder, or `None` to stop recording time series.
+
+    Returns:
+        (TimeSeriesRecorder or None): The previously set recorder.
+    """
+    global _time_series_recorder
+    previous_recorder = _time_series_recorder
+    _time_series_recorder = recorder
+    return previous_recorder
+
+
+def get_time_series_recorder():
+    """Returns the `viz.timeseries.TimeSeriesRecorder` set with `set_time_series_recorder()`, or `None`."""
+    return _time_series_recorder
+
+
+def set_overhead_stats(enabled):
+    """Enables or disables counting the overhead of tracking, and resets the counters.
+
+    The counted functions are `GraphOp.__init__`, `track_data`, `_build_abstractive_container`, `tick`, and
+    `OpGenerator.__call__`. The last is measured without the wrapped function itself, and also counts ops recorded by
+    `track_module()`. Times include the time spent in any counted function called within; for example, the time of
+    `OpGenerator.__call__` includes that of `GraphOp.__init__` and `track_data` for its outputs. Bytes are counted only
+    by the function which creates each graph object, as the shallow size of the object and of its attribute
+    collections; the tracked objects themselves are not counted.
+
+    The counted functions are replaced by counting wrappers in this module and in `GraphOp` while counting is enabled,
+    and restored when it is disabled, so that disabled counting costs nothing. Calls through references taken before
+    counting was enabled, such as `from viz.graphtracker import tick`, are not counted.
+
+    Args:
+        enabled (bool): Whether to count the overhead of tracking.
+    """
+    global _overhead_stats
+    _overhead_stats = _OverheadStats() if enabled else None
+    _install_counting_wrappers(enabled)
+
+
+def get_overhead_stats():
+    """Returns the counters accumulated since `set_overhead_stats(True)` was last called.
+
+    Returns:
+        (dict or None): A dict of the form {function name: {'calls': int, 'seconds': float, 'bytes': int}}, or `None`
+            if counting is disabled.
+    """
+    stats = _overhead_stats
+    if stats is None:
+        return None
+    with stats.lock:
+        return {name: dict(counter) for name, counter in stats.counters.items()}
+
+
+def set_prop_snapshots(enabled, summarize_fn=summarize_value):
+    """Sets whether `GraphData` objects created from now on snapshot their surfaced properties.
+
+    By default, a `GraphData` keeps its wrapped object alive and reads the surfaced properties when it is inspected,
+    so recording a long run keeps every intermediate output in memory. In snapshot mode, the surfaced values are passed
+    through `summarize_fn` when they are surfaced, and the wrapped object is only weakly referenced; once the program
+    drops it, the graph keeps only the snapshots. Attributes of collected objects can then no longer be inspected.
+
+    Args:
+        enabled (bool): Whether to snapshot surfaced properties.
+        summarize_fn (callable): Maps a surfaced value to the value kept in the graph. `summarize_value()` keeps small
+            summaries of arrays and tensors; `copy.deepcopy` would keep full copies instead.
+    """
+    global _prop_snapshot_fn
+    _prop_snapshot_fn = summarize_fn if enabled else None
+
+
+def _get_fn_name(fn):
+    """Returns the name of a callable; PyTorch modules don't have a `__name__` field, so their class name is used."""
+    try:
+        return fn.__name__
+    except AttributeError:
+        return fn.__class__.__name__
+
+
+@_instrumented('OpGenerator.__call__')
+def _record_op(fn, args, kwargs, ret, output_props):
+    """Creates a `GraphOp` recording a finished call of `fn`, and tracks each of its outputs.
+
+    Args:
+        fn (callable): The function which was called.
+        args (tuple): The positional arguments of the call.
+        kwargs (dict): The keyword arguments of the call.
+        ret (object): The return value of the call.
+        output_props (list or None): The `props_to_surface` of each output; see `OpGenerator`.
+
+    Returns:
+        The return value, with each output tracked.
+    """
+    multiple_returns = isinstance(ret, tuple) and len(ret) > 1
+    op = GraphOp(fn, args, kwargs)
+    state = _state
+    if state.ticking:
+        state.frontiers[0][op] = None
+        state.step_ops.append(op)
+    # An op which takes the same data more than once is still only one consumer of it.
+    for arg in dict.fromkeys(op.get_tracked_args()):
+        arg.add_consumer(op)
+    # TODO handle passthrough returns
+    if multiple_returns:
+        ret_graphdata = tuple([track_data(r,
+                                          output_props[i] if output_props is not None else None,
+                                          creator_op=op,
+                                          creator_pos=i)
+                               for i, r in enumerate(ret)])
+    else:
+        ret_graphdata = track_data(ret,
+                                   output_props[0] if output_props is not None else None,
+                                   creator_op=op,
+                                   creator_pos=0)
+    # The op records the `GraphData` of its outputs rather than the outputs themselves, so that it does not keep them
+    # alive when they are only weakly held (see `set_prop_snapshots()`).
+    op.outputs = tuple([get_graphdata(r) for r in (ret_graphdata if multiple_returns else (ret_graphdata, ))])
+    return ret_graphdata
+
+
 class OpGenerator(wrapt.ObjectProxy):
     """Wraps a callable object, creating a `GraphOp` whenever called and wrapping each output in a `GraphData`."""
     def __init__(self, obj, output_props_to_surface=None):
@@ -381,23 +1350,10 @@ class OpGenerator(wrapt.ObjectProxy):
         # (since it takes as argument a list), but could be made to work with a wrapper that takes in any number of
         # inputs and collects them into a list before calling cat. If we do, how do we know when to stop diving,
         # and what do we do about output_props?
+        if not _is_recording():
+            return self.__wrapped__(*args, **kwargs)
         ret = self.__wrapped__(*args, **kwargs)
-        multiple_returns = isinstance(ret, tuple) and len(ret) > 1
-        op = GraphOp(self.__wrapped__, args, kwargs)
-        # TODO handle passthrough returns
-        if multiple_returns:
-            ret_graphdata = tuple([track_data(r,
-                                     self._self_output_props[i] if self._self_output_props is not None else None,
-                                     creator_op=op,
-                                     creator_pos=i)
-                          for i, r in enumerate(ret)])
-        else:
-            ret_graphdata = track_data(ret,
-                              self._self_output_props[0] if self._self_output_props is not None else None,
-                              creator_op=op,
-                              creator_pos=0)
-        op.outputs = ret_graphdata if isinstance(ret_graphdata, tuple) else (ret_graphdata, )
-        return ret_graphdata
+        return _record_op(self.__wrapped__, args, kwargs, ret, self._self_output_props)
 
 
 class AbstractContainerGenerator(wrapt.ObjectProxy):
@@ -420,61 +1376,169 @@ class AbstractContainerGenerator(wrapt.ObjectProxy):
         Returns:
             The unchanged output of the wrapped function.
         """
+        if not _is_recording():
+            return self.__wrapped__(*args, **kwargs)
         inputs = set(get_graphdata(obj) for obj in args + tuple(kwargs.values()) if has_graphdata(obj))
         ret = self.__wrapped__(*args, **kwargs)
         output_graphdata = [get_graphdata(obj) for obj in ret if has_graphdata(obj)] \
             if isinstance(ret, tuple) and len(ret) > 1 else [get_graphdata(ret)]
-        _build_abstractive_container(output_graphdata, inputs, self.get_fn_name())
+        _build_abstractive_container(output_graphdata, inputs, _get_fn_name(self.__wrapped__))
         return ret
 
     def get_fn_name(self):
-        try:
-            return self.__wrapped__.__name__
-        except AttributeError:
-            return self.__wrapped__.__class__.__name__
+        return _get_fn_name(self.__wrapped__)
+
+
+class ModuleTracker:
+    """A handle to the forward hooks installed across a module tree by `track_module()`."""
+    def __init__(self, module, output_props_to_surface=None):
+        """Constructor. Installs a forward hook on every module in the tree rooted at `module`.
+
+        Args:
+            module (torch.nn.Module): The root of the module tree to track.
+            output_props_to_surface (list or None): The `props_to_surface` of each output of every leaf module; see
+                `OpGenerator`.
+        """
+        self.output_props = output_props_to_surface
+        self.handles = []
+        for submodule in module.modules():
+            if next(submodule.children(), None) is None:
+                self.handles.append(submodule.register_forward_hook(self._record_leaf_hook))
+            else:
+                self.handles.append(submodule.register_forward_hook(self._record_container_hook))
+
+    def _record_leaf_hook(self, module, inputs, output):
+        """Forward hook for leaf modules, which records the call as a `GraphOp` and tracks its outputs."""
+        if not _is_recording():
+            return None
+        tracked_output = _record_op(module, inputs, dict(), output, self.output_props)
+        # Tensors are tracked in place, so the output only needs replacing if it had to be wrapped (see `track_data()`).
+        return tracked_output if tracked_output is not output else None
+
+    def _record_container_hook(self, module, inputs, output):
+        """Forward hook for modules with children, which contains everything they recorded in an abstractive
+        container. Children's hooks always run before their parent's, so their ops have already been recorded. No
+        container is built if the module's output is not tracked (see `track_module()`)."""
+        if not _is_recording():
+            return None
+        outputs = output if isinstance(output, tuple) else (output, )
+        output_graphdata = [get_graphdata(obj) for obj in outputs if has_graphdata(obj)]
+        if len(output_graphdata) > 0:
+            input_graphdata = set(get_graphdata(obj) for obj in inputs if has_graphdata(obj))
+            _build_abstractive_container(output_graphdata, input_graphdata, _get_fn_name(module))
+        return None
+
+    def remove(self):
+        """Removes every hook installed, so that the module tree is no longer tracked."""
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+
+
+def track_module(module, output_props_to_surface=None):
+    """Tracks every call of a PyTorch module tree in the computation graph, without wrapping any of its modules.
+
+    A forward hook is installed once on every module in the tree. Each call of a leaf module (one with no children,
+    such as `nn.Conv2d`) is recorded as a `GraphOp`, as if it were wrapped in an `OpGenerator`. Each call of a module
+    with children (such as `nn.Sequential` or a user-defined model) is recorded as an abstractive container, as if it
+    were wrapped in an `AbstractContainerGenerator`, so the module hierarchy is mirrored by the container hierarchy.
+    Unlike wrapping, hooks add no proxy indirection to calls of the module, and models need no changes to be tracked.
+
+    The inputs of the root module should be tracked with `track_data()`; otherwise, its container extends back through
+    the history of its inputs. Modules should not also be wrapped in `OpGenerator` or `AbstractContainerGenerator`, as
+    their calls would then be recorded twice.
+
+    A module with children is only given a container if its output is tracked, that is, if the output was returned by
+    one of its children or by another tracked op. Only module calls are recorded, so a module which applies untracked
+    functions (such as `torch.nn.functional.relu` or `Tensor.view`) after its last child returns an untracked output,
+    and its children's ops are left in the container of its parent instead. Such functions can be wrapped in an
+    `OpGenerator`, or moved into child modules (such as `nn.ReLU`), to keep the module's container.
+
+    Args:
+        module (torch.nn.Module): The root of the module tree to track.
+        output_props_to_surface (list or None): The `props_to_surface` of each output of every leaf module; see
+            `OpGenerator`.
+
+    Returns:
+        (ModuleTracker): A handle whose `remove()` uninstalls the hooks.
+    """
+    return ModuleTracker(module, output_props_to_surface)
 
 
+@_instrumented('tick')
 def tick(output, temporal_level):
-    """Create a temporal container extending backwards from output and encapsulating any outer-level op or container
-    with `temporal_level`.
+    """Create a temporal container encapsulating every outer-level op or container with `temporal_level` recorded since
+    the last call to `tick()` at that level.
 
     Every op and container has a temporal level; abstractive containers and ops have level 0, and temporal containers
-    have level > 0. Temporal containers of level n contain only items of temporal level n-1. If
-    `output`'s outermost parent (see `Nestable.get_outermost_parent()` for definition) is of temporal level
-    lower than  `temporal_level`, then `_tick(output, temporal_level-1)` is called before execution. This ensures that
-    the concept of "temporal subdivision" is maintained, and that temporal containers only contain items at exactly one
-    level below them.
+    have level > 0. Temporal containers of level n contain only items of temporal level n-1. The tracker keeps a
+    frontier of the outermost items (see `Nestable.get_outermost_parent()` for definition) recorded at each level since
+    that level was last ticked, so building the container takes time proportional to the number of new items. If items
+    of a level lower than `temporal_level` are left in their frontiers, they are first wrapped in containers of their
+    own, one level at a time. This ensures that the concept of "temporal subdivision" is maintained, and that temporal
+    containers only contain items at exactly one level below them.
+
+    If a `SamplingScheduler` is set, a call with `temporal_level` of at least the scheduler's `tick_level` also ends the
+    current iteration. No container is built for iterations which are not sampled. If a `TimeSeriesRecorder` is set,
+    the surfaced values of `output` are added to its time series.
+
+    Frontiers are only kept once a thread first calls `tick()`, as they hold the ops recorded since; the step ended
+    by the first call is made of the ops leading to `output`. After that, `output` is not used to find the contents of
+    containers, but only decides whether any are built (none are, if it is not tracked), and is the output kept by the
+    scheduler and recorder.
 
     Args:
-        output (GraphData): A `GraphData` from which to build the new temporal container.
+        output (GraphData): The tracked output which ends the temporal step.
         temporal_level (int): The temporal level of ops and containers that should be encapsulated by the new temporal
             container.
     """
-    output = get_graphdata(output)
-    if output.creator_op is not None \
-            and output.creator_op.get_outermost_parent().temporal_level < temporal_level:
-        tick(output, temporal_level - 1)
-
-    contents = set()
-    ops_checked = set()
-    ops_to_check = deque([output.creator_op])
-    max_temporal_step = -1
+    if _is_recording() and has_graphdata(output):
+        if not _state.ticking:
+            _start_ticking(get_graphdata(output))
+        _build_temporal_containers(temporal_level)
+    # Iteration boundaries are only counted after the iteration's last container is built, so that the whole iteration
+    # is either recorded or skipped.
+    scheduler = _sampling_scheduler
+    if scheduler is not None and temporal_level >= scheduler.tick_level:
+        with _tick_lock:
+            if _is_recording() and has_graphdata(output):
+                scheduler.keep_output(get_graphdata(output))
+            scheduler.advance()
+    recorder = _time_series_recorder
+    if recorder is not None:
+        with _tick_lock:
+            recorder.record(get_graphdata(output) if has_graphdata(output) else None, temporal_level)
+
+
+def _build_temporal_containers(temporal_level):
+    """Creates the temporal containers for `tick()` from the frontiers up to `temporal_level`; see `tick()` for details.
 
-    while len(ops_to_check) > 0:
-        op = ops_to_check.popleft()
-        if op not in ops_checked and op is not None:
-            ops_checked.add(op)
-            highest = op.get_outermost_parent()
-            assert highest.temporal_level >= temporal_level
-            if highest.temporal_level == temporal_level:
-                contents.add(highest)
-                ops_to_check.extend([arg.creator_op for arg in op.get_tracked_args()])
-            else:
-                max_temporal_step = max(max_temporal_step, highest.temporal_step)
-    container = GraphContainer(contents, temporal_level=temporal_level+1, temporal_step=max_temporal_step+1)
-    # Update container fields of new container's contents after iteration to prevent premature exiting (consider ops
-    # op1, op2, which are in temporal container c1 of level 1. We now are adding a temporal container c2 of height 2. If
-    # we update the container of c1 during iteration, then when iteration reaches op2, its outermost parent would be
-    # c2. Thus,it would not be enqueued and its ancestors would not be added to c2).
-    for item in container.contents:
-        item.container = container
\ No newline at end of file
+    Args:
+        temporal_level (int): The temporal level of ops and containers that should be encapsulated by the new temporal
+            container.
+    """
+    # Each container built is added to the frontier of the next level, so it is picked up by the next iteration.
+    for level in range(temporal_level + 1):
+        frontier = _state.frontiers.pop(level, None)
+        if not frontier:
+            continue
+        container = GraphContainer(set(frontier), temporal_level=level+1,
+                                   temporal_step=_state.next_temporal_steps[level])
+        if level == 0 and _state.step_ops:
+            # The signature must be taken before the step's contents are placed in the new container.
+            container.step_ops = _state.step_ops
+            _state.step_ops = []
+            signature = _get_step_signature(container.step_ops)
+            with _tick_lock:
+                container.template = _step_templates.get(signature)
+                if container.template is None:
+                    _step_templates[signature] = container
+        _state.next_temporal_steps[level] += 1
+        # Steps of lower levels are counted within their enclosing container, which has just been closed.
+        for lower_level in range(level):
+            _state.next_temporal_steps.pop(lower_level, None)
+        for item in container.contents:
+            item.set_container(container)
+        _add_to_frontier(container)
+        if _overhead_stats is not None:
+            _count_retained('tick', container)
@@ -0,0 +1,103 @@
+"""
+Records what the debugger shows at each breakpoint, so that a run can be browsed after it has moved on or exited,
+without running it again.
+
+A recording is a directory holding an append-only log of JSON records, one per line, in `snapshots.jsonl`: the context
+and namespace shells of each breakpoint, and the data object of each symbol loaded there. Records are only ever
+appended, so a recording survives the program crashing, and `index.jsonl` lists where each one starts so that it can
+be read without scanning the log. The contents of tensors are moved out of their data objects into `tensors.blob`,
+from which a replay server reads only the tensors which are inspected.
+
+Example:
+    Recording a run, then browsing it with no live program::
+
+        from viz.debug import set_trace
+        set_trace(record_dir='runs/overnight')
+        ...
+        $ node server/server.js --replay runs/overnight
+"""
+import json
+import os
+import numpy as np
+
+from viz.graphexport import BlobWriter
+
+# The dtypes of tensor contents which are moved to the blob; each can be read by the replay server as a typed array.
+BLOB_DTYPES = ('float32', 'float64', 'int8', 'int16', 'int32', 'uint8', 'uint16', 'uint32')
+
+
+class SnapshotRecorder:
+    """Appends the breakpoints of a run, and the symbols loaded at each, to a recording directory."""
+    def __init__(self, directory):
+        """Constructor. Appends to the recording in `directory` if there is one, or else starts a new one.
+
+        Args:
+            directory (str): The path of the recording directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.log_file = open(os.path.join(directory, 'snapshots.jsonl'), 'ab')
+        self.index_file = open(os.path.join(directory, 'index.jsonl'), 'a')
+        self.blob_file = open(os.path.join(directory, 'tensors.blob'), 'ab')
+        self.blob_writer = BlobWriter(self.blob_file)
+        self.blob_writer.size = self.blob_file.tell()
+        with open(os.path.join(directory, 'index.jsonl')) as index_file:
+            # The number of the next breakpoint, counting those already in the recording.
+            self.seq = sum(1 for line in index_file if json.loads(line)['kind'] == 'breakpoint')
+        # The IDs of the symbols recorded at the current breakpoint.
+        self.recorded_symbols = set()
+
+    def _append(self, record, index_entry):
+        """Appends a record to the log and its entry to the index, flushing both so that the record is kept even if the
+        program dies."""
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        index_entry.update({'offset': self.log_file.tell(), 'length': len(line)})
+        self.log_file.write(line)
+        self.log_file.flush()
+        self.blob_file.flush()
+        self.index_file.write(json.dumps(index_entry) + '\n')
+        self.index_file.flush()
+
+    def record_breakpoint(self, context, namespace):
+        """Records a breakpoint at which the program has stopped.
+
+        Args:
+            context (list): The program's context (see `VisualDebugger._get_context()`).
+            namespace (dict): The shells of the symbols in the namespace, keyed by reference.
+
+        Returns:
+            (int): The number of the breakpoint in the recording.
+        """
+        self.seq += 1
+        self.recorded_symbols = set()
+        self._append({'kind': 'breakpoint', 'seq': self.seq, 'context': context, 'namespace': namespace},
+                     {'kind': 'breakpoint', 'seq': self.seq})
+        return self.seq
+
+    def record_symbol(self, symbol_id, symbol_type, data, shells):
+        """Records the data object of a symbol loaded at the current breakpoint; symbols loaded again are skipped.
+
+        The numeric contents of tensors are written to the blob, and replaced in the recorded data object by a
+        reference of the form {'blob': {'offset', 'dtype', 'shape'}}. The data object itself is not changed.
+
+        Args:
+            symbol_id (str): The ID of the symbol.
+            symbol_type (str): The type of the symbol's shell.
+            data (dict): The symbol's data object.
+            shells (dict): The shells of the symbols referenced by the data object.
+        """
+        if symbol_id in self.recorded_symbols:
+            return
+        self.recorded_symbols.add(symbol_id)
+        viewer = data.get('viewer') if isinstance(data, dict) else None
+        if (symbol_type == 'tensor' and isinstance(viewer, dict) and isinstance(viewer.get('contents'), list) and
+                viewer.get('type') in BLOB_DTYPES):
+            contents = np.asarray(viewer['contents'], dtype=viewer['type'])
+            data = dict(data, viewer=dict(viewer, contents={'blob': self.blob_writer.write(contents)}))
+        self._append({'kind': 'symbol', 'seq': self.seq, 'symbolid': symbol_id, 'data': data, 'shells': shells},
+                     {'kind': 'symbol', 'seq': self.seq, 'symbolid': symbol_id})
+
+    def close(self):
+        """Closes the files of the recording."""
+        self.log_file.close()
+        self.index_file.close()
+        self.blob_file.close()
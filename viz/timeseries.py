@@ -0,0 +1,231 @@
+"""
+Records the surfaced values of tracked outputs across calls of `tick()`, so that quantities such as the loss or the
+norm of a hidden state can be plotted over a whole run rather than only inspected at the current moment.
+
+Each surfaced property is kept in a `RingBuffer` of preallocated NumPy arrays, so recording takes constant time and
+memory no matter how long the program runs. Series are downsampled to the width of the plot before they are sent to the
+client, so the payload does not grow with the length of the run.
+
+Example:
+    Recording the loss at every iteration::
+
+        set_time_series_recorder(TimeSeriesRecorder(capacity=100000))
+        ...
+        loss = track_data(loss, {'loss': None})
+        tick(loss, 0)
+"""
+import numpy as np
+
+
+# ======================================================================================================================
+# Ring buffers.
+# -------------
+# A `RingBuffer` holds the most recent `capacity` (time, value) points of one series.
+# ======================================================================================================================
+
+class RingBuffer:
+    """A fixed-capacity series of (time, value) points, which overwrites its oldest points when full."""
+    def __init__(self, capacity):
+        """Constructor.
+
+        Args:
+            capacity (int): The maximum number of points kept.
+        """
+        assert capacity > 0, 'Ring buffer capacity must be positive.'
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.capacity = capacity
+        # The total number of points ever appended; the next point is written at `count % capacity`.
+        self.count = 0
+
+    def append(self, time, value):
+        """Adds a point, overwriting the oldest point if the buffer is full.
+
+        Args:
+            time (int): The time index of the point.
+            value (float): The value of the point.
+        """
+        i = self.count % self.capacity
+        self.times[i] = time
+        self.values[i] = value
+        self.count += 1
+
+    def get(self):
+        """Returns the points in the buffer, oldest first.
+
+        Returns:
+            (np.ndarray): The times of the points.
+            (np.ndarray): The values of the points.
+        """
+        if self.count <= self.capacity:
+            return self.times[:self.count], self.values[:self.count]
+        start = self.count % self.capacity
+        return np.roll(self.times, -start), np.roll(self.values, -start)
+
+
+# ======================================================================================================================
+# Downsampling.
+# -------------
+# Both methods keep the first and last points and return at most `width` points, so a series can be drawn one point
+# per pixel. Min/max buckets preserve every extreme, so spikes are never hidden; largest-triangle-three-buckets (LTTB)
+# keeps the points which most affect the shape of the curve, so it looks closer to the full series.
+# ======================================================================================================================
+
+def downsample_min_max(times, values, width):
+    """Downsamples a series by keeping its first and last points, and the minimum and maximum of each of
+    `(width - 2) // 2` equal buckets of the points between them.
+
+    Args:
+        times (np.ndarray): The times of the points, in increasing order.
+        values (np.ndarray): The values of the points.
+        width (int): The maximum number of points to return.
+
+    Returns:
+        (np.ndarray): The times of the kept points.
+        (np.ndarray): The values of the kept points.
+    """
+    num_buckets = (width - 2) // 2
+    if len(values) <= width or num_buckets < 1:
+        return times, values
+    bounds = np.linspace(1, len(values) - 1, num_buckets + 1).astype(np.int64)
+    kept = [0]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        bucket = values[start:end]
+        # The extremes are kept in time order, so that the curve is drawn correctly through the bucket.
+        kept.extend(sorted({start + int(np.argmin(bucket)), start + int(np.argmax(bucket))}))
+    kept.append(len(values) - 1)
+    kept = np.array(kept)
+    return times[kept], values[kept]
+
+
+def downsample_lttb(times, values, width):
+    """Downsamples a series with the largest-triangle-three-buckets algorithm.
+
+    The points between the first and last are split into `width - 2` equal buckets. From each bucket, the point which
+    forms the largest triangle with the point kept from the previous bucket and the mean of the next bucket is kept.
+
+    Args:
+        times (np.ndarray): The times of the points, in increasing order.
+        values (np.ndarray): The values of the points.
+        width (int): The maximum number of points to return.
+
+    Returns:
+        (np.ndarray): The times of the kept points.
+        (np.ndarray): The values of the kept points.
+    """
+    if len(values) <= width or width < 3:
+        return times, values
+    x = times.astype(np.float64)
+    bounds = np.linspace(1, len(values) - 1, width - 1).astype(np.int64)
+    kept = [0]
+    for i in range(width - 2):
+        start, end = bounds[i], bounds[i + 1]
+        if i + 2 < len(bounds):
+            next_x, next_y = x[end:bounds[i + 2]].mean(), values[end:bounds[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], values[-1]
+        prev_x, prev_y = x[kept[-1]], values[kept[-1]]
+        # Twice the area of each triangle; the factor does not change which is largest.
+        areas = np.abs((prev_x - next_x) * (values[start:end] - prev_y) - (prev_x - x[start:end]) * (next_y - prev_y))
+        kept.append(start + int(np.argmax(areas)))
+    kept.append(len(values) - 1)
+    kept = np.array(kept)
+    return times[kept], values[kept]
+
+
+# The downsampling functions which can be requested by name.
+DOWNSAMPLERS = {
+    'minmax': downsample_min_max,
+    'lttb': downsample_lttb,
+}
+
+
+# ======================================================================================================================
+# Recording.
+# ----------
+# A `TimeSeriesRecorder` is set with `graphtracker.set_time_series_recorder()`, and is called by `tick()`.
+# ======================================================================================================================
+
+def _to_scalar(value):
+    """Returns a surfaced value as a float, or `None` if it cannot be summarized as one.
+
+    Numbers and single-element arrays are converted directly; larger arrays and tensors are summarized by their norm.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError, RuntimeError):
+        pass
+    if hasattr(value, 'norm'):
+        # PyTorch tensors and variables.
+        try:
+            return float(value.norm())
+        except (TypeError, ValueError, RuntimeError):
+            return None
+    try:
+        return float(np.linalg.norm(np.asarray(value, dtype=np.float64)))
+    except (TypeError, ValueError):
+        return None
+
+
+class TimeSeriesRecorder:
+    """Keeps a time series of each scalar surfaced property of the outputs passed to `tick()`."""
+    def __init__(self, capacity=10000, temporal_level=0, props=None):
+        """Constructor.
+
+        Args:
+            capacity (int): The number of most recent points kept in each series.
+            temporal_level (int): Calls to `tick()` with exactly this temporal level advance the time index and are
+                recorded.
+            props (list or None): The names in the client of the properties to record, or `None` to record every
+                surfaced property which can be summarized as a number.
+        """
+        self.capacity = capacity
+        self.temporal_level = temporal_level
+        self.props = props
+        # The time index of the next recorded tick.
+        self.time = 0
+        # A `RingBuffer` for each recorded property, keyed by its name in the client.
+        self.series = dict()
+
+    def record(self, graphdata, temporal_level):
+        """Records the surfaced properties of the output of a tick, and advances the time index.
+
+        Args:
+            graphdata (GraphData or None): The `GraphData` of the tick's output, or `None` if it is not tracked (for
+                example, in an iteration which is not sampled); the time index still advances.
+            temporal_level (int): The temporal level of the tick.
+        """
+        if temporal_level != self.temporal_level:
+            return
+        if graphdata is not None:
+            for name, value in graphdata.get_visualization_dict().items():
+                if self.props is not None and name not in self.props:
+                    continue
+                value = _to_scalar(value)
+                if value is None:
+                    continue
+                if name not in self.series:
+                    self.series[name] = RingBuffer(self.capacity)
+                self.series[name].append(self.time, value)
+        self.time += 1
+
+    def get_downsampled(self, width, method='lttb'):
+        """Returns every series, downsampled to at most `width` points.
+
+        Points whose values are not finite, such as a loss which has diverged, are left out before downsampling.
+
+        Args:
+            width (int): The maximum number of points per series, such as the width of the plot in pixels.
+            method (str): The name of the downsampling function in `DOWNSAMPLERS`.
+
+        Returns:
+            (dict): A dict of the form {property name: (times, values)}, with times and values as lists.
+        """
+        downsample = DOWNSAMPLERS[method]
+        downsampled = dict()
+        for name, ring_buffer in self.series.items():
+            times, values = ring_buffer.get()
+            finite = np.isfinite(values)
+            times, values = downsample(times[finite], values[finite], width)
+            downsampled[name] = (times.tolist(), values.tolist())
+        return downsampled